@@ -0,0 +1,793 @@
+import logging
+import numpy as np
+from hytra.core.hypothesesgraph import HypothesesGraph
+from hytra.core.jsongraph import negLog, listify
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
+
+logger = logging.getLogger(__name__)
+
+
+class ArrayNodeMap:
+    """
+    To access per node values of an `ArrayHypothesesGraph`,
+    this node map provides the same interface as `hytra.core.hypothesesgraph.NodeMap`
+    """
+
+    def __init__(self, graph, values):
+        self.__graph = graph
+        self.__values = values
+
+    def __getitem__(self, key):
+        return self.__values[self.__graph._getNodeIndex(key)]
+
+
+class ArrayTrackletMap(ArrayNodeMap):
+    """
+    The tracklet of every node of an `ArrayHypothesesGraph`, which never contracts nodes,
+    so every tracklet is a list containing only the node's traxel
+    """
+
+    def __getitem__(self, key):
+        return [super(ArrayTrackletMap, self).__getitem__(key)]
+
+
+class ArrayHypothesesGraph(HypothesesGraph):
+    """
+    Alternative to the networkx based `HypothesesGraph` that stores the graph in NumPy arrays,
+    which keeps memory and runtime manageable for millions of detections and links.
+    It offers the same public methods, so it can be used instead of a `HypothesesGraph` for
+    building the graph, inserting energies, exporting the model, and reading back
+    the solution and lineages.
+
+    **Notes:**
+
+    * Nodes are still addressed by tuples `(int(timestep), int(id))`, and the unique ID of a node
+      is its index in the node arrays.
+    * Links are stored as pairs of node indices, sorted by source node (in the order networkx would report them),
+      with CSR style offsets for the outgoing and incoming links of every node.
+    * Energies are dense matrices with a row per node or link instead of nested lists per element.
+    * Nodes can still be added with `addNodeFromTraxel` until energies are inserted, but links cannot be removed.
+      Generating tracklets and pruning work on a networkx based copy, see `toHypothesesGraph()`,
+      which must also be used for merger resolving.
+    """
+
+    def __init__(self):
+        super(ArrayHypothesesGraph, self).__init__()
+        # there is no networkx graph, all elements live in the arrays below
+        self._graph = None
+
+        # nodes
+        self._traxels = []
+        self._nodeTimesteps = np.zeros(0, dtype=np.int64)
+        self._nodeIds = np.zeros(0, dtype=np.int64)
+        self._pendingNodes = []
+        self._sortedNodeKeys = None
+        self._nodeKeyOrder = None
+
+        # links, as indices of source and target node
+        self._linkSources = np.zeros(0, dtype=np.int64)
+        self._linkTargets = np.zeros(0, dtype=np.int64)
+        self._pendingLinks = []
+        self._sortedLinkKeys = None
+        self._linkKeyOrder = None
+        self._outOffsets = None
+        self._inOrder = None
+        self._inOffsets = None
+
+        # energies, set by insertEnergies()
+        self._detectionFeatures = None
+        self._divisionFeatures = None
+        self._hasDivisionFeatures = None
+        self._appearanceFeatures = None
+        self._disappearanceFeatures = None
+        self._transitionFeatures = None
+
+        # solution, set by insertSolution()
+        self._nodeValues = None
+        self._divisionValues = None
+        self._linkValues = None
+        self._linkGaps = None
+
+        # lineages, set by computeLineage(). -1 encodes None
+        self._lineageIds = None
+        self._trackIds = None
+        self._nodeGaps = None
+        self._parents = None
+        self._gapParents = None
+        self._children = None
+
+    def nodeIterator(self):
+        self._finalize()
+        return list(zip(self._nodeTimesteps.tolist(), self._nodeIds.tolist()))
+
+    def arcIterator(self):
+        nodes = self.nodeIterator()
+        return [
+            (nodes[s], nodes[t])
+            for s, t in zip(self._linkSources.tolist(), self._linkTargets.tolist())
+        ]
+
+    def countNodes(self):
+        return len(self._traxels)
+
+    def countArcs(self):
+        self._finalize()
+        return len(self._linkSources)
+
+    def hasNode(self, node):
+        return self._findNodeIndices([node[0]], [node[1]])[0] >= 0
+
+    def hasEdge(self, u, v):
+        nodeIndices = self._findNodeIndices([u[0], v[0]], [u[1], v[1]])
+        if np.any(nodeIndices < 0):
+            return False
+        return self._findLinkIndices(nodeIndices[:1], nodeIndices[1:])[0] >= 0
+
+    def _findNodeIndices(self, timesteps, ids):
+        """
+        **returns** the index of every node given by `timesteps[i]` and `ids[i]`, or -1 if there is no such node
+        """
+        self._finalize()
+        if self._sortedNodeKeys is None:
+            nodeKeys = (self._nodeTimesteps << 32) + self._nodeIds
+            self._nodeKeyOrder = np.argsort(nodeKeys, kind="stable")
+            self._sortedNodeKeys = nodeKeys[self._nodeKeyOrder]
+        keys = (np.asarray(timesteps, dtype=np.int64) << 32) + np.asarray(
+            ids, dtype=np.int64
+        )
+        return self._lookUp(keys, self._sortedNodeKeys, self._nodeKeyOrder)
+
+    def _findLinkIndices(self, sources, targets):
+        """
+        **returns** the index of every link from node index `sources[i]` to `targets[i]`, or -1 if there is no such link
+        """
+        self._finalize()
+        numNodes = max(self.countNodes(), 1)
+        if self._sortedLinkKeys is None:
+            linkKeys = self._linkSources * numNodes + self._linkTargets
+            self._linkKeyOrder = np.argsort(linkKeys, kind="stable")
+            self._sortedLinkKeys = linkKeys[self._linkKeyOrder]
+        keys = np.asarray(sources, dtype=np.int64) * numNodes + np.asarray(
+            targets, dtype=np.int64
+        )
+        return self._lookUp(keys, self._sortedLinkKeys, self._linkKeyOrder)
+
+    @staticmethod
+    def _lookUp(keys, sortedKeys, order):
+        if len(sortedKeys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(sortedKeys, keys), len(sortedKeys) - 1)
+        return np.where(sortedKeys[positions] == keys, order[positions], -1)
+
+    def _getNodeIndex(self, node):
+        index = self._findNodeIndices([node[0]], [node[1]])[0]
+        if index < 0:
+            raise KeyError(node)
+        return int(index)
+
+    def _getOutgoingLinks(self, nodeIndex):
+        self._finalize()
+        if self._outOffsets is None:
+            self._outOffsets = np.searchsorted(
+                self._linkSources, np.arange(self.countNodes() + 1)
+            )
+        return np.arange(self._outOffsets[nodeIndex], self._outOffsets[nodeIndex + 1])
+
+    def _getIncomingLinks(self, nodeIndex):
+        self._finalize()
+        if self._inOffsets is None:
+            self._inOrder = np.argsort(self._linkTargets, kind="stable")
+            self._inOffsets = np.searchsorted(
+                self._linkTargets[self._inOrder], np.arange(self.countNodes() + 1)
+            )
+        return self._inOrder[
+            self._inOffsets[nodeIndex] : self._inOffsets[nodeIndex + 1]
+        ]
+
+    def _addNodesForFrame(self, frame, traxelDict):
+        """
+        Insert nodes for all objects in this frame
+
+        **returns** the unique IDs of the inserted nodes, in the order of `traxelDict`
+        """
+        objectIds = [obj for obj in traxelDict.keys() if obj != 0]
+        self._traxels.extend(traxelDict[obj] for obj in objectIds)
+        self._pendingNodes.append(
+            (
+                np.full(len(objectIds), frame, dtype=np.int64),
+                np.array(objectIds, dtype=np.int64),
+            )
+        )
+        nodeUuids = np.arange(
+            self._nextNodeUuid, self._nextNodeUuid + len(objectIds), dtype=np.int64
+        )
+        self._nextNodeUuid += len(objectIds)
+        return nodeUuids
+
+    def _addLinks(
+        self, sourceFrame, sourceIds, sourceUuids, targetFrames, targetIds, targetUuids
+    ):
+        # the unique IDs are the node indices
+        self._pendingLinks.append((sourceUuids.copy(), targetUuids.copy()))
+
+    def _finalize(self):
+        """
+        Append all pending nodes and links to the node and link arrays.
+        Links that were inserted several times are only kept once.
+
+        Nodes and links are only collected while adding them, every method that reads
+        the node or link arrays calls this first.
+        """
+        if len(self._pendingNodes) == 0 and len(self._pendingLinks) == 0:
+            return
+
+        if len(self._pendingNodes) > 0:
+            self._nodeTimesteps = np.concatenate(
+                [self._nodeTimesteps] + [t for t, _ in self._pendingNodes]
+            )
+            self._nodeIds = np.concatenate(
+                [self._nodeIds] + [i for _, i in self._pendingNodes]
+            )
+            self._pendingNodes = []
+            self._sortedNodeKeys = None
+            self._invalidateUuidTraxelMapping()
+
+        if len(self._pendingLinks) > 0:
+            sources = np.concatenate(
+                [self._linkSources] + [s for s, _ in self._pendingLinks]
+            )
+            targets = np.concatenate(
+                [self._linkTargets] + [t for _, t in self._pendingLinks]
+            )
+            self._pendingLinks = []
+
+            # keep the first occurrence of every link, and order them by source like networkx does
+            _, firstOccurrences = np.unique(
+                sources * self.countNodes() + targets, return_index=True
+            )
+            firstOccurrences.sort()
+            sources = sources[firstOccurrences]
+            targets = targets[firstOccurrences]
+            order = np.argsort(sources, kind="stable")
+            self._linkSources = sources[order]
+            self._linkTargets = targets[order]
+
+        self._sortedLinkKeys = None
+        self._outOffsets = None
+        self._inOffsets = None
+
+    def addNodeFromTraxel(self, traxel, **kwargs):
+        """
+        Insert a single node specified by a traxel.
+        The array graph does not store additional node attributes, so no keyword arguments are allowed.
+        """
+        assert traxel is not None
+        assert (
+            len(kwargs) == 0
+        ), "ArrayHypothesesGraph cannot store custom node attributes"
+        assert (
+            self._detectionFeatures is None
+        ), "Cannot add nodes after energies were inserted"
+        self._addNodesForFrame(traxel.Timestep, {traxel.Id: traxel})
+
+    def buildFromProbabilityGenerator(self, probabilityGenerator, *args, **kwargs):
+        """
+        See `HypothesesGraph.buildFromProbabilityGenerator`
+        """
+        super(ArrayHypothesesGraph, self).buildFromProbabilityGenerator(
+            probabilityGenerator, *args, **kwargs
+        )
+        self._finalize()
+
+    def generateTrackletGraph(self):
+        """
+        The array graph cannot contract nodes, so the tracklet graph is generated
+        from a networkx based copy (see `toHypothesesGraph()`), which also becomes its `referenceTraxelGraph`.
+        """
+        return self.toHypothesesGraph().generateTrackletGraph()
+
+    def getNodeTraxelMap(self):
+        return ArrayNodeMap(self, self._traxels)
+
+    def getNodeTrackletMap(self):
+        return ArrayTrackletMap(self, self._traxels)
+
+    def insertEnergies(
+        self,
+        maxNumObjects,
+        detectionProbabilityFunc,
+        transitionProbabilityFunc,
+        boundaryCostMultiplierFunc,
+        divisionProbabilityFunc,
+        skipLinksBias,
+    ):
+        """
+        Insert energies for detections, divisions and links into the hypotheses graph,
+        see `HypothesesGraph.insertEnergies` for a description of the parameters.
+
+        The energies are stored as matrices with one row per node or link.
+        """
+        self._finalize()
+        numNodes = self.countNodes()
+        numLinks = self.countArcs()
+        numElements = numNodes + numLinks
+        self.progressVisitor.showState("Inserting energies")
+
+        detectionFeatures = np.zeros((numNodes, maxNumObjects + 1))
+        appearanceFeatures = np.zeros((numNodes, maxNumObjects + 1))
+        disappearanceFeatures = np.zeros((numNodes, maxNumObjects + 1))
+        divisionFeatures = [None] * numNodes
+
+        countElements = 0
+        for n, traxel in enumerate(self._traxels):
+            countElements += 1
+            detectionFeatures[n] = negLog(detectionProbabilityFunc(traxel))
+
+            # division only if probability is big enough
+            division = divisionProbabilityFunc(traxel)
+            if division is not None:
+                divisionFeatures[n] = negLog(division)
+
+            # appearance/disappearance
+            appearanceFeatures[n, 1:] = boundaryCostMultiplierFunc(traxel, True)
+            disappearanceFeatures[n, 1:] = boundaryCostMultiplierFunc(traxel, False)
+            self.progressVisitor.showProgress(countElements / float(numElements))
+
+        # insert transition probabilities for all links
+        transitionFeatures = np.zeros((numLinks, maxNumObjects + 1))
+        for l, (s, t) in enumerate(
+            zip(self._linkSources.tolist(), self._linkTargets.tolist())
+        ):
+            countElements += 1
+            self.progressVisitor.showProgress(countElements / float(numElements))
+            transitionFeatures[l] = negLog(
+                transitionProbabilityFunc(self._traxels[s], self._traxels[t])
+            )
+
+        self.insertEnergyMatrices(
+            detectionFeatures,
+            divisionFeatures,
+            appearanceFeatures,
+            disappearanceFeatures,
+            transitionFeatures,
+            skipLinksBias,
+        )
+
+    def insertEnergyMatrices(
+        self,
+        detectionFeatures,
+        divisionFeatures,
+        appearanceFeatures,
+        disappearanceFeatures,
+        transitionFeatures,
+        skipLinksBias,
+    ):
+        """
+        Store energies that were computed for all nodes and links at once,
+        see `HypothesesGraph.insertEnergyMatrices` for a description of the parameters.
+        """
+        self._finalize()
+        numNodes = self.countNodes()
+        self._detectionFeatures = np.array(detectionFeatures, dtype=np.float64)
+        self._appearanceFeatures = np.array(appearanceFeatures, dtype=np.float64)
+        self._disappearanceFeatures = np.array(disappearanceFeatures, dtype=np.float64)
+
+        self._hasDivisionFeatures = np.array(
+            [d is not None for d in divisionFeatures], dtype=bool
+        )
+        numDivisionStates = max(
+            [len(d) for d in divisionFeatures if d is not None] + [2]
+        )
+        self._divisionFeatures = np.zeros((numNodes, numDivisionStates))
+        for n in np.flatnonzero(self._hasDivisionFeatures).tolist():
+            self._divisionFeatures[n] = divisionFeatures[n]
+
+        # skip links get a bias, so that they are not primarily taken
+        self._transitionFeatures = np.array(transitionFeatures, dtype=np.float64)
+        frameGaps = (
+            self._nodeTimesteps[self._linkTargets]
+            - self._nodeTimesteps[self._linkSources]
+        )
+        isSkipLink = frameGaps > 1
+        self._transitionFeatures[isSkipLink, 1] += skipLinksBias * frameGaps[isSkipLink]
+
+    def _createUuidTraxelMapping(self):
+        # the unique IDs are the node indices
+        mapping = UuidTraxelMapping()
+        for uuid, (t, i) in enumerate(self.nodeIterator()):
+            mapping.add(uuid, [(t, i)])
+        return mapping
+
+    def _iterRows(self, matrices, chunkSize=4096):
+        """
+        Iterate over the rows of all given matrices (or `None`s) at once, converting them to lists chunk by chunk.
+
+        **returns** a generator of tuples with one row (or `None`) per matrix
+        """
+        numRows = len([m for m in matrices if m is not None][0])
+        for chunkStart in range(0, numRows, chunkSize):
+            chunks = [
+                [None] * min(chunkSize, numRows - chunkStart)
+                if m is None
+                else m[chunkStart : chunkStart + chunkSize].tolist()
+                for m in matrices
+            ]
+            yield from zip(*chunks)
+
+    def iterSegmentationHypotheses(self, noFeatures=False):
+        """
+        Iterate over the dictionary representations of all nodes,
+        see `HypothesesGraph.iterSegmentationHypotheses`.
+        """
+        self._finalize()
+        if self._detectionFeatures is None:
+            if not noFeatures:
+                raise ValueError(
+                    "Cannot use graph nodes without assigned ID and features, run insertEnergies() first"
+                )
+            for n in range(self.countNodes()):
+                yield {"id": n}
+            return
+
+        rows = self._iterRows(
+            [
+                self._detectionFeatures,
+                self._appearanceFeatures,
+                self._disappearanceFeatures,
+                self._divisionFeatures,
+                self._hasDivisionFeatures,
+                self._nodeTimesteps,
+            ]
+        )
+        for n, row in enumerate(rows):
+            detection, appearance, disappearance, division, hasDivision, timestep = row
+            node = {
+                "id": n,
+                "features": listify(detection),
+                "appearanceFeatures": listify(appearance),
+                "disappearanceFeatures": listify(disappearance),
+            }
+            if hasDivision:
+                node["divisionFeatures"] = listify(division)
+            node["timestep"] = [timestep, timestep]
+            yield node
+
+    def iterLinkingHypotheses(self, noFeatures=False):
+        """
+        Iterate over the dictionary representations of all links,
+        see `HypothesesGraph.iterLinkingHypotheses`.
+        """
+        self._finalize()
+        for source, target, features in self._iterRows(
+            [self._linkSources, self._linkTargets, self._transitionFeatures]
+        ):
+            link = {"src": source, "dest": target}
+            if features is not None:
+                link["features"] = listify(features)
+            yield link
+
+    def iterTraxelToUniqueId(self):
+        """
+        Iterate over the `traxelToUniqueId` map timestep by timestep,
+        see `HypothesesGraph.iterTraxelToUniqueId`.
+        """
+        self._finalize()
+        order = np.argsort(self._nodeTimesteps, kind="stable")
+        timesteps, starts = np.unique(self._nodeTimesteps[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for timestep, start, end in zip(timesteps.tolist(), starts, ends):
+            uuids = order[start:end]
+            yield str(timestep), dict(
+                zip([str(i) for i in self._nodeIds[uuids].tolist()], uuids.tolist())
+            )
+
+    def _iterConflictingTraxels(self):
+        for uuid, traxel in enumerate(self._traxels):
+            if traxel.conflictingTraxelIds is not None:
+                conflictingIds = self._findNodeIndices(
+                    [traxel.Timestep] * len(traxel.conflictingTraxelIds),
+                    traxel.conflictingTraxelIds,
+                )
+                if np.any(conflictingIds < 0):
+                    raise KeyError(
+                        "Conflicting traxels of {} are missing in the graph".format(
+                            (traxel.Timestep, traxel.Id)
+                        )
+                    )
+                yield uuid, conflictingIds.tolist()
+
+    def insertSolution(self, resultDictionary):
+        """
+        Add solution values to nodes and arcs from dictionary representation of solution,
+        see `HypothesesGraph.insertSolution`.
+        """
+        self._finalize()
+        numNodes = self.countNodes()
+        self._nodeValues = np.zeros(numNodes, dtype=np.int64)
+        self._divisionValues = np.zeros(numNodes, dtype=bool)
+        self._linkValues = np.zeros(self.countArcs(), dtype=np.int64)
+        # 0 means that no gap was stored for a link
+        self._linkGaps = np.zeros(self.countArcs(), dtype=np.int64)
+
+        detections = resultDictionary["detectionResults"]
+        self._nodeValues[np.array([d["id"] for d in detections], dtype=np.int64)] = (
+            np.array([d["value"] for d in detections], dtype=np.int64)
+        )
+
+        if (
+            "linkingResults" in resultDictionary
+            and resultDictionary["linkingResults"] is not None
+        ):
+            links = resultDictionary["linkingResults"]
+            sources = np.array([l["src"] for l in links], dtype=np.int64)
+            targets = np.array([l["dest"] for l in links], dtype=np.int64)
+            values = np.array([l["value"] for l in links], dtype=np.int64)
+            linkIndices = self._findLinkIndices(sources, targets)
+            exists = linkIndices >= 0
+            self._linkValues[linkIndices[exists]] = values[exists]
+            self._linkGaps[linkIndices[exists]] = (
+                self._nodeTimesteps[targets[exists]]
+                - self._nodeTimesteps[sources[exists]]
+            )
+
+        if (
+            "divisionResults" in resultDictionary
+            and resultDictionary["divisionResults"] is not None
+        ):
+            divisions = resultDictionary["divisionResults"]
+            self._divisionValues[
+                np.array([d["id"] for d in divisions], dtype=np.int64)
+            ] = np.array([d["value"] for d in divisions], dtype=bool)
+
+    def getSolutionDictionary(self):
+        """
+        Return the solution as a python dictionary in the style that can be saved to JSON
+        or sent to our solvers as ground truths, see `HypothesesGraph.getSolutionDictionary`.
+        """
+        self._finalize()
+        numNodes = self.countNodes()
+        numLinks = self.countArcs()
+        if self._nodeValues is None:
+            nodeValues = [0] * numNodes
+            linkValues = [0] * numLinks
+            linkGaps = [1] * numLinks
+            divisionList = []
+        else:
+            nodeValues = self._nodeValues.tolist()
+            linkValues = self._linkValues.tolist()
+            linkGaps = np.where(self._linkGaps > 0, self._linkGaps, 1).tolist()
+            divisionList = [
+                {"id": n, "value": v}
+                for n, v in enumerate(self._divisionValues.tolist())
+            ]
+
+        resultDictionary = {}
+        resultDictionary["detectionResults"] = [
+            {"id": n, "value": v} for n, v in enumerate(nodeValues)
+        ]
+        resultDictionary["linkingResults"] = [
+            {"src": s, "dest": t, "value": v, "gap": g}
+            for s, t, v, g in zip(
+                self._linkSources.tolist(),
+                self._linkTargets.tolist(),
+                linkValues,
+                linkGaps,
+            )
+        ]
+        resultDictionary["divisionResults"] = divisionList
+        return resultDictionary
+
+    def countIncomingObjects(self, node):
+        """
+        Once a solution was written to the graph, this returns the number of
+        incoming objects of a node, and the number of active incoming edges.
+        If the latter is greater than 1, this shows that we have a merger.
+        """
+        if self._linkValues is None:
+            return 0, 0
+        links = self._getIncomingLinks(self._getNodeIndex(node))
+        return int(self._linkValues[links].sum()), len(links)
+
+    def countOutgoingObjects(self, node):
+        """
+        Once a solution was written to the graph, this returns the number of
+        outgoing objects of a node, and the number of active outgoing edges.
+        If the latter is greater than 1, this shows that we have a merger splitting up, or a division.
+        """
+        if self._linkValues is None:
+            return 0, 0
+        values = self._linkValues[self._getOutgoingLinks(self._getNodeIndex(node))]
+        return int(values[values > 0].sum()), int(np.count_nonzero(values > 0))
+
+    def computeLineage(self, firstTrackId=2, firstLineageId=2, skipLinks=1):
+        """
+        computes lineage and track id for every node in the graph, see `HypothesesGraph.computeLineage`
+        """
+        self._finalize()
+        numNodes = self.countNodes()
+        self._lineageIds = np.full(numNodes, -1, dtype=np.int64)
+        self._trackIds = np.full(numNodes, -1, dtype=np.int64)
+        self._nodeGaps = np.zeros(numNodes, dtype=np.int64)
+        self._parents = np.full(numNodes, -1, dtype=np.int64)
+        self._gapParents = np.full(numNodes, -1, dtype=np.int64)
+        self._children = {}
+
+        self.progressVisitor.showState("Compute lineage")
+        if self._nodeValues is None:
+            return
+
+        # start lineages / tracks at 2, because 0 means background=black, 1 means misdetection in ilastik
+        max_lineage_id = firstLineageId
+        max_track_id = firstTrackId
+
+        # find start of lineages
+        isActiveLink = self._linkValues > 0
+        numIncomingObjects = np.bincount(
+            self._linkTargets, weights=self._linkValues, minlength=numNodes
+        )
+        numOutgoingObjects = np.bincount(
+            self._linkSources[isActiveLink],
+            weights=self._linkValues[isActiveLink],
+            minlength=numNodes,
+        )
+        isTrackStart = (numIncomingObjects == 0) & (self._nodeValues > 0)
+        if not self.allowLengthOneTracks:
+            isTrackStart &= numOutgoingObjects > 0
+
+        update_queue = []
+        for n in np.flatnonzero(isTrackStart).tolist():
+            update_queue.append((n, max_lineage_id, max_track_id))
+            max_lineage_id += 1
+            max_track_id += 1
+
+        numElements = 2 * numNodes
+        countElements = numNodes
+        while len(update_queue) > 0:
+            countElements += 1
+            current_node, lineage_id, track_id = update_queue.pop()
+            self.progressVisitor.showProgress(countElements / float(numElements))
+
+            # if we did not run merger resolving, it can happen that we reach a node several times,
+            # and would propagate the new lineage+track IDs to all descendants again! We simply
+            # stop propagating in that case and just use the lineageID that reached the node first.
+            if (
+                self._lineageIds[current_node] >= 0
+                and self._trackIds[current_node] >= 0
+            ):
+                logger.debug("Several tracks are merging here, stopping a later one")
+                continue
+
+            # set a new trackID
+            self._lineageIds[current_node] = lineage_id
+            self._trackIds[current_node] = track_id
+
+            outgoingLinks = self._getOutgoingLinks(current_node)
+            activeLinks = outgoingLinks[self._linkValues[outgoingLinks] > 0].tolist()
+            if numOutgoingObjects[current_node] != len(activeLinks):
+                logger.warning(
+                    "running lineage computation on unresolved graphs depends on a race condition"
+                )
+
+            if self._divisionValues[current_node]:
+                assert len(activeLinks) == 2
+                self._children[current_node] = []
+                for l in activeLinks:
+                    child = int(self._linkTargets[l])
+                    self._nodeGaps[child] = skipLinks
+                    self._children[current_node].append(child)
+                    self._parents[child] = current_node
+                    update_queue.append((child, lineage_id, max_track_id))
+                    max_track_id += 1
+            else:
+                if len(activeLinks) > 1:
+                    logger.debug(
+                        "Found merger splitting into several objects, propagating lineage and track to all descendants!"
+                    )
+
+                for l in activeLinks:
+                    child = int(self._linkTargets[l])
+                    if self._linkGaps[l] <= 1:
+                        self._nodeGaps[child] = 1
+                        update_queue.append((child, lineage_id, track_id))
+                    else:
+                        self._nodeGaps[child] = skipLinks
+                        self._gapParents[child] = current_node
+                        update_queue.append((child, lineage_id, max_track_id))
+                        max_track_id += 1
+
+    def _getNodeAttribute(self, timestep, objectId, attribute):
+        """
+        return some attribute of a certain node specified by timestep and objectId
+        """
+        try:
+            values = {"lineageId": self._lineageIds, "trackId": self._trackIds}[
+                attribute
+            ]
+            if values is None:
+                raise KeyError(attribute)
+            value = int(values[self._getNodeIndex((timestep, objectId))])
+        except KeyError:
+            logger.error(
+                attribute
+                + " not found in graph node properties, call computeLineage() first!"
+            )
+            raise
+        return None if value < 0 else value
+
+    def pruneGraphToSolution(self, distanceToSolution=0):
+        """
+        creates a new pruned (networkx based) HypothesesGraph around the result,
+        see `HypothesesGraph.pruneGraphToSolution`. This graph is not modified.
+        """
+        return self.toHypothesesGraph().pruneGraphToSolution(distanceToSolution)
+
+    def toHypothesesGraph(self, hypothesesGraph=None):
+        """
+        Copy all nodes, links, energies, the solution and lineages of this graph into
+        a networkx based `hypothesesGraph`, which defaults to a new, empty `HypothesesGraph`.
+
+        **returns** the filled `hypothesesGraph`
+        """
+        self._finalize()
+        if hypothesesGraph is None:
+            hypothesesGraph = HypothesesGraph()
+        hypothesesGraph.allowLengthOneTracks = self.allowLengthOneTracks
+        hypothesesGraph.progressVisitor = self.progressVisitor
+        hypothesesGraph._nextNodeUuid = self._nextNodeUuid
+
+        nodes = self.nodeIterator()
+        nodeAttributes = [{"traxel": t, "id": n} for n, t in enumerate(self._traxels)]
+        linkAttributes = [
+            {"src": s, "dest": t}
+            for s, t in zip(self._linkSources.tolist(), self._linkTargets.tolist())
+        ]
+
+        if self._detectionFeatures is not None:
+            model = self.toTrackingGraph().model
+            for attributes, node in zip(
+                nodeAttributes, model["segmentationHypotheses"]
+            ):
+                del node["id"]
+                attributes.update(node)
+            for attributes, link in zip(linkAttributes, model["linkingHypotheses"]):
+                attributes["features"] = link["features"]
+
+        if self._nodeValues is not None:
+            for attributes, value, divisionValue in zip(
+                nodeAttributes,
+                self._nodeValues.tolist(),
+                self._divisionValues.tolist(),
+            ):
+                attributes["value"] = value
+                attributes["divisionValue"] = divisionValue
+            for attributes, value, gap in zip(
+                linkAttributes, self._linkValues.tolist(), self._linkGaps.tolist()
+            ):
+                attributes["value"] = value
+                if gap > 0:
+                    attributes["gap"] = gap
+
+        if self._lineageIds is not None:
+            for n, attributes in enumerate(nodeAttributes):
+                lineageId = int(self._lineageIds[n])
+                trackId = int(self._trackIds[n])
+                attributes["lineageId"] = None if lineageId < 0 else lineageId
+                attributes["trackId"] = None if trackId < 0 else trackId
+                if self._nodeGaps[n] > 0:
+                    attributes["gap"] = int(self._nodeGaps[n])
+                if self._parents[n] >= 0:
+                    attributes["parent"] = nodes[self._parents[n]]
+                if self._gapParents[n] >= 0:
+                    attributes["gap_parent"] = nodes[self._gapParents[n]]
+                if n in self._children:
+                    attributes["children"] = [nodes[c] for c in self._children[n]]
+
+        for node, attributes in zip(nodes, nodeAttributes):
+            hypothesesGraph._graph.add_node(node, **attributes)
+        hypothesesGraph._graph.add_edges_from(
+            (nodes[s], nodes[t], attributes)
+            for s, t, attributes in zip(
+                self._linkSources.tolist(), self._linkTargets.tolist(), linkAttributes
+            )
+        )
+        return hypothesesGraph
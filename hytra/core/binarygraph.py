@@ -0,0 +1,258 @@
+"""
+Compact binary storage of the dictionaries that are otherwise written to JSON, such as
+tracking models (hypotheses graphs), results and weights.
+
+The dictionary is stored column-wise as a set of named NumPy arrays, either in an HDF5 file (`.h5`, `.hdf5`)
+or in a NumPy archive (`.npz`). Every list of dictionaries, such as `segmentationHypotheses` or `detectionResults`,
+becomes one array per key. Nested lists like feature vectors become matrices, or a flat array plus shapes when their
+length varies. The `traxelToUniqueId` mapping is stored as three integer arrays.
+Everything else (e.g. `settings`) is kept as JSON in a small schema, which also describes how to restore
+the original dictionary.
+
+The conversion is lossless in the sense that the loaded dictionary compares equal to the one that was written,
+while all numbers of one column share a single dtype.
+"""
+import os
+import json
+import numpy as np
+import h5py
+
+binaryExtensions = [".h5", ".hdf5", ".npz"]
+schemaName = "_schema"
+
+
+def isBinaryFilename(filename):
+    """ Whether the extension of this file denotes one of the binary formats """
+    return os.path.splitext(filename)[1].lower() in binaryExtensions
+
+
+def _stringToArray(string):
+    return np.frombuffer(string.encode("utf-8"), dtype=np.uint8)
+
+
+def _arrayToString(array):
+    return np.asarray(array, dtype=np.uint8).tobytes().decode("utf-8")
+
+
+def _isNumeric(array):
+    return array.dtype.kind in "biuf"
+
+
+def _isIntegerKey(key):
+    return isinstance(key, str) and key.lstrip("-").isdigit() and str(int(key)) == key
+
+
+def _isIdMapping(value):
+    """
+    Whether `value` looks like the `traxelToUniqueId` map: `{str(timestep): {str(id): int(uuid), ...}, ...}`
+    """
+    return (
+        isinstance(value, dict)
+        and len(value) > 0
+        and all(
+            _isIntegerKey(outerKey)
+            and isinstance(innerDict, dict)
+            and all(
+                _isIntegerKey(innerKey) and type(v) is int
+                for innerKey, v in innerDict.items()
+            )
+            for outerKey, innerDict in value.items()
+        )
+    )
+
+
+def _encodeColumn(name, values, arrays):
+    """
+    Store the list of `values` in `arrays` under names starting with `name`.
+
+    **returns** the name of the encoding: `dense` for numeric values of the same shape, `ragged` for numeric values
+    whose shape varies, or `json` for everything else
+    """
+    try:
+        valuesArray = np.asarray(values)
+    except ValueError:
+        # numpy refuses to stack nested lists of different length
+        valuesArray = None
+    if valuesArray is not None and _isNumeric(valuesArray):
+        arrays[name + "/values"] = valuesArray
+        return "dense"
+
+    try:
+        elements = [np.asarray(v) for v in values]
+    except ValueError:
+        elements = None
+    if (
+        elements is not None
+        and all(_isNumeric(e) for e in elements)
+        and len(set(e.ndim for e in elements)) == 1
+        and any(e.size > 0 for e in elements)
+    ):
+        dtype = np.result_type(*[e.dtype for e in elements if e.size > 0])
+        arrays[name + "/values"] = np.concatenate(
+            [e.ravel().astype(dtype) for e in elements]
+        )
+        arrays[name + "/shapes"] = np.array(
+            [e.shape for e in elements], dtype=np.int64
+        ).reshape(len(elements), elements[0].ndim)
+        return "ragged"
+
+    arrays[name + "/json"] = _stringToArray(json.dumps(values))
+    return "json"
+
+
+def _decodeColumn(name, encoding, arrays):
+    """ Restore the list of values that `_encodeColumn` stored """
+    if encoding == "dense":
+        return arrays[name + "/values"].tolist()
+    elif encoding == "ragged":
+        values = arrays[name + "/values"]
+        shapes = arrays[name + "/shapes"]
+        sizes = np.prod(shapes, axis=1, dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+        return [
+            values[offsets[i] : offsets[i + 1]].reshape(shape).tolist()
+            for i, shape in enumerate(shapes.tolist())
+        ]
+    else:
+        return json.loads(_arrayToString(arrays[name + "/json"]))
+
+
+def _encodeEntry(key, value, arrays):
+    """
+    Store one entry of the top level dictionary in `arrays`.
+
+    **returns** the description of this entry for the schema
+    """
+    if isinstance(value, list) and len(value) > 0:
+        if all(isinstance(v, dict) for v in value):
+            # list of records: store one column per key
+            columnKeys = list(dict.fromkeys(k for record in value for k in record))
+            columns = []
+            for columnKey in columnKeys:
+                name = "{}/{}".format(key, columnKey)
+                isPresent = np.array([columnKey in record for record in value])
+                columnValues = [
+                    record[columnKey] for record in value if columnKey in record
+                ]
+                column = {
+                    "key": columnKey,
+                    "encoding": _encodeColumn(name, columnValues, arrays),
+                }
+                if not np.all(isPresent):
+                    arrays[name + "/present"] = isPresent
+                    column["partial"] = True
+                columns.append(column)
+            return {
+                "key": key,
+                "kind": "records",
+                "length": len(value),
+                "columns": columns,
+            }
+        else:
+            return {
+                "key": key,
+                "kind": "column",
+                "encoding": _encodeColumn(key, value, arrays),
+            }
+    elif _isIdMapping(value):
+        arrays[key + "/outerKeys"] = np.array(
+            [int(k) for k in value.keys()], dtype=np.int64
+        )
+        arrays[key + "/counts"] = np.array(
+            [len(v) for v in value.values()], dtype=np.int64
+        )
+        arrays[key + "/innerKeys"] = np.array(
+            [int(k) for v in value.values() for k in v.keys()], dtype=np.int64
+        )
+        arrays[key + "/values"] = np.array(
+            [i for v in value.values() for i in v.values()], dtype=np.int64
+        )
+        return {"key": key, "kind": "mapping"}
+    else:
+        return {"key": key, "kind": "json", "value": value}
+
+
+def _decodeEntry(entry, arrays):
+    """ Restore the value of one entry of the top level dictionary """
+    key = entry["key"]
+    if entry["kind"] == "records":
+        records = [{} for _ in range(entry["length"])]
+        for column in entry["columns"]:
+            name = "{}/{}".format(key, column["key"])
+            values = _decodeColumn(name, column["encoding"], arrays)
+            if column.get("partial", False):
+                indices = np.flatnonzero(arrays[name + "/present"]).tolist()
+            else:
+                indices = range(len(records))
+            for i, v in zip(indices, values):
+                records[i][column["key"]] = v
+        return records
+    elif entry["kind"] == "column":
+        return _decodeColumn(key, entry["encoding"], arrays)
+    elif entry["kind"] == "mapping":
+        innerKeys = [str(k) for k in arrays[key + "/innerKeys"].tolist()]
+        values = arrays[key + "/values"].tolist()
+        mapping = {}
+        offset = 0
+        for outerKey, count in zip(
+            arrays[key + "/outerKeys"].tolist(), arrays[key + "/counts"].tolist()
+        ):
+            mapping[str(outerKey)] = dict(
+                zip(innerKeys[offset : offset + count], values[offset : offset + count])
+            )
+            offset += count
+        return mapping
+    else:
+        return entry["value"]
+
+
+def dictionaryToArrays(dictionary):
+    """
+    Convert a dictionary in the JSON schema of models, results or weights to a column-wise representation.
+
+    **returns** a dictionary of named NumPy arrays
+    """
+    arrays = {}
+    entries = [_encodeEntry(key, value, arrays) for key, value in dictionary.items()]
+    arrays[schemaName] = _stringToArray(json.dumps({"version": 1, "entries": entries}))
+    return arrays
+
+
+def arraysToDictionary(arrays):
+    """
+    Restore the dictionary from its column-wise representation created by `dictionaryToArrays`
+    """
+    schema = json.loads(_arrayToString(arrays[schemaName]))
+    return dict(
+        (entry["key"], _decodeEntry(entry, arrays)) for entry in schema["entries"]
+    )
+
+
+def writeToBinary(filename, dictionary):
+    """ Write a dictionary to an HDF5 file or NumPy archive, depending on the extension of `filename` """
+    arrays = dictionaryToArrays(dictionary)
+    if os.path.splitext(filename)[1].lower() == ".npz":
+        with open(filename, "wb") as f:
+            np.savez(f, **arrays)
+    else:
+        with h5py.File(filename, "w") as f:
+            for name, array in arrays.items():
+                f.create_dataset(name, data=array)
+
+
+def readFromBinary(filename):
+    """ Read a dictionary from an HDF5 file or NumPy archive, depending on the extension of `filename` """
+    arrays = {}
+    if os.path.splitext(filename)[1].lower() == ".npz":
+        with np.load(filename) as f:
+            for name in f.files:
+                arrays[name] = f[name]
+    else:
+
+        def readDataset(name, node):
+            if isinstance(node, h5py.Dataset):
+                arrays[name] = node[()]
+
+        with h5py.File(filename, "r") as f:
+            f.visititems(readDataset)
+    return arraysToDictionary(arrays)
@@ -1,5 +1,8 @@
 import numpy as np
 import math
+import itertools
+import scipy.ndimage
+from sklearn.neighbors import KDTree
 
 
 def dotproduct(v1, v2):
@@ -51,6 +54,28 @@ class Feature(object):
     def compute(self, feats_cur, feats_next, **kwargs):
         raise NotImplementedError("Feature not fully implemented yet.")
 
+    def computeForParents(self, feats_cur, feats_next, num_children):
+        """
+        Compute the feature for many parents at once.
+
+        **Parameters:**
+
+        * `feats_cur`: matrix with the feature vector of every parent in a row
+        * `feats_next`: array of shape `(numParents, numBestChildren, featureDim)` with the features
+          of the children of every parent, sorted by distance
+        * `num_children`: the number of valid children of every parent, the remaining entries
+          of `feats_next` must be ignored
+
+        **returns** a matrix with the feature of every parent in a row. Derived classes should
+        override this with array operations, by default `compute` is called for every parent.
+        """
+        return np.array(
+            [
+                np.reshape(self.compute(f_cur, f_next[:n]), -1)
+                for f_cur, f_next, n in zip(feats_cur, feats_next, num_children)
+            ]
+        )
+
     def getName(self):
         return self.name
 
@@ -74,6 +99,14 @@ class ParentChildrenRatio(Feature):
                 result[i] = self.default_value
         return result
 
+    def computeForParents(self, feats_cur, feats_next, num_children):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = feats_cur / (feats_next[:, 0] + feats_next[:, 1])
+        result = result.astype(np.float64)
+        isUndefined = np.isnan(result) | (num_children < 2)[:, np.newaxis]
+        result[isUndefined] = self.default_value
+        return result
+
     def dim(self):
         return self.dimensionality * self.feat_dim
 
@@ -93,6 +126,16 @@ class ChildrenRatio(Feature):
                 ratio[i] = 1.0 / ratio[i]
         return ratio
 
+    def computeForParents(self, feats_cur, feats_next, num_children):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = feats_next[:, 0] / feats_next[:, 1]
+        ratio[np.isnan(ratio)] = self.default_value
+        with np.errstate(divide="ignore"):
+            ratio = np.where(ratio > 1, 1.0 / ratio, ratio)
+        ratio = ratio.astype(np.float64)
+        ratio[num_children < 2] = self.default_value
+        return ratio
+
     def dim(self):
         return self.dimensionality * self.feat_dim
 
@@ -128,6 +171,28 @@ class ParentChildrenAngle(Feature):
 
         return max(angles)
 
+    def computeForParents(self, feats_cur, feats_next, num_children):
+        scales = np.array(self.scales[0 : feats_next.shape[2]])
+        vectors = (feats_next - feats_cur[:, np.newaxis, :]) * scales
+        lengths = np.sqrt(np.sum(vectors * vectors, axis=2))
+
+        maxAngles = np.full(len(feats_cur), -np.inf)
+        for idx1, idx2 in itertools.combinations(range(feats_next.shape[1]), 2):
+            lengthProduct = lengths[:, idx1] * lengths[:, idx2]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cosines = (
+                    np.sum(vectors[:, idx1] * vectors[:, idx2], axis=1) / lengthProduct
+                )
+            # like in `angle`, the angle is 0 if a vector is zero or acos is not defined
+            isDefined = (lengthProduct != 0) & ~(np.abs(cosines) > 1)
+            angles = np.zeros(len(feats_cur))
+            angles[isDefined] = np.arccos(cosines[isDefined]) * 180.0 / math.pi
+            isValid = num_children > idx2
+            maxAngles[isValid] = np.maximum(maxAngles[isValid], angles[isValid])
+
+        maxAngles[num_children < 2] = self.default_value
+        return maxAngles[:, np.newaxis]
+
 
 class ParentIdentity(Feature):
     name = ""
@@ -170,50 +235,186 @@ class FeatureManager(object):
         self.size_filter = size_filter
         self.squared_distance_default = squared_distance_default
 
-    def _getBestSquaredDistances(
-        self, com_cur, coms_next, size_filter=None, sizes_next=[], default_value=9999
-    ):
-        """ returns the squared distances to the objects in the neighborhood of com_curr, optionally with size filter """
-        squaredDistances = []
-
-        for label_next in coms_next.keys():
-            assert label_next in sizes_next.keys()
-            if size_filter != None and sizes_next[label_next] >= size_filter:
-                dist = np.linalg.norm(coms_next[label_next] - com_cur * self.scales)
-                squaredDistances.append([label_next, dist])
-
-        squaredDistances = np.array(squaredDistances)
-        # sort the array in the second column in ascending order
-        squaredDistances = np.array(
-            sorted(squaredDistances, key=lambda a_entry: a_entry[1])
+    def _getCandidateChildren(self, feats_next, img_next, label_image_filename, ndim):
+        """
+        **returns** a tuple `(indices, labels, starts, stops)` of the objects in `feats_next` that pass
+        the size filter and are present in `img_next`, where `labels` are their IDs in `img_next`
+        and `starts` and `stops` are matrices with the corners of their bounding boxes
+        """
+        num_next = len(feats_next[self.com_name_next])
+        # if 'id' in features, map the labels first -- because the labels in img_next are image object ids,
+        # whereas the features are the union of objects from several segmentations
+        if (
+            label_image_filename is not None
+            and "filename" in feats_next
+            and "id" in feats_next
+        ):
+            local_to_global_index_map = dict(
+                (feats_next["id"][l], l)
+                for l, f in enumerate(feats_next["filename"])
+                if f == label_image_filename
+            )
+            labels = np.array(list(local_to_global_index_map.keys()), dtype=np.int64)
+            indices = np.array(list(local_to_global_index_map.values()), dtype=np.int64)
+        else:
+            labels = indices = np.arange(num_next, dtype=np.int64)
+
+        boundingBoxes = scipy.ndimage.find_objects(img_next)
+        starts = np.zeros((len(boundingBoxes) + 1, ndim), dtype=np.int64)
+        stops = np.zeros((len(boundingBoxes) + 1, ndim), dtype=np.int64)
+        for label, boundingBox in enumerate(boundingBoxes, start=1):
+            if boundingBox is not None:
+                starts[label] = [s.start for s in boundingBox[:ndim]]
+                stops[label] = [s.stop for s in boundingBox[:ndim]]
+        labels = np.where(labels < len(starts), labels, 0)
+        isCandidate = (labels != 0) & np.all(stops[labels] > starts[labels], axis=1)
+
+        if self.size_filter is None:
+            isCandidate[:] = False
+        else:
+            sizes = np.asarray(feats_next[self.size_name]).reshape(num_next, -1)[:, 0]
+            isCandidate &= sizes[indices] >= self.size_filter
+        labels = labels[isCandidate]
+        return indices[isCandidate], labels, starts[labels], stops[labels]
+
+    def _findObjectsInRois(self, img_next, labels, starts, stops, roiStarts, roiStops):
+        """
+        **returns** a boolean matrix that tells whether the object `labels[i, j]` with the bounding box
+        `starts[i, j]`, `stops[i, j]` has any pixels in the region of interest given by `roiStarts[i]`
+        and `roiStops[i]`
+        """
+        # objects whose bounding box is inside the roi are found without looking at the image,
+        # only objects on the border of the roi have to be checked pixel-wise
+        roiStarts = roiStarts[:, np.newaxis, :]
+        roiStops = roiStops[:, np.newaxis, :]
+        isInside = np.all(starts >= roiStarts, axis=2)
+        isInside &= np.all(stops <= roiStops, axis=2)
+        isOnBorder = (
+            ~isInside
+            & np.all(starts < roiStops, axis=2)
+            & np.all(stops > roiStarts, axis=2)
         )
+        for i, j in zip(*np.nonzero(isOnBorder)):
+            overlap = tuple(
+                slice(start, stop)
+                for start, stop in zip(
+                    np.maximum(starts[i, j], roiStarts[i, 0]),
+                    np.minimum(stops[i, j], roiStops[i, 0]),
+                )
+            )
+            isInside[i, j] = np.any(img_next[overlap] == labels[i, j])
+        return isInside
 
-        # initialize with label -1 and default value
-        result = np.array(
-            [[-1, default_value] for x in range(self.n_best)], dtype=np.float32
+    def _findBestChildren(self, coms_cur, feats_next, img_next, label_image_filename):
+        """
+        Find the `n_best` objects in the next frame closest to every object in `coms_cur`, among the objects
+        that pass the size filter and are visible in a window of `template_size` around the current object.
+
+        The candidates are found by a kd-tree query over the centers of the objects of the next frame.
+        Parents whose search is not conclusive yet are queried again with twice as many neighbors.
+
+        **returns** a tuple `(children, distances)` of matrices with `n_best` columns that contain the
+        indices of the children in `feats_next` sorted by distance, or -1 if there are fewer children,
+        and the distance to each child (or `squared_distance_default`)
+        """
+        num_parents, ndim = coms_cur.shape
+        children = np.full((num_parents, self.n_best), -1, dtype=np.int64)
+        distances = np.full(
+            (num_parents, self.n_best), self.squared_distance_default, dtype=np.float32
         )
-        if squaredDistances.shape[0] != 0:
-            result[
-                0 : min(squaredDistances.shape[0], result.shape[0]), :
-            ] = squaredDistances[0 : min(squaredDistances.shape[0], result.shape[0]), :]
+        if feats_next is None or img_next is None or num_parents == 0:
+            return children, distances
 
-        return result
+        indices, labels, starts, stops = self._getCandidateChildren(
+            feats_next, img_next, label_image_filename, ndim
+        )
+        if len(indices) == 0:
+            return children, distances
+        coms_next = np.asarray(feats_next[self.com_name_next])
+        coms_next = coms_next.reshape(len(coms_next), -1)[indices].astype(np.float64)
+        kdtree = KDTree(coms_next, metric="euclidean")
+        queries = coms_cur * np.array(self.scales)
+
+        # windows around the rounded centers of the current objects
+        centers = np.round(coms_cur)
+        roiStarts = np.maximum(centers - self.template_size / 2, 0).astype(np.int64)
+        roiStops = np.minimum(
+            centers + self.template_size / 2, img_next.shape[:ndim]
+        ).astype(np.int64)
+
+        # the center of an object with pixels in a window is at most this far away from the window,
+        # so objects further away from the query than all corners of the enlarged window can be ignored
+        extent = np.max(np.maximum(coms_next - starts, stops - coms_next), axis=0)
+        maxDistances = np.linalg.norm(
+            np.maximum(
+                np.abs(roiStarts - extent - queries),
+                np.abs(roiStops + extent - queries),
+            ),
+            axis=1,
+        )
+
+        pending = np.arange(num_parents)
+        k = min(self.n_best, len(indices))
+        while len(pending) > 0:
+            treeDistances, neighbors = kdtree.query(queries[pending], k=k)
+            isInRoi = self._findObjectsInRois(
+                img_next,
+                labels[neighbors],
+                starts[neighbors],
+                stops[neighbors],
+                roiStarts[pending],
+                roiStops[pending],
+            )
+
+            # sort the children in the window by distance, and by label on ties
+            exactDistances = np.linalg.norm(
+                coms_next[neighbors] - queries[pending][:, np.newaxis, :], axis=2
+            )
+            exactDistances[~isInRoi] = np.inf
+            order = np.lexsort((labels[neighbors], exactDistances), axis=1)
+            order = order[:, : self.n_best]
+            rows = np.arange(len(pending))[:, np.newaxis]
+            bestDistances = exactDistances[rows, order]
+            isValid = np.isfinite(bestDistances)
+
+            # a parent is done if no object that was not queried yet can be one of its children
+            lastDistances = treeDistances[:, -1] * (1 - 1e-9) - 1e-9
+            isDone = (k == len(indices)) | (lastDistances > maxDistances[pending])
+            if order.shape[1] == self.n_best:
+                isDone |= isValid[:, -1] & (lastDistances > bestDistances[:, -1])
+
+            done, doneRows = pending[isDone], rows[isDone]
+            numBest = order.shape[1]
+            children[done, :numBest] = np.where(
+                isValid[isDone], indices[neighbors[doneRows, order[isDone]]], -1
+            )
+            distances[done, :numBest] = np.where(
+                isValid[isDone], bestDistances[isDone], self.squared_distance_default
+            )
+            pending = pending[~isDone]
+            k = min(2 * k, len(indices))
+
+        return children, distances
 
     def computeFeatures_at(
         self, feats_cur, feats_next, img_next, feat_names, label_image_filename=None
     ):
         """
+        Compute the division features of all objects in `feats_cur`, which are based on
+        the `n_best` closest objects in the next frame as potential children.
+
         **Parameters:**
     
         * if `label_image_filename` is given, it is used to filter the objects from the feature dictionaries 
           that belong to that label image only (in the JST setting) 
+
+        **returns** a dictionary of feature matrices with one row per object, where the first row
+        belongs to the background
         """
 
-        #        n_labels = list(feats_cur.values())[0].shape[0]
         result = {}
 
         # find available features
-        vigra_feat_names = set([self.com_name_cur, self.com_name_next, self.size_name])
         feat_classes = {}
 
         for name in feat_names:
@@ -238,8 +439,6 @@ class FeatureManager(object):
             shape = (list(feats_cur.values())[0].shape[0], feat_classes[name].dim())
             result[name] = np.ones(shape) * feat_classes[name].default_value
 
-            vigra_feat_names.add(name_split[1])
-
         # initialize squared distances
         for idx in range(self.n_best):
             name = "SquaredDistances_" + str(idx)
@@ -248,106 +447,45 @@ class FeatureManager(object):
                 * self.squared_distance_default
             )
 
-        # construct mapping which we only need if label_image_filename was given and the features 'filename' and 'id' exist
-        if (
-            label_image_filename is not None
-            and "filename" in feats_next
-            and "id" in feats_next
-        ):
-            global_indices_current_label_image_only = [
-                l
-                for l, f in enumerate(feats_next["filename"])
-                if f == label_image_filename
-            ]
-            local_to_global_index_map = dict(
-                [
-                    (feats_next["id"][l], l)
-                    for l in global_indices_current_label_image_only
-                ]
+        # all objects but the background are potential parents,
+        # in the JST context only look at objects from a given segmentation hypotheses set
+        coms_cur = np.asarray(feats_cur[self.com_name_cur])
+        coms_cur = coms_cur.reshape(len(coms_cur), -1)
+        isParent = np.arange(len(coms_cur)) != 0
+        if label_image_filename is not None and "filename" in feats_cur:
+            isParent &= np.array(
+                [f == label_image_filename for f in feats_cur["filename"]], dtype=bool
             )
+        parents = np.flatnonzero(isParent)
 
-        # for every object in this frame, check which objects are in the vicinity in the next frame
-        valid_indices = [0]
-        for label_cur, com_cur in enumerate(feats_cur[self.com_name_cur]):
-            if (
-                label_image_filename is not None
-                and "filename" in feats_cur
-                and feats_cur["filename"][label_cur] != label_image_filename
-            ):
-                # in the JST context, only look at objects from a given segmentation hypotheses set
-                continue
-            if label_cur == 0:
-                continue
+        # for every object in this frame, find the closest objects in the vicinity in the next frame
+        children, distances = self._findBestChildren(
+            coms_cur[parents], feats_next, img_next, label_image_filename
+        )
+        num_children = np.sum(children >= 0, axis=1)
 
-            valid_indices.append(label_cur)
-            feats_next_subset = {}
-            for k in vigra_feat_names:
-                feats_next_subset[k] = {}
-
-            if feats_next is not None and img_next is not None:
-                # find roi around the center of the current object
-                idx_cur = [round(x) for x in com_cur]
-
-                roi = []
-                for idx, coord in enumerate(idx_cur):
-                    start = max(coord - self.template_size / 2, 0)
-                    stop = min(coord + self.template_size / 2, img_next.shape[idx])
-                    roi.append(slice(int(start), int(stop)))
-
-                # find all coms in the neighborhood of com_cur by checking the next frame's labelimage in the roi
-                subimg_next = img_next[roi]
-                labels_next = np.unique(subimg_next).tolist()
-
-                # if 'id' in features, map the labels first -- because labels_next refers image object ids,
-                # whereas the features are the union of objects from several segmentations
-                if "id" in feats_next:
-                    labels_next = [
-                        local_to_global_index_map[l] for l in labels_next if l != 0
-                    ]
-
-                for l in labels_next:
-                    if l != 0:
-                        for n in vigra_feat_names:
-                            feats_next_subset[n][l] = np.array(
-                                [feats_next[n][l]]
-                            ).flatten()
-
-            sq_dist_label = self._getBestSquaredDistances(
-                com_cur,
-                feats_next_subset[self.com_name_next],
-                self.size_filter,
-                feats_next_subset[self.size_name],
-                default_value=self.squared_distance_default,
-            )
+        # first add squared distances
+        for idx in range(self.n_best):
+            name = "SquaredDistances_" + str(idx)
+            result[name][parents, 0] = distances[:, idx]
 
-            feats_next_subset_best = {}
-            for n in vigra_feat_names:
-                feats_next_subset_best[n] = []
-                for idx, row in enumerate(sq_dist_label):
-                    l = row[0]
-                    if l != -1:
-                        feats_next_subset_best[n].append(feats_next_subset[n][l])
-
-            # first add squared distances
-            for idx in range(self.n_best):
-                name = "SquaredDistances_" + str(idx)
-                result[name][label_cur] = sq_dist_label[idx][1]
-
-            # add all other features
-            for name, feat_class in feat_classes.items():
-                if feat_class.feats_name == "SquaredDistances":
-                    f_next = sq_dist_label[0:2, 1]
-                    f_cur = None
-                else:
-                    f_cur = np.array(
-                        [feats_cur[feat_class.feats_name][label_cur]]
-                    ).flatten()
-                    f_next = np.array(
-                        [feats_next_subset_best[feat_class.feats_name]]
-                    ).reshape((-1, f_cur.shape[0]))
-                result[name][label_cur] = feat_class.compute(f_cur, f_next)
+        # add all other features
+        for name, feat_class in feat_classes.items():
+            if len(parents) == 0:
+                continue
+            f_cur = np.asarray(feats_cur[feat_class.feats_name])
+            f_cur = f_cur.reshape(len(f_cur), -1)[parents]
+            if feats_next is not None:
+                f_next = np.asarray(feats_next[feat_class.feats_name])
+                f_next = f_next.reshape(len(f_next), -1)[np.maximum(children, 0)]
+            else:
+                f_next = np.zeros(children.shape + f_cur.shape[1:], dtype=f_cur.dtype)
+            result[name][parents] = feat_class.computeForParents(
+                f_cur, f_next, num_children
+            ).reshape(len(parents), -1)
 
         # return only valid labels
+        valid_indices = np.concatenate([[0], parents])
         for feature_name in result:
             result[feature_name] = result[feature_name][valid_indices]
 
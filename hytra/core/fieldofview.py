@@ -4,7 +4,8 @@ import numpy as np
 class FieldOfView:
     """
     Replacement for pgmlink's field of view by simply copy'n'pasting it and adjusting so that it works.
-    FIXME: Could be made much nicer in python, using more Numpy functionality...
+    The faces of the field of view cube are computed once in the constructor, so that distances
+    to the border can be computed for many points at once (see `spatial_distances_to_border`).
     """
 
     def __init__(self, lt, lx, ly, lz, ut, ux, uy, uz):
@@ -13,9 +14,18 @@ class FieldOfView:
         """
         self.__lowerBound = np.array([lt, lx, ly, lz])
         self.__upperBound = np.array([ut, ux, uy, uz])
+        self.__initFaces()
 
-    def __dot(self, v1, v2):
-        return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
+    def __getstate__(self):
+        """Only the bounds are pickled, the faces are computed again when unpickling."""
+        return {
+            "_FieldOfView__lowerBound": self.__lowerBound,
+            "_FieldOfView__upperBound": self.__upperBound,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__initFaces()
 
     def __norm(self, v):
         return np.linalg.norm(v)
@@ -32,13 +42,51 @@ class FieldOfView:
         n = self.__norm(temp)
         return temp / n
 
-    def __abs_distance(self, p1, p2, p3, q):
-        u = p2 - p1
-        v = p3 - p1
+    def __initFaces(self):
+        """
+        Compute a point on each of the six faces of the fov cube and the faces' unit normals,
+        the extent of the fov perpendicular to each face (for relative distances),
+        and the number of faces to consider: in the 2D case where Z=0,
+        we take the planes with Z upper bound set to 1.0 and only use the 4 corresponding planes.
+        """
+        lb = self.__lowerBound.astype(np.float64)
+        ub = self.__upperBound.astype(np.float64)
+        zub = 1.0  # 2D case
+        self.__numFaces = 4
+        if ub[3] - lb[3] > 0:  # 3D case
+            zub = ub[3]
+            self.__numFaces = 6
+
+        # the corners of the fov cube
+        c1 = np.array([lb[1], lb[2], lb[3]])
+        c2 = np.array([ub[1], lb[2], lb[3]])
+        c3 = np.array([ub[1], ub[2], lb[3]])
+        c4 = np.array([lb[1], ub[2], lb[3]])
+        c5 = np.array([lb[1], lb[2], zub])
+        c6 = np.array([ub[1], lb[2], zub])
+        c8 = np.array([lb[1], ub[2], zub])
+
+        # the six faces of the cube, each given by three of its corners
+        faces = [
+            (c1, c2, c5),
+            (c2, c3, c6),
+            (c4, c3, c8),
+            (c1, c4, c5),
+            (c1, c2, c4),
+            (c5, c6, c8),
+        ]
+        self.__facePoints = np.array([p1 for p1, _, _ in faces])
+        self.__faceNormals = np.array(
+            [self.__hesse_normal(p2 - p1, p3 - p1) for p1, p2, p3 in faces]
+        )
 
-        normal = self.__hesse_normal(u, v)
-        w = q - p1
-        return np.abs(self.__dot(w, normal))
+        # normalize relative to radius of range
+        yExtent = ub[2] - lb[2]
+        xExtent = ub[1] - lb[1]
+        zExtent = zub - lb[3]
+        self.__faceExtents = np.array(
+            [yExtent, xExtent, yExtent, xExtent, zExtent, zExtent]
+        )
 
     def spatial_distance_to_border(self, t, x, y, z, relative=False):
         """
@@ -46,52 +94,32 @@ class FieldOfView:
         we take the planes with Z upper bound set to 1.0
         and return the distances to the 4 corresponding planes
         """
-        zub = 1.0  # 2D case
-        vlen = 4
+        return self.spatial_distances_to_border(np.array([[x, y, z]]), relative)[0]
 
-        if self.__upperBound[3] - self.__lowerBound[3] > 0:  # 3D case
-            zub = self.__upperBound[3]
-            vlen = 6
+    def spatial_distances_to_border(self, coordinates, relative=False):
+        """
+        Batch version of `spatial_distance_to_border`: computes the distance to the border of the
+        field of view for all points at once. `coordinates` is an `(N, 3)` array with the x, y, z
+        coordinates of one point per row. If it only has two columns, z is assumed to be 0.
 
-        # the eight corners of the fov cube
-        c1 = np.array(
-            [self.__lowerBound[1], self.__lowerBound[2], self.__lowerBound[3]]
-        )
-        c2 = np.array(
-            [self.__upperBound[1], self.__lowerBound[2], self.__lowerBound[3]]
-        )
-        c3 = np.array(
-            [self.__upperBound[1], self.__upperBound[2], self.__lowerBound[3]]
+        **returns** an array with the distance of every point
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(
+            len(coordinates), -1
         )
-        c4 = np.array(
-            [self.__lowerBound[1], self.__upperBound[2], self.__lowerBound[3]]
+        if coordinates.shape[1] == 2:
+            coordinates = np.hstack([coordinates, np.zeros((len(coordinates), 1))])
+
+        numFaces = self.__numFaces
+        ds = np.abs(
+            (
+                (coordinates[:, np.newaxis, :] - self.__facePoints[:numFaces])
+                * self.__faceNormals[:numFaces]
+            ).sum(axis=2)
         )
-
-        c5 = np.array([self.__lowerBound[1], self.__lowerBound[2], zub])
-        c6 = np.array([self.__upperBound[1], self.__lowerBound[2], zub])
-        # c7 = np.array([self.__upperBound[1], self.__upperBound[2], zub; # unuse])
-        c8 = np.array([self.__lowerBound[1], self.__upperBound[2], zub])
-
-        # distances to the six faces of the cube
-        ds = np.zeros(6)
-        q = np.array([x, y, z])
-        ds[0] = self.__abs_distance(c1, c2, c5, q)
-        ds[1] = self.__abs_distance(c2, c3, c6, q)
-        ds[2] = self.__abs_distance(c4, c3, c8, q)
-        ds[3] = self.__abs_distance(c1, c4, c5, q)
-        ds[4] = self.__abs_distance(c1, c2, c4, q)
-        ds[5] = self.__abs_distance(c5, c6, c8, q)
-
         if relative:
-            # normalize relative to radius of range
-            ds[0] /= self.__upperBound[2] - self.__lowerBound[2]  # / 2)
-            ds[1] /= self.__upperBound[1] - self.__lowerBound[1]  # / 2)
-            ds[2] /= self.__upperBound[2] - self.__lowerBound[2]  # / 2)
-            ds[3] /= self.__upperBound[1] - self.__lowerBound[1]  # / 2)
-            ds[4] /= zub - self.__lowerBound[3]  # / 2)
-            ds[5] /= zub - self.__lowerBound[3]  # / 2)
-        # return *min_element(ds, ds+vlen)
-        return np.min(ds[:vlen])
+            ds /= self.__faceExtents[:numFaces]
+        return np.min(ds, axis=1)
 
     def getUpperBound(self):
         return self.__upperBound
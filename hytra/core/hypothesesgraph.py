@@ -1,10 +1,13 @@
 import logging
 import copy
+import concurrent.futures
 import networkx as nx
 import numpy as np
 from sklearn.neighbors import KDTree
 import hytra.core.jsongraph
+import hytra.core.jsonstream
 from hytra.core.jsongraph import negLog, listify
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 from hytra.util.progressbar import DefaultProgressVisitor
 
 
@@ -35,6 +38,126 @@ def getTraxelFeatureVector(traxel, featureName, maxNumDimensions=3):
     return result
 
 
+def findNearestNeighbors(
+    kdtree, numTargets, sourceCenters, numNeighbors, maxNeighborDist
+):
+    """
+    Find the `numNeighbors[i]` closest elements in the kdtree that are less than `maxNeighborDist` away
+    of `sourceCenters[i]`, for all sources with a single query.
+    If the kdtree does not contain more than `numNeighbors[i]` elements, all of them are returned.
+
+    **returns** a tuple `(neighbors, isValid)` of two matrices with a row per source,
+    where `neighbors` contains indices into the objects of the kdtree, ordered by distance,
+    and only those entries where `isValid` is `True` are neighbors.
+    """
+    numSources = len(sourceCenters)
+    takesAllTargets = numNeighbors >= numTargets
+    queried = np.flatnonzero(~takesAllTargets)
+
+    numColumns = numTargets if np.any(takesAllTargets) else 0
+    if len(queried) > 0:
+        k = int(numNeighbors[queried].max())
+        numColumns = max(numColumns, k)
+
+    neighbors = np.zeros((numSources, numColumns), dtype=np.int64)
+    isValid = np.zeros((numSources, numColumns), dtype=bool)
+
+    if np.any(takesAllTargets):
+        neighbors[takesAllTargets, :numTargets] = np.arange(numTargets)
+        isValid[takesAllTargets, :numTargets] = True
+
+    if len(queried) > 0:
+        distances, queriedNeighbors = kdtree.query(
+            sourceCenters[queried], k=k, return_distance=True
+        )
+        neighbors[queried, :k] = queriedNeighbors
+        isValid[queried, :k] = (
+            np.arange(k)[np.newaxis, :] < numNeighbors[queried, np.newaxis]
+        ) & (distances < maxNeighborDist)
+
+    return neighbors, isValid
+
+
+def findLinkCandidatesForFrame(
+    frame,
+    centers,
+    numNeighbors,
+    targetFrameCenters,
+    numNearestNeighbors,
+    maxNeighborDist,
+    forwardBackwardCheck,
+):
+    """
+    Find the links from the objects of `frame` to the objects of the following frames.
+    Only depends on the centers of the involved frames, so that it can run for all frames in parallel
+    using `concurrent.futures.ProcessPoolExecutor` or `ThreadPoolExecutor`.
+
+    **Parameters:**
+
+    * `centers`: matrix with the center of every object of `frame` in a row
+    * `numNeighbors`: the number of nearest neighbors to link every object of `frame` to
+    * `targetFrameCenters`: list of tuples `(targetFrame, targetCenters)` of the frames to link to
+    * `numNearestNeighbors`: the number of nearest neighbors in `frame` of every object in a target frame
+      if `forwardBackwardCheck` is enabled
+
+    **returns** a tuple `(frame, forwardLinks, backwardLinks)` where both link lists are given
+    as a tuple of arrays `(sourceIndices, targetFrames, targetIndices)`, with indices into the rows of
+    `centers` and the respective target frame's centers. The links are ordered like they should
+    be inserted into the graph.
+    """
+    # find forward links, ordered by source object, target frame and distance
+    neighborsPerTargetFrame = []
+    for _, targetCenters in targetFrameCenters:
+        neighborsPerTargetFrame.append(
+            findNearestNeighbors(
+                KDTree(targetCenters, metric="euclidean"),
+                len(targetCenters),
+                centers,
+                numNeighbors,
+                maxNeighborDist,
+            )
+        )
+    numColumns = max(n.shape[1] for n, _ in neighborsPerTargetFrame)
+    neighbors = np.zeros(
+        (len(centers), len(targetFrameCenters), numColumns), dtype=np.int64
+    )
+    isValid = np.zeros(neighbors.shape, dtype=bool)
+    for i, (n, v) in enumerate(neighborsPerTargetFrame):
+        neighbors[:, i, : n.shape[1]] = n
+        isValid[:, i, : n.shape[1]] = v
+
+    targetFrames = np.array([f for f, _ in targetFrameCenters], dtype=np.int64)
+    sourceIndices, targetFrameIndices, columns = np.nonzero(isValid)
+    forwardLinks = (
+        sourceIndices,
+        targetFrames[targetFrameIndices],
+        neighbors[sourceIndices, targetFrameIndices, columns],
+    )
+
+    # find backward links, ordered by target frame, target object and distance
+    backwardLinks = ([], [], [])
+    if forwardBackwardCheck:
+        kdtree = KDTree(centers, metric="euclidean")
+        for targetFrame, targetCenters in targetFrameCenters:
+            neighbors, isValid = findNearestNeighbors(
+                kdtree,
+                len(centers),
+                targetCenters,
+                np.full(len(targetCenters), numNearestNeighbors, dtype=np.int64),
+                maxNeighborDist,
+            )
+            targetIndices, columns = np.nonzero(isValid)
+            backwardLinks[0].append(neighbors[targetIndices, columns])
+            backwardLinks[1].append(np.full(len(targetIndices), targetFrame))
+            backwardLinks[2].append(targetIndices)
+    backwardLinks = tuple(
+        np.concatenate(l).astype(np.int64) if len(l) > 0 else np.zeros(0, np.int64)
+        for l in backwardLinks
+    )
+
+    return frame, forwardLinks, backwardLinks
+
+
 class NodeMap:
     """
     To access per node features of the hypotheses graph,
@@ -71,6 +194,7 @@ class HypothesesGraph:
         self.allowLengthOneTracks = True
         self._nextNodeUuid = 0
         self.progressVisitor = DefaultProgressVisitor()
+        self._invalidateUuidTraxelMapping()
 
     def nodeIterator(self):
         return self._graph.nodes()
@@ -98,25 +222,6 @@ class HypothesesGraph:
     def target(edge):
         return edge[1]
 
-    def _findNearestNeighbors(
-        self, kdtreeObjectPair, traxel, numNeighbors, maxNeighborDist
-    ):
-        """
-        Return a list of object IDs which are the 'numNeighbors' closest elements 
-        in the kdtree less than maxNeighborDist away of the traxel.
-        """
-        kdtree, objectIdList = kdtreeObjectPair
-        if len(objectIdList) <= numNeighbors:
-            return objectIdList
-        distances, neighbors = kdtree.query(
-            [self._extractCenter(traxel)], k=numNeighbors, return_distance=True
-        )
-        return [
-            objectIdList[index]
-            for distance, index in zip(distances[0], neighbors[0])
-            if distance < maxNeighborDist
-        ]
-
     def _extractCenter(self, traxel):
         try:
             # python probabilityGenerator
@@ -141,31 +246,54 @@ class HypothesesGraph:
         assert "divProb" in traxel.Features
         return traxel.Features["divProb"][0] > divisionThreshold
 
-    def _buildFrameKdTree(self, traxelDict):
-        """
-        Collect the centers of all traxels and their ids of this frame's traxels.
-        Then build a kdtree and return (kdtree, listOfObjectIdsInFrame), where the second argument
-        is needed to decode the object id of the nearest neighbors in _findNearestNeighbors().
+    def _collectFrameCenters(self, traxelDict):
         """
-        objectIdList = []
-        features = []
-        for obj, traxel in traxelDict.items():
-            if obj == 0:
-                continue
-            objectIdList.append(obj)
-            features.append(list(self._extractCenter(traxel)))
+        Stack the centers of all traxels of this frame into one matrix.
 
-        return (KDTree(features, metric="euclidean"), objectIdList)
+        **returns** a tuple `(objectIds, centers)` where row `i` of `centers` is the center of the object
+        with ID `objectIds[i]`
+        """
+        objectIds = [obj for obj in traxelDict.keys() if obj != 0]
+        centers = np.array(
+            [list(self._extractCenter(traxelDict[obj])) for obj in objectIds],
+            dtype=np.float64,
+        )
+        return np.array(objectIds, dtype=np.int64), centers.reshape(len(objectIds), -1)
 
     def _addNodesForFrame(self, frame, traxelDict):
         """
         Insert nodes for all objects in this frame, with the attribute "traxel"
+
+        **returns** the unique IDs of the inserted nodes, in the order of `traxelDict`
         """
+        nodeUuids = []
         for obj, traxel in traxelDict.items():
             if obj == 0:
                 continue
             self._graph.add_node((frame, obj), traxel=traxel, id=self._nextNodeUuid)
+            self._invalidateUuidTraxelMapping()
+            nodeUuids.append(self._nextNodeUuid)
             self._nextNodeUuid += 1
+        return np.array(nodeUuids, dtype=np.int64)
+
+    def _addLinks(
+        self, sourceFrame, sourceIds, sourceUuids, targetFrames, targetIds, targetUuids
+    ):
+        """
+        Insert links from the objects `sourceIds` in `sourceFrame` to the objects `targetIds`
+        in the respective `targetFrames`, with the attributes "src" and "dest" holding the nodes' unique IDs.
+        All but `sourceFrame` are arrays with one entry per link.
+        """
+        self._graph.add_edges_from(
+            ((sourceFrame, s), (t, d), {"src": su, "dest": du})
+            for s, su, t, d, du in zip(
+                sourceIds.tolist(),
+                sourceUuids.tolist(),
+                targetFrames.tolist(),
+                targetIds.tolist(),
+                targetUuids.tolist(),
+            )
+        )
 
     def addNodeFromTraxel(self, traxel, **kwargs):
         """
@@ -178,6 +306,7 @@ class HypothesesGraph:
             (traxel.Timestep, traxel.Id), traxel=traxel, id=self._nextNodeUuid, **kwargs
         )
         self._nextNodeUuid += 1
+        self._invalidateUuidTraxelMapping()
 
     def buildFromProbabilityGenerator(
         self,
@@ -188,141 +317,123 @@ class HypothesesGraph:
         withDivisions=True,
         divisionThreshold=0.1,
         skipLinks=1,
+        numWorkers=None,
+        useMultiprocessing=False,
     ):
         """
         Takes a python probabilityGenerator containing traxel features and finds probable links between frames.
-        Builds a kdTree with the 'numNearestneighbors' for each frame and adds the nodes. In the same iteration, it adds
-        a number of 'skipLinks' between the nodes separated by 'skipLinks' frames.
+        Adds a node for every traxel, and links each traxel to its 'numNearestNeighbors' closest traxels in each of
+        the next 'skipLinks' frames (and vice versa if 'forwardBackwardCheck' is enabled).
+
+        The centers of all traxels of a frame are stacked into one kdTree, which is then queried once
+        per pair of frames, and the found links are added to the graph in bulk.
+
+        If `numWorkers` is given, the links of all frames are searched concurrently
+        by that many processes (if `useMultiprocessing=True`) or threads. The graph is the same in any case.
         """
         assert probabilityGenerator is not None
         assert len(probabilityGenerator.TraxelsPerFrame) > 0
         assert skipLinks > 0
 
-        def checkNodeWhileAddingLinks(frame, obj):
-            if (frame, obj) not in self._graph:
-                logger.warning(
-                    "Adding node ({}, {}) when setting up links".format(frame, obj)
-                )
-
-        kdTreeFrames = [None] * (skipLinks + 1)
+        traxelsPerFrame = probabilityGenerator.TraxelsPerFrame
         # len(probabilityGenerator.TraxelsPerFrame.keys()) is NOT an indicator for the total number of frames,
         # because an empty frame does not create a key in the dictionary. E.g. for one frame in the middle of the
         # dataset, we won't access the last one.
         # Idea: take the max key in the dict. Remember, frame numbering starts with 0.
-        frameMax = max(probabilityGenerator.TraxelsPerFrame.keys())
-        frameMin = min(probabilityGenerator.TraxelsPerFrame.keys())
+        frameMax = max(traxelsPerFrame.keys())
+        frameMin = min(traxelsPerFrame.keys())
         numFrames = frameMax - frameMin + 1
 
         self.progressVisitor.showState("Probability Generator")
 
-        countFrames = 0
-        for frame in range(numFrames):
-            countFrames += 1
-            self.progressVisitor.showProgress(countFrames / float(numFrames))
-            if frame > 0:
-                del kdTreeFrames[0]  # this is the current frame
-                if (
-                    frame + skipLinks < numFrames
-                    and frameMin + frame + skipLinks
-                    in probabilityGenerator.TraxelsPerFrame.keys()
-                ):
-                    kdTreeFrames.append(
-                        self._buildFrameKdTree(
-                            probabilityGenerator.TraxelsPerFrame[
-                                frameMin + frame + skipLinks
-                            ]
-                        )
-                    )
-                    self._addNodesForFrame(
-                        frameMin + frame + skipLinks,
-                        probabilityGenerator.TraxelsPerFrame[
-                            frameMin + frame + skipLinks
-                        ],
+        # add all nodes, and collect the object ids and centers of every non-empty frame
+        frameCenters = {}
+        nodeUuidsPerFrame = {}
+        for frame in range(frameMin, frameMax + 1):
+            if frame in traxelsPerFrame:
+                objectIds, centers = self._collectFrameCenters(traxelsPerFrame[frame])
+                nodeUuidsPerFrame[frame] = self._addNodesForFrame(
+                    frame, traxelsPerFrame[frame]
+                )
+                if len(objectIds) > 0:
+                    frameCenters[frame] = (objectIds, centers)
+
+        def getNumNeighbors(frame):
+            numNeighbors = np.full(
+                len(frameCenters[frame][0]), numNearestNeighbors, dtype=np.int64
+            )
+            if numNearestNeighbors < 2 and withDivisions:
+                traxels = traxelsPerFrame[frame]
+                mightDivide = np.array(
+                    [
+                        self._traxelMightDivide(traxels[obj], divisionThreshold)
+                        for obj in frameCenters[frame][0].tolist()
+                    ],
+                    dtype=bool,
+                )
+                numNeighbors[mightDivide] = 2
+            return numNeighbors
+
+        # add the links from objects in `sourceFrame` to objects in the (per link) `targetFrames`
+        def addLinks(sourceFrame, sourceIndices, targetFrames, targetIndices):
+            targetIds = np.zeros(len(targetIndices), dtype=np.int64)
+            targetUuids = np.zeros(len(targetIndices), dtype=np.int64)
+            for targetFrame in np.unique(targetFrames).tolist():
+                inTargetFrame = targetFrames == targetFrame
+                indices = targetIndices[inTargetFrame]
+                targetIds[inTargetFrame] = frameCenters[targetFrame][0][indices]
+                targetUuids[inTargetFrame] = nodeUuidsPerFrame[targetFrame][indices]
+            self._addLinks(
+                sourceFrame,
+                frameCenters[sourceFrame][0][sourceIndices],
+                nodeUuidsPerFrame[sourceFrame][sourceIndices],
+                targetFrames,
+                targetIds,
+                targetUuids,
+            )
+
+        # arguments of `findLinkCandidatesForFrame` for every frame that has links to later frames
+        def linkCandidateArguments():
+            for frame in sorted(frameCenters.keys()):
+                targetFrameCenters = [
+                    (frame + i, frameCenters[frame + i][1])
+                    for i in range(1, skipLinks + 1)
+                    if frame + i in frameCenters
+                ]
+                if len(targetFrameCenters) > 0:
+                    yield (
+                        frame,
+                        frameCenters[frame][1],
+                        getNumNeighbors(frame),
+                        targetFrameCenters,
+                        numNearestNeighbors,
+                        maxNeighborDist,
+                        forwardBackwardCheck,
                     )
+
+        def insertLinks(frame, forwardLinks, backwardLinks):
+            self.progressVisitor.showProgress((frame - frameMin + 1) / float(numFrames))
+            addLinks(frame, *forwardLinks)
+            addLinks(frame, *backwardLinks)
+
+        if numWorkers:
+            if useMultiprocessing:
+                ExecutorType = concurrent.futures.ProcessPoolExecutor
             else:
-                for i in range(0, skipLinks + 1):
-                    if (
-                        frameMin + frame + i
-                        in probabilityGenerator.TraxelsPerFrame.keys()
-                    ):  # empty frame
-                        kdTreeFrames[i] = self._buildFrameKdTree(
-                            probabilityGenerator.TraxelsPerFrame[frameMin + frame + i]
-                        )
-                        self._addNodesForFrame(
-                            frameMin + frame + i,
-                            probabilityGenerator.TraxelsPerFrame[frameMin + frame + i],
-                        )
+                # threads share the centers without copying them, and the kdtree queries release the GIL
+                ExecutorType = concurrent.futures.ThreadPoolExecutor
 
-            # find forward links
-            if (
-                frameMin + frame in probabilityGenerator.TraxelsPerFrame.keys()
-            ):  # 'frame' could be empty
-                for obj, traxel in probabilityGenerator.TraxelsPerFrame[
-                    frameMin + frame
-                ].items():
-                    divisionPreservingNumNearestNeighbors = numNearestNeighbors
-                    if (
-                        divisionPreservingNumNearestNeighbors < 2
-                        and withDivisions
-                        and self._traxelMightDivide(traxel, divisionThreshold)
-                    ):
-                        divisionPreservingNumNearestNeighbors = 2
-                    for i in range(1, skipLinks + 1):
-                        if (
-                            frame + i < numFrames
-                            and frameMin + frame + i
-                            in probabilityGenerator.TraxelsPerFrame.keys()
-                        ):
-                            neighbors = self._findNearestNeighbors(
-                                kdTreeFrames[i],
-                                traxel,
-                                divisionPreservingNumNearestNeighbors,
-                                maxNeighborDist,
-                            )
-                            # type(neighbors) is list
-                            for n in neighbors:
-                                edge_start = (frameMin + frame, obj)
-                                edge_end = (frameMin + frame + i, n)
-                                checkNodeWhileAddingLinks(*edge_start)
-                                checkNodeWhileAddingLinks(*edge_end)
-                                self._graph.add_edge(edge_start, edge_end)
-                                self._graph.edges[edge_start, edge_end][
-                                    "src"
-                                ] = self._graph.nodes[edge_start]["id"]
-                                self._graph.edges[edge_start, edge_end][
-                                    "dest"
-                                ] = self._graph.nodes[edge_end]["id"]
-
-            # find backward links
-            if forwardBackwardCheck:
-                for i in range(1, skipLinks + 1):
-                    if frame + i < numFrames:
-                        if (
-                            frameMin + frame + i
-                            in probabilityGenerator.TraxelsPerFrame.keys()
-                        ):  # empty frame
-                            for obj, traxel in probabilityGenerator.TraxelsPerFrame[
-                                frameMin + frame + i
-                            ].items():
-                                if kdTreeFrames[0] is not None:
-                                    neighbors = self._findNearestNeighbors(
-                                        kdTreeFrames[0],
-                                        traxel,
-                                        numNearestNeighbors,
-                                        maxNeighborDist,
-                                    )
-                                    for n in neighbors:
-                                        edge_start = (frameMin + frame, n)
-                                        edge_end = (frameMin + frame + i, obj)
-                                        checkNodeWhileAddingLinks(*edge_start)
-                                        checkNodeWhileAddingLinks(*edge_end)
-                                        self._graph.add_edge(edge_start, edge_end)
-                                        self._graph.edges[edge_start, edge_end][
-                                            "src"
-                                        ] = self._graph.nodes[edge_start]["id"]
-                                        self._graph.edges[edge_start, edge_end][
-                                            "dest"
-                                        ] = self._graph.nodes[edge_end]["id"]
+            with ExecutorType(max_workers=numWorkers) as executor:
+                jobs = [
+                    executor.submit(findLinkCandidatesForFrame, *args)
+                    for args in linkCandidateArguments()
+                ]
+                # insert the links in the order of the frames to get the same graph as without workers
+                for job in jobs:
+                    insertLinks(*job.result())
+        else:
+            for args in linkCandidateArguments():
+                insertLinks(*findLinkCandidatesForFrame(*args))
 
     def generateTrackletGraph(self):
         """
@@ -333,69 +444,89 @@ class HypothesesGraph:
         The `'tracklet'` node map contains a list of traxels that each node represents.
         """
         logger.info("generating tracklet graph...")
-        tracklet_graph = copy.copy(self)
-        tracklet_graph._graph = tracklet_graph._graph.copy()
-        tracklet_graph.withTracklets = True
-        tracklet_graph.referenceTraxelGraph = self
-        tracklet_graph.progressVisitor = self.progressVisitor
-
-        self.progressVisitor.showState("Initializing Tracklet Graph")
-        # initialize tracklet map to contain a list of only one traxel per node
-        countNodes = 0
-        numNodes = tracklet_graph.countNodes()
-        for node in tracklet_graph._graph.nodes():
-            countNodes += 1
-            self.progressVisitor.showProgress(countNodes / float(numNodes))
-            tracklet_graph._graph.nodes[node]["tracklet"] = [
-                tracklet_graph._graph.nodes[node]["traxel"]
-            ]
-            del tracklet_graph._graph.nodes[node]["traxel"]
+        graph = self._graph
 
         # set up a list of links that indicates whether the target's in- and source's out-degree
         # are one, meaning the edge can be contracted
-        links_to_be_contracted = []
-        node_remapping = {}
         self.progressVisitor.showState("Finding Tracklets in Graph")
-        countEdges = 0
-        numEdges = tracklet_graph.countArcs()
-        for edge in tracklet_graph._graph.edges():
-            countEdges += 1
-            self.progressVisitor.showProgress(countEdges / float(numEdges))
-            if (
-                tracklet_graph._graph.out_degree(edge[0]) == 1
-                and tracklet_graph._graph.in_degree(edge[1]) == 1
-            ):
-                links_to_be_contracted.append(edge)
-                for i in [0, 1]:
-                    node_remapping[edge[i]] = edge[i]
+        links_to_be_contracted = [
+            (src, dest)
+            for src, dest in graph.edges()
+            if len(graph.succ[src]) == 1 and len(graph.pred[dest]) == 1
+        ]
 
-        # apply edge contraction
+        # contract the links in the same order as if we removed the contracted nodes one by one.
+        # Instead of modifying a graph, every tracklet is kept as a linked list of nodes from its first to
+        # its last traxel, and contracted nodes point to the node they were merged into.
         self.progressVisitor.showState("Contracting Edges in Tracklet Graph")
-        countLinks = 0
+        mergedInto = {}
+        nextNode = {}
+        lastNode = {}
+        lastContraction = {}
+
+        def findTrackletNode(node):
+            root = node
+            while root in mergedInto:
+                root = mergedInto[root]
+            while node != root:
+                mergedInto[node], node = root, mergedInto[node]
+            return root
+
         numLinks = len(links_to_be_contracted)
-        for edge in links_to_be_contracted:
-            countLinks += 1
-            self.progressVisitor.showProgress(countLinks / float(numLinks))
-            src = node_remapping[edge[0]]
-            dest = node_remapping[edge[1]]
-            if (
-                tracklet_graph._graph.in_degree(src) == 0
-                and tracklet_graph._graph.out_degree(dest) == 0
-            ):
+        for countLinks, edge in enumerate(links_to_be_contracted):
+            self.progressVisitor.showProgress((countLinks + 1) / float(numLinks))
+            src = findTrackletNode(edge[0])
+            dest = findTrackletNode(edge[1])
+            # the tracklet's incoming links are those of its first node, the outgoing ones those of its last node
+            destLastNode = lastNode.get(dest, dest)
+            if len(graph.pred[src]) == 0 and len(graph.succ[destLastNode]) == 0:
                 # if this tracklet would contract to a single node without incoming or outgoing edges,
                 # then do NOT contract, as our tracking cannot handle length-one-tracks
                 continue
 
-            tracklet_graph._graph.nodes[src]["tracklet"].extend(
-                tracklet_graph._graph.nodes[dest]["tracklet"]
+            nextNode[lastNode.get(src, src)] = dest
+            lastNode[src] = destLastNode
+            lastNode.pop(dest, None)
+            mergedInto[dest] = src
+            # contracting re-inserts the outgoing links, which moves them to the end of their targets' predecessors
+            lastContraction[src] = countLinks
+            lastContraction.pop(dest, None)
+
+        # build the tracklet graph. The tracklet map contains the list of traxels that each node represents
+        self.progressVisitor.showState("Initializing Tracklet Graph")
+        trackletNodes = [n for n in graph.nodes() if n not in mergedInto]
+        trackletGraph = nx.DiGraph()
+        trackletGraph.graph.update(graph.graph)
+        numNodes = len(trackletNodes)
+        for countNodes, node in enumerate(trackletNodes):
+            self.progressVisitor.showProgress((countNodes + 1) / float(numNodes))
+            attributes = graph.nodes[node].copy()
+            tracklet = [attributes.pop("traxel")]
+            n = node
+            while n in nextNode:
+                n = nextNode[n]
+                tracklet.append(graph.nodes[n]["traxel"])
+            attributes["tracklet"] = tracklet
+            trackletGraph.add_node(node, **attributes)
+
+        # links of tracklets that were not contracted keep their attributes, re-inserted ones are empty
+        for node in trackletNodes:
+            if node not in lastContraction:
+                trackletGraph.add_edges_from(
+                    (node, target, attributes.copy())
+                    for target, attributes in graph.succ[node].items()
+                )
+        for node in sorted(lastContraction.keys(), key=lastContraction.get):
+            trackletGraph.add_edges_from(
+                (node, target) for target in graph.succ[lastNode[node]]
             )
-            # duplicate out arcs with new source
-            for out_edge in tracklet_graph._graph.out_edges(dest):
-                tracklet_graph._graph.add_edge(src, out_edge[1])
-            # adjust node remapping to point to new source for all contracted traxels
-            for t in tracklet_graph._graph.nodes[dest]["tracklet"]:
-                node_remapping[(t.Timestep, t.Id)] = src
-            tracklet_graph._graph.remove_node(dest)
+
+        tracklet_graph = copy.copy(self)
+        tracklet_graph._graph = trackletGraph
+        tracklet_graph._invalidateUuidTraxelMapping()
+        tracklet_graph.withTracklets = True
+        tracklet_graph.referenceTraxelGraph = self
+        tracklet_graph.progressVisitor = self.progressVisitor
 
         logger.info(
             "tracklet graph has {} nodes and {} edges (before {},{})".format(
@@ -541,54 +672,131 @@ class HypothesesGraph:
             self._graph.edges[a[0], a[1]]["dest"] = self._graph.nodes[a[1]]["id"]
             self._graph.edges[a[0], a[1]]["features"] = features
 
-    def getMappingsBetweenUUIDsAndTraxels(self):
+    def insertEnergyMatrices(
+        self,
+        detectionFeatures,
+        divisionFeatures,
+        appearanceFeatures,
+        disappearanceFeatures,
+        transitionFeatures,
+        skipLinksBias,
+    ):
         """
-        Extract the mapping from UUID to traxel and vice versa from the networkx graph.
+        Insert energies that were computed for all nodes and links at once, instead of
+        per element as in `insertEnergies`. The energies are stored under the same attribute names,
+        and skip links get the same bias. Tracklet graphs are not supported.
 
-        ** Returns: a tuple of **
+        ** Parameters: **
 
-        * `traxelIdPerTimestepToUniqueIdMap`: a dictionary of the structure `{str(timestep):{str(labelimageId):int(uuid), 
-         str(labelimageId):int(uuid), ...}, str(nextTimestep):{}, ...}`
-        * `uuidToTraxelMap`: a dictionary with keys = int(uuid), values = list(of timestep-Id-tuples (int(Timestep), int(Id)))
+        * `detectionFeatures`: matrix of detection energies with one row of length `maxNumObjects + 1` per node,
+         in the order of `nodeIterator()`
+        * `divisionFeatures`: list with the division energies of each node, or `None` for nodes that cannot divide
+        * `appearanceFeatures`: matrix of appearance energies with the same shape as `detectionFeatures`
+        * `disappearanceFeatures`: matrix of disappearance energies with the same shape as `detectionFeatures`
+        * `transitionFeatures`: matrix of transition energies with one row per link, in the order of `arcIterator()`
+        * `skipLinksBias`: bias that is added, times the frame gap, to the energy of one object in a skip link
         """
+        assert not self.withTracklets, "Tracklet graphs need insertEnergies()"
+        self.progressVisitor.showState("Inserting energies")
 
-        uuidToTraxelMap = {}
-        traxelIdPerTimestepToUniqueIdMap = {}
-
+        for n, detection, division, appearance, disappearance in zip(
+            self._graph.nodes(),
+            np.asarray(detectionFeatures).tolist(),
+            divisionFeatures,
+            np.asarray(appearanceFeatures).tolist(),
+            np.asarray(disappearanceFeatures).tolist(),
+        ):
+            attributes = self._graph.nodes[n]
+            attributes["features"] = listify(detection)
+            if division is not None:
+                attributes["divisionFeatures"] = listify(list(division))
+            attributes["appearanceFeatures"] = listify(appearance)
+            attributes["disappearanceFeatures"] = listify(disappearance)
+            timestep = attributes["traxel"].Timestep
+            attributes["timestep"] = [timestep, timestep]
+
+        arcs = list(self._graph.edges())
+        transitionFeatures = np.array(transitionFeatures, dtype=np.float64)
+        frameGaps = np.array([a[1][0] - a[0][0] for a in arcs], dtype=np.int64)
+        isSkipLink = frameGaps > 1
+        transitionFeatures[isSkipLink, 1] += skipLinksBias * frameGaps[isSkipLink]
+
+        for a, features in zip(arcs, transitionFeatures.tolist()):
+            attributes = self._graph.edges[a[0], a[1]]
+            attributes["src"] = self._graph.nodes[a[0]]["id"]
+            attributes["dest"] = self._graph.nodes[a[1]]["id"]
+            attributes["features"] = listify(features)
+        self.progressVisitor.showProgress(1.0)
+
+    def _invalidateUuidTraxelMapping(self):
+        """ Make sure that the mapping between UUIDs and traxels is recomputed when it is needed next """
+        self._uuidTraxelMapping = None
+        self._uuidTraxelMappingGraph = None
+
+    def _createUuidTraxelMapping(self):
+        mapping = UuidTraxelMapping()
         for n in self._graph.nodes():
-            uuid = self._graph.nodes[n]["id"]
-            traxels = []
             if self.withTracklets:
                 traxels = self._graph.nodes[n]["tracklet"]
             else:
                 traxels = [self._graph.nodes[n]["traxel"]]
-            uuidToTraxelMap[uuid] = [(t.Timestep, t.Id) for t in traxels]
+            mapping.add(
+                self._graph.nodes[n]["id"], [(t.Timestep, t.Id) for t in traxels]
+            )
+        return mapping
 
-            for t in uuidToTraxelMap[uuid]:
-                traxelIdPerTimestepToUniqueIdMap.setdefault(str(t[0]), {})[
-                    str(t[1])
-                ] = uuid
+    def getUuidTraxelMapping(self):
+        """
+        **returns** the `hytra.core.uuidtraxelmapping.UuidTraxelMapping` between the UUIDs of the nodes
+        and the traxels they contain. It is only computed again after nodes were added to the graph,
+        so it must not be modified (use its `copy()` instead).
+        If the UUIDs of nodes are changed in the graph directly, call `_invalidateUuidTraxelMapping()`.
+        """
+        if (
+            self._uuidTraxelMapping is None
+            or self._uuidTraxelMappingGraph is not self._graph
+            or len(self._uuidTraxelMapping) != self.countNodes()
+        ):
+            self._uuidTraxelMapping = self._createUuidTraxelMapping()
+            self._uuidTraxelMappingGraph = self._graph
+        return self._uuidTraxelMapping
 
-        # sort the list of traxels per UUID by their timesteps
-        for v in uuidToTraxelMap.values():
-            v.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
+    def getMappingsBetweenUUIDsAndTraxels(self):
+        """
+        Extract the mapping from UUID to traxel and vice versa from the networkx graph.
+        Prefer `getUuidTraxelMapping()`, which is computed only once and uses integer keys.
 
-        return traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap
+        ** Returns: a tuple of **
 
-    def toTrackingGraph(self, noFeatures=False):
+        * `traxelIdPerTimestepToUniqueIdMap`: a dictionary of the structure `{str(timestep):{str(labelimageId):int(uuid), 
+         str(labelimageId):int(uuid), ...}, str(nextTimestep):{}, ...}`
+        * `uuidToTraxelMap`: a dictionary with keys = int(uuid), values = list(of timestep-Id-tuples (int(Timestep), int(Id)))
         """
-        Create a dictionary representation of this graph which can be passed to the solvers directly.
-        The resulting graph (=model) is wrapped within a `hytra.jsongraph.JsonTrackingGraph` structure for convenience.
+        mapping = self.getUuidTraxelMapping()
+        return mapping.toTraxelToUniqueId(), mapping.copy().getUuidToTraxelMap()
+
+    def _getDefaultSettings(self):
+        """ **returns** the default solver settings of the model created by `toTrackingGraph` """
+        return {
+            "statesShareWeights": True,
+            "allowPartialMergerAppearance": False,
+            "requireSeparateChildrenOfDivision": True,
+            "optimizerEpGap": 0.01,
+            "optimizerVerbose": True,
+            "optimizerNumThreads": 1,
+        }
+
+    def iterSegmentationHypotheses(self, noFeatures=False):
+        """
+        Iterate over the dictionary representations of all nodes,
+        as they are stored in the `segmentationHypotheses` of the model created by `toTrackingGraph`.
         If `noFeatures` is `True`, then only the structure of the graph will be exported.
         """
         requiredNodeAttribs = ["id"]
-        requiredLinkAttribs = ["src", "dest"]
-
         if not noFeatures:
             requiredNodeAttribs.append("features")
-            requiredLinkAttribs.append("features")
 
-        def translateNodeToDict(n):
+        for n in self._graph.nodes():
             result = {}
             attrs = self._graph.nodes[n]
             for k in [
@@ -605,9 +813,19 @@ class HypothesesGraph:
                     raise ValueError(
                         "Cannot use graph nodes without assigned ID and features, run insertEnergies() first"
                     )
-            return result
+            yield result
+
+    def iterLinkingHypotheses(self, noFeatures=False):
+        """
+        Iterate over the dictionary representations of all links,
+        as they are stored in the `linkingHypotheses` of the model created by `toTrackingGraph`.
+        If `noFeatures` is `True`, then only the structure of the graph will be exported.
+        """
+        requiredLinkAttribs = ["src", "dest"]
+        if not noFeatures:
+            requiredLinkAttribs.append("features")
 
-        def translateLinkToDict(l):
+        for l in self._graph.edges():
             result = {}
             attrs = self._graph.edges[l[0], l[1]]
             for k in ["src", "dest", "features"]:
@@ -617,28 +835,50 @@ class HypothesesGraph:
                     raise ValueError(
                         "Cannot use graph links without source, target, and features, run insertEnergies() first"
                     )
-            return result
+            yield result
 
-        traxelIdPerTimestepToUniqueIdMap, _ = self.getMappingsBetweenUUIDsAndTraxels()
-        model = {
-            "segmentationHypotheses": [
-                translateNodeToDict(n) for n in self._graph.nodes()
-            ],
-            "linkingHypotheses": [translateLinkToDict(e) for e in self._graph.edges()],
-            "divisionHypotheses": [],
-            "traxelToUniqueId": traxelIdPerTimestepToUniqueIdMap,
-            "settings": {
-                "statesShareWeights": True,
-                "allowPartialMergerAppearance": False,
-                "requireSeparateChildrenOfDivision": True,
-                "optimizerEpGap": 0.01,
-                "optimizerVerbose": True,
-                "optimizerNumThreads": 1,
-            },
-        }
+    def iterTraxelToUniqueId(self):
+        """
+        Iterate over the `traxelToUniqueId` map of the model created by `toTrackingGraph` timestep by timestep.
 
-        # extract exclusion sets:
-        exclusions = set([])
+        **returns** a generator of tuples `(str(timestep), {str(labelimageId):int(uuid), ...})`
+
+        The map of a timestep is yielded as soon as the nodes move on to the next timestep.
+        Only if the nodes are not ordered by timestep, e.g. in a tracklet graph,
+        the whole map is built first (see `getMappingsBetweenUUIDsAndTraxels`).
+        """
+        nodesOrderedByTimestep = not self.withTracklets
+        if nodesOrderedByTimestep:
+            visitedTimesteps = set()
+            previousTimestep = None
+            for timestep, _ in self._graph.nodes():
+                if timestep != previousTimestep:
+                    if timestep in visitedTimesteps:
+                        nodesOrderedByTimestep = False
+                        break
+                    visitedTimesteps.add(timestep)
+                    previousTimestep = timestep
+
+        if not nodesOrderedByTimestep:
+            yield from self.getUuidTraxelMapping().toTraxelToUniqueId().items()
+            return
+
+        previousTimestep = None
+        uniqueIds = {}
+        for (timestep, objectId), uuid in self._graph.nodes(data="id"):
+            if timestep != previousTimestep and len(uniqueIds) > 0:
+                yield str(previousTimestep), uniqueIds
+                uniqueIds = {}
+            previousTimestep = timestep
+            uniqueIds[str(objectId)] = uuid
+        if len(uniqueIds) > 0:
+            yield str(previousTimestep), uniqueIds
+
+    def _iterConflictingTraxels(self):
+        """
+        **returns** a generator of tuples `(uuid, conflictingUuids)` for all traxels
+        with conflicting traxel IDs
+        """
         for n in self._graph.nodes():
             if self.withTracklets:
                 traxel = self._graph.nodes[n]["tracklet"][0]
@@ -650,29 +890,83 @@ class HypothesesGraph:
                     logger.error(
                         "Exclusion constraints do not work with tracklets yet!"
                     )
+                    mapping = self.getUuidTraxelMapping()
+                    conflictingIds = [
+                        mapping.getUuid(traxel.Timestep, i)
+                        for i in traxel.conflictingTraxelIds
+                    ]
+                    myId = mapping.getUuid(traxel.Timestep, traxel.Id)
+                else:
+                    conflictingIds = [
+                        self._graph.nodes[(traxel.Timestep, i)]["id"]
+                        for i in traxel.conflictingTraxelIds
+                    ]
+                    myId = self._graph.nodes[n]["id"]
+                yield myId, conflictingIds
+
+    def iterExclusions(self):
+        """
+        Iterate over the pairwise exclusion constraints `[uuid, uuid]` between conflicting traxels,
+        as they are stored in the `exclusions` of the model created by `toTrackingGraph`.
+        The lower ID is always put first, and every pair is only yielded once.
+        """
+        exclusions = set([])
+        for myId, conflictingIds in self._iterConflictingTraxels():
+            for ci in conflictingIds:
+                # insert pairwise exclusion constraints only, and always put the lower id first
+                exclusion = (ci, myId) if ci < myId else (myId, ci)
+                if exclusion not in exclusions:
+                    exclusions.add(exclusion)
+                    yield list(exclusion)
 
-                conflictingIds = [
-                    traxelIdPerTimestepToUniqueIdMap[str(traxel.Timestep)][str(i)]
-                    for i in traxel.conflictingTraxelIds
-                ]
-                myId = traxelIdPerTimestepToUniqueIdMap[str(traxel.Timestep)][
-                    str(traxel.Id)
-                ]
-                for ci in conflictingIds:
-                    # insert pairwise exclusion constraints only, and always put the lower id first
-                    if ci < myId:
-                        exclusions.add((ci, myId))
-                    else:
-                        exclusions.add((myId, ci))
+    def toTrackingGraph(self, noFeatures=False):
+        """
+        Create a dictionary representation of this graph which can be passed to the solvers directly.
+        The resulting graph (=model) is wrapped within a `hytra.jsongraph.JsonTrackingGraph` structure for convenience.
+        If `noFeatures` is `True`, then only the structure of the graph will be exported.
 
-        model["exclusions"] = [list(t) for t in exclusions]
+        To write the model of a very large graph to disk without creating the dictionary, use `writeTrackingGraph`.
+        """
+        model = {
+            "segmentationHypotheses": list(self.iterSegmentationHypotheses(noFeatures)),
+            "linkingHypotheses": list(self.iterLinkingHypotheses(noFeatures)),
+            "divisionHypotheses": [],
+            "traxelToUniqueId": dict(self.iterTraxelToUniqueId()),
+            "settings": self._getDefaultSettings(),
+            "exclusions": list(self.iterExclusions()),
+        }
 
-        # TODO: this recomputes the uuidToTraxelMap even though we have it already...
         trackingGraph = hytra.core.jsongraph.JsonTrackingGraph(
-            model=model, progressVisitor=self.progressVisitor
+            model=model,
+            progressVisitor=self.progressVisitor,
+            # the tracking graph may add traxels to its mapping, which must not change the cached one
+            uuidTraxelMapping=self.getUuidTraxelMapping().copy(),
         )
         return trackingGraph
 
+    def writeTrackingGraph(self, filename, noFeatures=False, settings=None):
+        """
+        Write the same model as `toTrackingGraph` to a JSON file, but stream the nodes and links
+        to disk one by one instead of building the model dictionary in memory first.
+        Entries of `settings` overwrite the default solver settings.
+        The model can be read back incrementally with `hytra.core.jsonstream.iterateJSONModel`.
+        """
+        modelSettings = self._getDefaultSettings()
+        if settings is not None:
+            modelSettings.update(settings)
+
+        with hytra.core.jsonstream.JsonModelWriter(filename) as writer:
+            writer.writeList(
+                "segmentationHypotheses", self.iterSegmentationHypotheses(noFeatures)
+            )
+            writer.writeList(
+                "linkingHypotheses", self.iterLinkingHypotheses(noFeatures)
+            )
+            writer.writeList("divisionHypotheses", [])
+            writer.writeDictionary("traxelToUniqueId", self.iterTraxelToUniqueId())
+            writer.writeValue("settings", modelSettings)
+            writer.writeList("exclusions", self.iterExclusions())
+
     def insertSolution(self, resultDictionary):
         """
         Add solution values to nodes and arcs from dictionary representation of solution.
@@ -681,7 +975,7 @@ class HypothesesGraph:
         The link also gets a new attribute: the gap that is covered. E.g. 1, if consecutive timeframes, 2 if link skipping one timeframe.
         """
         assert isinstance(self._graph, nx.DiGraph), "Expecting the graph to be directed"
-        _, uuidToTraxelMap = self.getMappingsBetweenUUIDsAndTraxels()
+        mapping = self.getUuidTraxelMapping()
 
         if self.withTracklets:
             traxelgraph = self.referenceTraxelGraph
@@ -698,7 +992,7 @@ class HypothesesGraph:
 
         # store values from dict
         for detection in resultDictionary["detectionResults"]:
-            traxels = uuidToTraxelMap[detection["id"]]
+            traxels = mapping.getTraxels(detection["id"])
             for traxel in traxels:
                 traxelgraph._graph.nodes[traxel]["value"] = detection["value"]
             for internal_edge in zip(traxels, traxels[1:]):
@@ -712,8 +1006,8 @@ class HypothesesGraph:
         ):
             for link in resultDictionary["linkingResults"]:
                 source, dest = (
-                    uuidToTraxelMap[link["src"]][-1],
-                    uuidToTraxelMap[link["dest"]][0],
+                    mapping.getTraxels(link["src"])[-1],
+                    mapping.getTraxels(link["dest"])[0],
                 )
                 if (source in traxelgraph._graph.predecessors(dest)) and (
                     dest in traxelgraph._graph.neighbors(source)
@@ -726,7 +1020,7 @@ class HypothesesGraph:
             and resultDictionary["divisionResults"] is not None
         ):
             for division in resultDictionary["divisionResults"]:
-                traxelgraph._graph.nodes[uuidToTraxelMap[division["id"]][-1]][
+                traxelgraph._graph.nodes[mapping.getTraxels(division["id"])[-1]][
                     "divisionValue"
                 ] = division["value"]
 
@@ -6,6 +6,7 @@ from hytra.core.hypothesesgraph import (
     negLog,
     listify,
 )
+from hytra.core.arrayhypothesesgraph import ArrayHypothesesGraph
 import hytra.core.jsongraph
 from hytra.util.progressbar import ProgressBar, DefaultProgressVisitor
 
@@ -34,9 +35,14 @@ class IlastikHypothesesGraph(HypothesesGraph):
         skipLinks=1,
         skipLinksBias=20,
         progressVisitor=DefaultProgressVisitor(),
+        numWorkers=None,
+        useMultiprocessing=False,
     ):
         """
         Constructor
+
+        If `numWorkers` is given, the links between all pairs of frames are searched concurrently
+        by that many processes (if `useMultiprocessing=True`) or threads.
         """
         super(IlastikHypothesesGraph, self).__init__()
 
@@ -64,6 +70,8 @@ class IlastikHypothesesGraph(HypothesesGraph):
             withDivisions=withDivisions,
             divisionThreshold=divisionThreshold,
             skipLinks=skipLinks,
+            numWorkers=numWorkers,
+            useMultiprocessing=useMultiprocessing,
         )
 
     def __getstate__(self):
@@ -98,21 +106,50 @@ class IlastikHypothesesGraph(HypothesesGraph):
         except:
             pass
 
+        self._invalidateUuidTraxelMapping()
         self.progressVisitor = DefaultProgressVisitor()
 
-    def insertEnergies(self):
+    def insertEnergies(self, batchTransitionPrediction=False, vectorized=False):
         """
         Inserts the energies (AKA features) into the graph, such that each node and link 
         hold all information needed to run tracking.
 
+        If `batchTransitionPrediction` is `True` and a transition classifier is used, the transition
+        probabilities of all arcs (and all links inside tracklets) are predicted at once
+        before the energies are inserted, instead of running the classifier once per link.
+        The resulting energies are the same in both modes.
+
+        If `vectorized` is `True`, the distance based transition energies and the boundary costs of all
+        nodes and arcs are computed at once with NumPy (see `insertEnergiesVectorized`). Graphs with
+        tracklets always use the per element computation.
+
         See the documentation of `hytra.core.hypothesesgraph` for details on how the features are stored.
         """
+        transitionProbabilities = None
+        if batchTransitionPrediction and self.transitionClassifier is not None:
+            traxelPairs = self._getAllTransitionTraxelPairs()
+            probabilities = self.getTransitionFeaturesRFBatch(
+                traxelPairs,
+                self.transitionClassifier,
+                self.probabilityGenerator,
+                self.maxNumObjects + 1,
+            )
+            transitionProbabilities = dict(
+                (((a.Timestep, a.Id), (b.Timestep, b.Id)), p)
+                for (a, b), p in zip(traxelPairs, probabilities)
+            )
+
         # define wrapper functions
         def detectionProbabilityFunc(traxel):
             return self.getDetectionFeatures(traxel, self.maxNumObjects + 1)
 
         def transitionProbabilityFunc(srcTraxel, destTraxel):
-            if self.transitionClassifier is None:
+            if transitionProbabilities is not None:
+                return transitionProbabilities[
+                    (srcTraxel.Timestep, srcTraxel.Id),
+                    (destTraxel.Timestep, destTraxel.Id),
+                ]
+            elif self.transitionClassifier is None:
                 return self.getTransitionFeaturesDist(
                     srcTraxel,
                     destTraxel,
@@ -152,6 +189,18 @@ class IlastikHypothesesGraph(HypothesesGraph):
             else:
                 return None
 
+        if vectorized:
+            if not self.withTracklets:
+                self.insertEnergiesVectorized(
+                    detectionProbabilityFunc,
+                    transitionProbabilityFunc,
+                    divisionProbabilityFunc,
+                )
+                return
+            logger.warning(
+                "Cannot insert energies of a tracklet graph vectorized, computing them per element"
+            )
+
         super(IlastikHypothesesGraph, self).insertEnergies(
             self.maxNumObjects,
             detectionProbabilityFunc,
@@ -161,6 +210,79 @@ class IlastikHypothesesGraph(HypothesesGraph):
             self.skipLinksBias,
         )
 
+    def insertEnergiesVectorized(
+        self,
+        detectionProbabilityFunc,
+        transitionProbabilityFunc,
+        divisionProbabilityFunc,
+    ):
+        """
+        Compute the energies of all nodes and arcs as matrices and insert them with `insertEnergyMatrices`.
+        The appearance and disappearance costs are computed for all nodes at once from their distances to the border
+        of the field of view. Without a transition classifier, the transition probabilities are computed
+        from the distances of all linked objects at once; otherwise `transitionProbabilityFunc` is called per arc.
+        Detection and division probabilities are still read per node through the given functions.
+        """
+        maxState = self.maxNumObjects + 1
+        nodes = list(self.nodeIterator())
+        arcs = list(self.arcIterator())
+        traxelMap = self.getNodeTraxelMap()
+        traxels = [traxelMap[n] for n in nodes]
+        nodeIndices = dict((n, i) for i, n in enumerate(nodes))
+        sources = np.array([nodeIndices[self.source(a)] for a in arcs], dtype=np.int64)
+        targets = np.array([nodeIndices[self.target(a)] for a in arcs], dtype=np.int64)
+
+        def negLogMatrix(probabilities):
+            return np.array(negLog(probabilities), dtype=np.float64).reshape(
+                -1, maxState
+            )
+
+        detectionFeatures = negLogMatrix([detectionProbabilityFunc(t) for t in traxels])
+        divisionFeatures = []
+        for t in traxels:
+            division = divisionProbabilityFunc(t)
+            divisionFeatures.append(None if division is None else negLog(division))
+
+        # appearance/disappearance
+        timesteps = np.array([t.Timestep for t in traxels], dtype=np.int64)
+        positions = np.array(
+            [[t.X(), t.Y(), t.Z()] for t in traxels], dtype=np.float64
+        ).reshape(-1, 3)
+        multipliers = self.getBoundaryCostMultipliers(
+            positions, self.fieldOfView, self.borderAwareWidth
+        )
+        appearanceFeatures = np.zeros((len(nodes), maxState))
+        appearanceFeatures[:, 1:] = np.where(
+            timesteps <= self.timeRange[0], 0.0, multipliers
+        )[:, np.newaxis]
+        disappearanceFeatures = np.zeros((len(nodes), maxState))
+        disappearanceFeatures[:, 1:] = np.where(
+            timesteps >= self.timeRange[-1] - 1, 0.0, multipliers
+        )[:, np.newaxis]
+
+        # transitions
+        if self.transitionClassifier is None:
+            transitionProbabilities = self.getTransitionFeaturesDistMatrix(
+                positions[sources],
+                positions[targets],
+                self.transitionParameter,
+                maxState,
+            )
+        else:
+            transitionProbabilities = [
+                transitionProbabilityFunc(traxels[s], traxels[t])
+                for s, t in zip(sources.tolist(), targets.tolist())
+            ]
+
+        self.insertEnergyMatrices(
+            detectionFeatures,
+            divisionFeatures,
+            appearanceFeatures,
+            disappearanceFeatures,
+            negLogMatrix(transitionProbabilities),
+            self.skipLinksBias,
+        )
+
     def getDetectionFeatures(self, traxel, max_state):
         """
         USe the detection probabilities stored as `detProb` in the features of the traxel
@@ -184,6 +306,50 @@ class IlastikHypothesesGraph(HypothesesGraph):
 
         return [1.0 - prob] + [prob] * (max_state - 1)
 
+    def getTransitionFeaturesDistMatrix(
+        self, positionsA, positionsB, transitionParam, max_state
+    ):
+        """
+        Get the distance based transition probabilities between all rows of `positionsA` and `positionsB`
+        at once, as `getTransitionFeaturesDist` would for each pair.
+
+        **returns** a matrix with a row of `max_state` probabilities per pair
+        """
+        dist = np.linalg.norm(positionsA - positionsB, axis=1)
+        prob = np.exp(-dist / transitionParam)
+        return np.column_stack([1.0 - prob] + [prob] * (max_state - 1))
+
+    def _getAllTransitionTraxelPairs(self):
+        """
+        Collect the `(srcTraxel, destTraxel)` pairs of all transitions for which `insertEnergies`
+        needs a transition probability: the links inside each tracklet as well as all arcs of the graph.
+        Each pair is only listed once.
+        """
+        traxelPairs = []
+        seenPairs = set()
+
+        def addPair(srcTraxel, destTraxel):
+            key = (srcTraxel.Timestep, srcTraxel.Id, destTraxel.Timestep, destTraxel.Id)
+            if key not in seenPairs:
+                seenPairs.add(key)
+                traxelPairs.append((srcTraxel, destTraxel))
+
+        if self.withTracklets:
+            trackletMap = self.getNodeTrackletMap()
+            for n in self.nodeIterator():
+                tracklet = trackletMap[n]
+                for srcTraxel, destTraxel in zip(tracklet, tracklet[1:]):
+                    addPair(srcTraxel, destTraxel)
+
+            for a in self.arcIterator():
+                addPair(trackletMap[self.source(a)][-1], trackletMap[self.target(a)][0])
+        else:
+            traxelMap = self.getNodeTraxelMap()
+            for a in self.arcIterator():
+                addPair(traxelMap[self.source(a)], traxelMap[self.target(a)])
+
+        return traxelPairs
+
     def getTransitionFeaturesRF(
         self, traxelA, traxelB, transitionClassifier, probabilityGenerator, max_state
     ):
@@ -199,19 +365,77 @@ class IlastikHypothesesGraph(HypothesesGraph):
         )
         probs = transitionClassifier.predictProbabilities(featVec)[0]
 
+        return self._transitionProbabilitiesFromPrediction(
+            traxelA, traxelB, feats[0], probs, max_state
+        )
+
+    def getTransitionFeaturesRFBatch(
+        self, traxelPairs, transitionClassifier, probabilityGenerator, max_state
+    ):
+        """
+        Get the transition probabilities of all given `(traxelA, traxelB)` pairs at once.
+        One feature matrix is built for all pairs (constructed frame pair by frame pair),
+        so the classifier only needs to predict once.
+
+        **returns** a list with the same probabilities `getTransitionFeaturesRF` would return for each pair
+        """
+        if len(traxelPairs) == 0:
+            return []
+
+        featureDicts = {}
+
+        def getFeatureDict(traxel):
+            key = (traxel.Timestep, traxel.Id)
+            if key not in featureDicts:
+                featureDicts[key] = probabilityGenerator.getTraxelFeatureDict(
+                    traxel.Timestep, traxel.Id
+                )
+            return featureDicts[key]
+
+        # construct the feature vectors of all transitions between the same two frames at once
+        pairIndicesPerFramePair = {}
+        for i, (traxelA, traxelB) in enumerate(traxelPairs):
+            pairIndicesPerFramePair.setdefault(
+                (traxelA.Timestep, traxelB.Timestep), []
+            ).append(i)
+
+        featMatrix = None
+        for (frameA, frameB), pairIndices in pairIndicesPerFramePair.items():
+            frameFeatMatrix = probabilityGenerator.getTransitionFeatureMatrix(
+                frameA,
+                [traxelPairs[i][0].Id for i in pairIndices],
+                frameB,
+                [traxelPairs[i][1].Id for i in pairIndices],
+                transitionClassifier.selectedFeatures,
+            )
+            if featMatrix is None:
+                featMatrix = np.zeros((len(traxelPairs), frameFeatMatrix.shape[1]))
+            featMatrix[pairIndices, :] = frameFeatMatrix
+        probs = transitionClassifier.predictProbabilities(featMatrix)
+
+        return [
+            self._transitionProbabilitiesFromPrediction(
+                traxelA, traxelB, getFeatureDict(traxelA), p, max_state
+            )
+            for (traxelA, traxelB), p in zip(traxelPairs, probs)
+        ]
+
+    def _transitionProbabilitiesFromPrediction(
+        self, traxelA, traxelB, featsA, probs, max_state
+    ):
+        """
+        Turn the classifier prediction `probs` of a transition into transition probabilities for all states,
+        or fall back to distance based probabilities if the source object touches the image border.
+        """
         # or image borders, so predict probability just by distance
         upperBound = self.fieldOfView.getUpperBound()
         lowerBound = self.fieldOfView.getLowerBound()
 
-        coordsMax = feats[0]["Coord<Maximum >"]
+        coordsMax = featsA["Coord<Maximum >"]
         boundMax = np.array(upperBound[1 : len(coordsMax) + 1])
-        coordsMin = feats[0]["Coord<Minimum >"]
+        coordsMin = featsA["Coord<Minimum >"]
         boundMin = np.array(lowerBound[1 : len(coordsMin) + 1])
 
-        dist_border = self.fieldOfView.spatial_distance_to_border(
-            traxelA.Timestep, traxelA.X(), traxelA.Y(), traxelA.Z(), False
-        )
-
         # find the objects crossing the image border and return the distance based probability instead
         # REASON: The TC classifier gets confused by the feature values at the image border.
         # experiments on Fluo-N2DH-SIM 01:
@@ -258,6 +482,65 @@ class IlastikHypothesesGraph(HypothesesGraph):
             else:
                 return 1.0
 
+    def getBoundaryCostMultipliers(self, positions, fov, margin):
+        """
+        Array version of `getBoundaryCostMultiplier` for objects at the given `positions` (one row of x, y, z
+        per object), not taking the time boundaries into account.
+        """
+        dist = fov.spatial_distances_to_border(positions, False)
+        if margin > 0:
+            return np.where(dist > margin, 1.0, dist / float(margin))
+        else:
+            return np.ones(len(dist))
+
+
+class IlastikArrayHypothesesGraph(IlastikHypothesesGraph, ArrayHypothesesGraph):
+    """
+    `IlastikHypothesesGraph` that stores its nodes, links and energies in arrays,
+    see `hytra.core.arrayhypothesesgraph.ArrayHypothesesGraph`. It takes the same constructor arguments.
+
+    Merger resolving needs a networkx based graph, `toHypothesesGraph()` turns this graph into
+    an `IlastikHypothesesGraph` with the same parameters.
+    """
+
+    _parameterNames = [
+        "probabilityGenerator",
+        "timeRange",
+        "maxNumObjects",
+        "numNearestNeighbors",
+        "fieldOfView",
+        "divisionThreshold",
+        "withDivisions",
+        "borderAwareWidth",
+        "maxNeighborDistance",
+        "transitionClassifier",
+        "transitionParameter",
+        "skipLinks",
+        "skipLinksBias",
+    ]
+
+    def __getstate__(self):
+        """Return state values to be pickled."""
+        state = self.__dict__.copy()
+        del state["progressVisitor"]
+        return state
+
+    def __setstate__(self, state):
+        """Restore state from the unpickled state values."""
+        self.__dict__.update(state)
+        self.progressVisitor = DefaultProgressVisitor()
+
+    def toHypothesesGraph(self):
+        """
+        **returns** a networkx based `IlastikHypothesesGraph` with the same parameters, nodes, links,
+        energies, solution and lineages as this graph. The graph is not built again.
+        """
+        hypothesesGraph = IlastikHypothesesGraph.__new__(IlastikHypothesesGraph)
+        HypothesesGraph.__init__(hypothesesGraph)
+        for name in self._parameterNames:
+            setattr(hypothesesGraph, name, getattr(self, name))
+        return ArrayHypothesesGraph.toHypothesesGraph(self, hypothesesGraph)
+
 
 def convertLegacyHypothesesGraphToJsonGraph(
     hypothesesGraph,
@@ -361,12 +644,10 @@ def convertLegacyHypothesesGraphToJsonGraph(
             destTraxel = traxelMap[hypothesesGraph.target(a)][
                 0
             ]  # dest is first of traxels in destination tracklet
-        src = trackingGraph.traxelIdPerTimestepToUniqueIdMap[str(srcTraxel.Timestep)][
-            str(srcTraxel.Id)
-        ]
-        dest = trackingGraph.traxelIdPerTimestepToUniqueIdMap[str(destTraxel.Timestep)][
-            str(destTraxel.Id)
-        ]
+        src = trackingGraph.uuidTraxelMapping.getUuid(srcTraxel.Timestep, srcTraxel.Id)
+        dest = trackingGraph.uuidTraxelMapping.getUuid(
+            destTraxel.Timestep, destTraxel.Id
+        )
 
         features = listify(negLog(transitionProbabilityFunc(srcTraxel, destTraxel)))
         trackingGraph.addLinkingHypotheses(src, dest, features)
@@ -2,6 +2,7 @@ import os
 import numpy as np
 import logging
 import hytra.core.mergerresolver
+from hytra.core.arrayhypothesesgraph import ArrayHypothesesGraph
 from hytra.core.probabilitygenerator import Traxel
 import hytra.core.probabilitygenerator
 
@@ -24,26 +25,24 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         verbose=False,
     ):
         super(IlastikMergerResolver, self).__init__(pluginPaths, numSplits, verbose)
+        if isinstance(hypothesesGraph, ArrayHypothesesGraph):
+            # resolving mergers adds nodes to the given graph, whose structure is fixed in an array graph
+            raise ValueError(
+                "Merger resolving cannot modify an ArrayHypothesesGraph, please pass "
+                "hypothesesGraph.toHypothesesGraph() instead and continue with that graph"
+            )
         trackingGraph = hypothesesGraph.toTrackingGraph(noFeatures=True)
         self.model = trackingGraph.model
         self.result = hypothesesGraph.getSolutionDictionary()
         self.hypothesesGraph = hypothesesGraph
+        self.uuidTraxelMapping = trackingGraph.uuidTraxelMapping
 
         # Find mergers in the given model and result
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(
-            self.model
-        )
         # there might be empty frames. We want them as output too.
-        timesteps = [
-            str(t)
-            for t in range(
-                int(min(traxelIdPerTimestepToUniqueIdMap.keys())),
-                max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1,
-            )
-        ]
+        timesteps = [str(t) for t in range(*self.uuidTraxelMapping.getTimeRange())]
 
         mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(
-            self.result, uuidToTraxelMap
+            self.result, self.uuidTraxelMapping.getUuidToTraxelMap()
         )
 
         self.mergerNum = len(mergers)
@@ -88,17 +87,8 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
 
         **Returns** a nested dictionary, indexed first by time, then object Id, containing a list of new segmentIDs per merger
         """
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(
-            self.model
-        )
         # there might be empty frames. We want them as output too.
-        timesteps = [
-            str(t)
-            for t in range(
-                int(min(traxelIdPerTimestepToUniqueIdMap.keys())),
-                max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1,
-            )
-        ]
+        timesteps = [str(t) for t in range(*self.uuidTraxelMapping.getTimeRange())]
 
         # compute new object features
         objectFeatures = self._computeObjectFeatures(timesteps)
@@ -126,36 +116,23 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         #     a) how do we deal with the smaller number of states?
         #        Does it matter as we're done with tracking anyway..?
 
+        mergerUuids = self._getMergerUuids()
+
         def mergerNodeFilter(jsonNode):
-            uuid = int(jsonNode["id"])
-            traxels = uuidToTraxelMap[uuid]
-            return not any(t[1] in self.mergersPerTimestep[str(t[0])] for t in traxels)
+            return int(jsonNode["id"]) not in mergerUuids
 
         def mergerLinkFilter(jsonLink):
-            srcUuid = int(jsonLink["src"])
-            destUuid = int(jsonLink["dest"])
-            srcTraxels = uuidToTraxelMap[srcUuid]
-            destTraxels = uuidToTraxelMap[destUuid]
-            # return True if there was no traxel in either source or target node that was a merger.
-            return not (
-                any(t[1] in self.mergersPerTimestep[str(t[0])] for t in srcTraxels)
-                or any(t[1] in self.mergersPerTimestep[str(t[0])] for t in destTraxels)
+            # return True if neither source nor target node contained a merger.
+            return (
+                int(jsonLink["src"]) not in mergerUuids
+                and int(jsonLink["dest"]) not in mergerUuids
             )
 
-        self.model = self._refineModel(
-            uuidToTraxelMap,
-            traxelIdPerTimestepToUniqueIdMap,
-            mergerNodeFilter,
-            mergerLinkFilter,
-        )
+        self.model = self._refineModel(mergerNodeFilter, mergerLinkFilter)
 
         # 2.) new result = union(old result, resolved mergers) - old mergers
         self.result = self._refineResult(
-            nodeFlowMap,
-            arcFlowMap,
-            traxelIdPerTimestepToUniqueIdMap,
-            mergerNodeFilter,
-            mergerLinkFilter,
+            nodeFlowMap, arcFlowMap, mergerNodeFilter, mergerLinkFilter
         )
 
         # return a dictionary telling about which mergers were resolved into what
@@ -209,6 +186,20 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
                 np.vstack(np.where(labelImage == objectId))
             )
 
+    def _assignMergerCoordinates(self, coordinates, objectId, fits, newIds):
+        """
+        Find the pixel assignment of a merger given by its `coordinates` in the frame, such that
+        `relabelMergers` does not need to run the merger resolving plugin again.
+
+        **returns** the assignment, see `hytra.core.mergerresolver.assignMergerPixels`
+        """
+        offset = coordinates.min(axis=0)
+        objectCrop = np.zeros(coordinates.max(axis=0) - offset + 1, dtype=np.uint32)
+        objectCrop[tuple(np.transpose(coordinates - offset))] = objectId
+        return hytra.core.mergerresolver.assignMergerPixels(
+            self.mergerResolverPlugin, objectCrop, objectId, fits, newIds, offset
+        )
+
     def fitAndRefineNodesForTimestep(
         self, coordinatesForObjectIds, maxObjectId, timestep
     ):
@@ -263,6 +254,14 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
 
             # split up node if count > 1, duplicate incoming and outgoing arcs
             if count > 1:
+                if len(coordinates) > 0:
+                    self._mergerAssignments[node] = self._assignMergerCoordinates(
+                        coordinates,
+                        idx,
+                        fittedObjects,
+                        list(range(nextObjectId, nextObjectId + count)),
+                    )
+
                 for idx in range(nextObjectId, nextObjectId + count):
                     newNode = (timestep, idx)
                     self.resolvedGraph.add_node(
@@ -337,23 +336,14 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         return fit[2]
 
     def _refineResult(
-        self,
-        nodeFlowMap,
-        arcFlowMap,
-        traxelIdPerTimestepToUniqueIdMap,
-        mergerNodeFilter,
-        mergerLinkFilter,
+        self, nodeFlowMap, arcFlowMap, mergerNodeFilter, mergerLinkFilter
     ):
         """
         Overwrite parent method and simply call it, but then call _updateHypothesesGraph to
         also refine our Hypotheses Graph
         """
         refinedResult = super(IlastikMergerResolver, self)._refineResult(
-            nodeFlowMap,
-            arcFlowMap,
-            traxelIdPerTimestepToUniqueIdMap,
-            mergerNodeFilter,
-            mergerLinkFilter,
+            nodeFlowMap, arcFlowMap, mergerNodeFilter, mergerLinkFilter
         )
 
         self._updateHypothesesGraph(arcFlowMap)
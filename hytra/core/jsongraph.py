@@ -11,6 +11,8 @@ try:
 except ImportError:
     import json
 from hytra.util.progressbar import DefaultProgressVisitor
+from hytra.core.binarygraph import isBinaryFilename, readFromBinary, writeToBinary
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 
 # ----------------------------------------------------------------------------
 # Utility functions
@@ -30,28 +32,37 @@ def writeToFormattedJSON(filename, dictionary):
         json.dump(dictionary, f, indent=4, separators=(",", ": "))
 
 
+def readFromFile(filename):
+    """
+    Read a dictionary from JSON, or from the binary format (see `hytra.core.binarygraph`)
+    if the file has a `.h5`, `.hdf5` or `.npz` extension
+    """
+    if isBinaryFilename(filename):
+        return readFromBinary(filename)
+    return readFromJSON(filename)
+
+
+def writeToFile(filename, dictionary):
+    """
+    Write a dictionary to formatted JSON, or to the binary format (see `hytra.core.binarygraph`)
+    if the file has a `.h5`, `.hdf5` or `.npz` extension
+    """
+    if isBinaryFilename(filename):
+        writeToBinary(filename, dictionary)
+    else:
+        writeToFormattedJSON(filename, dictionary)
+
+
 def getMappingsBetweenUUIDsAndTraxels(model):
     """
     From a dictionary encoded model, load the "traxelToUniqueId" mapping,
     create a reverse mapping, and return both.
+    Prefer a `hytra.core.uuidtraxelmapping.UuidTraxelMapping`, e.g. `JsonTrackingGraph.uuidTraxelMapping`,
+    which uses integer keys in both directions.
     """
-
-    # create reverse mapping from json uuid to (timestep,ID)
     traxelIdPerTimestepToUniqueIdMap = model["traxelToUniqueId"]
-    timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
-    uuidToTraxelMap = {}
-    for t in timesteps:
-        for i in traxelIdPerTimestepToUniqueIdMap[t].keys():
-            uuid = traxelIdPerTimestepToUniqueIdMap[t][i]
-            if uuid not in uuidToTraxelMap:
-                uuidToTraxelMap[uuid] = []
-            uuidToTraxelMap[uuid].append((int(t), int(i)))
-
-    # sort the list of traxels per UUID by their timesteps
-    for v in uuidToTraxelMap.values():
-        v.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
-
-    return traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap
+    mapping = UuidTraxelMapping.fromTraxelToUniqueId(traxelIdPerTimestepToUniqueIdMap)
+    return traxelIdPerTimestepToUniqueIdMap, mapping.getUuidToTraxelMap()
 
 
 def getMergersDetectionsLinksDivisions(result, uuidToTraxelMap):
@@ -286,7 +297,12 @@ class JsonTrackingGraph(object):
         weights_filename=None,
         result_filename=None,
         progressVisitor=DefaultProgressVisitor(),
+        uuidTraxelMapping=None,
     ):
+        """
+        If the `hytra.core.uuidtraxelmapping.UuidTraxelMapping` of the model is known already,
+        it can be passed as `uuidTraxelMapping` so that it is not created again from the model's `traxelToUniqueId`.
+        """
 
         assert weights is None or weights_filename is None
         assert model is None or model_filename is None
@@ -316,31 +332,42 @@ class JsonTrackingGraph(object):
             self.model = model
         self.weights = weights
         self.result = result
-        self.uuidToTraxelMap = {}
+        self.uuidTraxelMapping = UuidTraxelMapping()
 
         # load from file if specified
         if model_filename is not None:
             logger.debug("Loading model file: " + model_filename)
-            self.model = readFromJSON(model_filename)
+            self.model = readFromFile(model_filename)
 
         if weights_filename is not None:
             logger.debug("Loading weights file: " + weights_filename)
-            self.weights = readFromJSON(weights_filename)
+            self.weights = readFromFile(weights_filename)
 
         if result_filename is not None:
             logger.debug("Loading result file: " + result_filename)
-            self.result = readFromJSON(result_filename)
+            self.result = readFromFile(result_filename)
 
         # further initializations
         if model is not None or model_filename is not None:
-            self.traxelIdPerTimestepToUniqueIdMap, self.uuidToTraxelMap = getMappingsBetweenUUIDsAndTraxels(
-                self.model
-            )
+            self.traxelIdPerTimestepToUniqueIdMap = self.model["traxelToUniqueId"]
+            if uuidTraxelMapping is None:
+                uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(
+                    self.traxelIdPerTimestepToUniqueIdMap
+                )
+            self.uuidTraxelMapping = uuidTraxelMapping
 
         self._nextUuid = 0
 
         self.progressVisitor = progressVisitor
 
+    @property
+    def uuidToTraxelMap(self):
+        """
+        The dictionary `{int(uuid): [(int(timestep), int(labelimageId)), ...]}` of `uuidTraxelMapping`,
+        which must not be modified
+        """
+        return self.uuidTraxelMapping.getUuidToTraxelMap()
+
     def addDetectionHypothesesFromTracklet(
         self,
         listOfTraxels,
@@ -353,19 +380,20 @@ class JsonTrackingGraph(object):
         """
         Create a detection based on a `listOfTraxels` (because we can have tracklets). 
         Generates a new unique ID that represents this detection in the graph as one node and sets up the respective mappings
-        in `JsonTrackingGraph.traxelIdPerTimestepToUniqueIdMap` and `JsonTrackingGraph.uuidToTraxelMap`.
+        in `JsonTrackingGraph.traxelIdPerTimestepToUniqueIdMap` and `JsonTrackingGraph.uuidTraxelMapping`.
 
         All further arguments in `**kwargs` are added to the detection dict in `segmentationHypotheses`.
         """
         assert listOfTraxels is not None and len(listOfTraxels) > 0
 
         # store mapping of all contained traxels to this detection uuid
-        self.uuidToTraxelMap[self._nextUuid] = []
         for t in listOfTraxels:
             self.traxelIdPerTimestepToUniqueIdMap.setdefault(str(t.Timestep), {})[
                 str(t.Id)
             ] = self._nextUuid
-            self.uuidToTraxelMap[self._nextUuid].append((int(t.Timestep), int(t.Id)))
+        self.uuidTraxelMapping.add(
+            self._nextUuid, [(t.Timestep, t.Id) for t in listOfTraxels]
+        )
 
         return self.addDetectionHypotheses(
             detectionFeatures,
@@ -555,6 +583,10 @@ class JsonTrackingGraph(object):
 
     def setTraxelToUniqueId(self, traxelIdPerTimestepToUniqueIdMap):
         """
-        Set traxelToUniqueId map.
+        Set traxelToUniqueId map, and update `uuidTraxelMapping` accordingly.
         """
+        self.traxelIdPerTimestepToUniqueIdMap = traxelIdPerTimestepToUniqueIdMap
         self.model["traxelToUniqueId"] = traxelIdPerTimestepToUniqueIdMap
+        self.uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(
+            traxelIdPerTimestepToUniqueIdMap
+        )
@@ -3,8 +3,11 @@ import logging
 import h5py
 import numpy as np
 import os
+import scipy.ndimage
 import hytra.core.mergerresolver
 from hytra.core.jsongraph import JsonTrackingGraph
+from hytra.util.relabel import LabelMapping
+from hytra.util.h5filepool import defaultPool
 
 
 logger = logging.getLogger(__name__)
@@ -16,6 +19,24 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
     computes features on demand, and that uses JSON files as input/output for graph and tracking result.
     """
 
+    # object features that contain a position in the image, as named by the vigra based feature plugins.
+    # They are moved back into the coordinates of the full frame if features are computed in a bounding box.
+    positionFeatureNames = [
+        "RegionCenter",
+        "Weighted<RegionCenter>",
+        "Coord<Minimum >",
+        "Coord<Maximum >",
+        "Coord<ArgMinWeight >",
+        "Coord<ArgMaxWeight >",
+        "Hull Center",
+        "InputCenter",
+        "HullCenter",
+        "DefectCenter",
+        "Skeleton Center",
+        "Terminal 1",
+        "Terminal 2",
+    ]
+
     def __init__(
         self,
         jsonTrackingGraph,
@@ -27,8 +48,20 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         raw_axes,
         pluginPaths=[os.path.abspath("../hytra/plugins")],
         verbose=False,
+        useMultiprocessing=False,
+        featuresInBoundingBox=False,
+        streamFrames=False,
     ):
-        super(JsonMergerResolver, self).__init__(pluginPaths, verbose=verbose)
+        """
+        If `streamFrames=True`, only one frame is loaded at a time, and the refined segmentation
+        of each frame is written to `out_label_image` as soon as its mergers are resolved.
+        """
+        super(JsonMergerResolver, self).__init__(
+            pluginPaths,
+            verbose=verbose,
+            useMultiprocessing=useMultiprocessing,
+            streamFrames=streamFrames,
+        )
 
         # copy model and result because we will modify it here
         assert isinstance(jsonTrackingGraph, JsonTrackingGraph)
@@ -38,6 +71,7 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         )
         self.model = copy.copy(jsonTrackingGraph.model)
         self.result = copy.copy(jsonTrackingGraph.result)
+        self.uuidTraxelMapping = jsonTrackingGraph.uuidTraxelMapping.copy()
 
         assert self.result["detectionResults"] is not None
         assert self.result["linkingResults"] is not None
@@ -49,34 +83,23 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         self.raw_filename = raw_filename
         self.raw_path = raw_path
         self.raw_axes = raw_axes
+        # compute object features only inside the bounding box of the resolved objects of a frame
+        self.featuresInBoundingBox = featuresInBoundingBox
         self.pluginManager.setImageProvider("LocalImageLoader")
         self.imageProvider = self.pluginManager.getImageProvider()
 
-    def _computeObjectFeatures(self, timesteps):
+    def _getObjectIdsPerTimestep(self):
         """
-        Computes object features for all nodes in the resolved graph because they
-        are needed for the transition classifier or to compute new distances.
-
-        **returns:** a dictionary of feature-dicts per node
+        **returns** a dictionary with the IDs of all objects in the resolved graph per int(timestep)
         """
-        rawImages = {}
-        labelImages = {}
-        for t in timesteps:
-            if self.raw_filename is not None:
-                rawImages[str(t)] = self.imageProvider.getImageDataAtTimeFrame(
-                    self.raw_filename, self.raw_path, self.raw_axes, int(t)
-                )
-            else:
-                rawImages[str(t)] = self.imageProvider.getLabelImageForFrame(
-                    self.label_image_filename, self.label_image_path, int(t)
-                ).astype(np.float32)
-            labelImages[str(t)] = self.imageProvider.getLabelImageForFrame(
-                self.label_image_filename, self.label_image_path, int(t)
-            )
-            self.relabelMergers(labelImages[str(t)], int(t))
+        objectIdsPerTimestep = {}
+        for intT, idx in self.resolvedGraph.nodes():
+            if str(idx).startswith("div-"):
+                continue
+            objectIdsPerTimestep.setdefault(intT, []).append(idx)
+        return objectIdsPerTimestep
 
-        logger.info("Computing object features")
-        objectFeatures = {}
+    def _getDimensionality(self):
         imageShape = self.imageProvider.getImageShape(
             self.label_image_filename, self.label_image_path
         )
@@ -85,37 +108,155 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         # there is no time axis...
         ndims = len([i for i in imageShape if i != 1])
         logger.info("Data has dimensionality {}".format(ndims))
-        for node in self.resolvedGraph.nodes():
-            intT, idx = node
-            if str(idx).startswith("div-"):
+        return ndims
+
+    def _readRawImage(self, timeframe, labelImage):
+        """
+        Returns the raw image for the given timeframe,
+        or the unmodified `labelImage` of that frame if no raw data was given
+        """
+        if self.raw_filename is not None:
+            return self.imageProvider.getImageDataAtTimeFrame(
+                self.raw_filename, self.raw_path, self.raw_axes, timeframe
+            )
+        else:
+            return labelImage.astype(np.float32)
+
+    def _computeObjectFeatures(self, timesteps):
+        """
+        Computes object features for all nodes in the resolved graph because they
+        are needed for the transition classifier or to compute new distances.
+
+        The features are computed once per frame for all of its nodes, see `_computeFrameFeatures`.
+
+        **returns:** a dictionary of feature-dicts per node
+        """
+        objectIdsPerTimestep = self._getObjectIdsPerTimestep()
+
+        logger.info("Computing object features")
+        objectFeatures = {}
+        ndims = self._getDimensionality()
+        for t in timesteps:
+            intT = int(t)
+            if intT not in objectIdsPerTimestep:
                 continue
 
-            # mask out this object only and compute features
-            mask = labelImages[str(intT)].copy()
-            mask[mask != idx] = 0
-            mask[mask == idx] = 1
+            labelImage = self._readLabelImage(intT)
+            rawImage = self._readRawImage(intT, labelImage)
+            self.relabelMergers(labelImage, intT)
+
+            objectIds = objectIdsPerTimestep[intT]
+            frameObjectFeatures = self._computeFrameFeatures(
+                ndims, rawImage, labelImage, intT, objectIds
+            )
+            for idx, objectFeatureDict in zip(objectIds, frameObjectFeatures):
+                objectFeatures[(intT, idx)] = objectFeatureDict
+
+        return objectFeatures
+
+    def _resolveFramesStreaming(
+        self, detectionsPerTimestep, mergersPerTimestep, timesteps
+    ):
+        self._createOutputFile()
+        logger.info(
+            "Resolving mergers, computing object features and exporting frame by frame"
+        )
+        self._streamingDimensionality = self._getDimensionality()
+        # the objects per frame before refinement, merger nodes are replaced by their new IDs later
+        self._streamingObjectIdsPerTimestep = self._getObjectIdsPerTimestep()
+        return super(JsonMergerResolver, self)._resolveFramesStreaming(
+            detectionsPerTimestep, mergersPerTimestep, timesteps
+        )
+
+    def _processResolvedFrame(self, timestep, labelImage):
+        rawImage = self._readRawImage(timestep, labelImage)
+        self.relabelMergers(labelImage, timestep)
+        self._exportRefinedFrame(labelImage, timestep)
+
+        objectIds = []
+        for idx in self._streamingObjectIdsPerTimestep.pop(timestep, []):
+            node = (timestep, idx)
+            if node in self.resolvedGraph:
+                objectIds.append(idx)
+            else:
+                objectIds.extend(self.unresolvedGraph.nodes[node]["newIds"])
+        if len(objectIds) == 0:
+            return {}
+
+        frameObjectFeatures = self._computeFrameFeatures(
+            self._streamingDimensionality, rawImage, labelImage, timestep, objectIds
+        )
+        return dict(
+            ((timestep, idx), objectFeatureDict)
+            for idx, objectFeatureDict in zip(objectIds, frameObjectFeatures)
+        )
+
+    def _computeFrameFeatures(self, ndims, rawImage, labelImage, frame, objectIds):
+        """
+        Run all object feature computation plugins once on one frame. Only the objects in `objectIds`
+        are kept in the label image, numbered consecutively, so that the features do not contain rows
+        for any other objects.
+
+        If `self.featuresInBoundingBox` is set, the features are computed only inside the bounding box
+        of these objects. Features that contain positions (see `positionFeatureNames`) are moved back
+        into the coordinates of the full frame.
 
-            # compute features, transform to one dict for frame
-            frameFeatureDicts, ignoreNames = self.pluginManager.applyObjectFeatureComputationPlugins(
-                ndims, rawImages[str(intT)], mask, intT, self.raw_filename
+        **returns:** a list with one feature-dict per object in `objectIds`
+        """
+        compactLabelImage = LabelMapping(
+            dict((idx, i + 1) for i, idx in enumerate(objectIds)), dtype=np.uint32
+        ).apply(labelImage)
+
+        offset = None
+        if self.featuresInBoundingBox:
+            boundingBox = scipy.ndimage.find_objects(
+                (compactLabelImage > 0).astype(np.uint8)
             )
-            frameFeatureItems = []
-            for f in frameFeatureDicts:
-                frameFeatureItems = frameFeatureItems + list(f.items())
-            frameFeatures = dict(frameFeatureItems)
+            if len(boundingBox) > 0:
+                # keep axes that are longer than one pixel, because the plugins squeeze the images.
+                # If the objects touch the end of an axis, the box is extended towards its start
+                paddedBoundingBox = []
+                for s, size in zip(boundingBox[0], labelImage.shape):
+                    start = min(s.start, max(size - 2, 0))
+                    paddedBoundingBox.append(
+                        slice(start, max(s.stop, min(start + 2, size)))
+                    )
+                boundingBox = tuple(paddedBoundingBox)
+                offset = np.array(
+                    [
+                        s.start
+                        for s, size in zip(boundingBox, labelImage.shape)
+                        if size != 1
+                    ]
+                )
+                compactLabelImage = compactLabelImage[boundingBox]
+                rawImage = rawImage[boundingBox]
+
+        # compute features, transform to one dict for frame
+        frameFeatureDicts, ignoreNames = self.pluginManager.applyObjectFeatureComputationPlugins(
+            ndims, rawImage, compactLabelImage, frame, self.raw_filename
+        )
+        frameFeatureItems = []
+        for f in frameFeatureDicts:
+            frameFeatureItems = frameFeatureItems + list(f.items())
+        frameFeatures = dict(frameFeatureItems)
 
-            # extract all features for this one object
+        # extract all features for each object
+        objectFeatureDicts = []
+        for i in range(len(objectIds)):
             objectFeatureDict = {}
             for k, v in frameFeatures.items():
                 if k in ignoreNames:
                     continue
                 elif "Polygon" in k:
-                    objectFeatureDict[k] = v[1]
+                    objectFeatureDict[k] = v[i + 1]
                 else:
-                    objectFeatureDict[k] = v[1, ...]
-            objectFeatures[node] = objectFeatureDict
+                    objectFeatureDict[k] = v[i + 1, ...]
+                    if offset is not None and k in self.positionFeatureNames:
+                        objectFeatureDict[k] = objectFeatureDict[k] + offset
+            objectFeatureDicts.append(objectFeatureDict)
 
-        return objectFeatures
+        return objectFeatureDicts
 
     def _readLabelImage(self, timeframe):
         """
@@ -125,11 +266,19 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
             self.label_image_filename, self.label_image_path, timeframe
         )
 
-    def _exportRefinedSegmentation(self, timesteps):
+    def _createOutputFile(self):
+        # the previous output may still be open for reading, which prevents overwriting it
+        defaultPool.release(self.out_label_image)
         h5py.File(self.out_label_image, "w").close()
+
+    def _exportRefinedFrame(self, labelImage, timeframe):
+        self.imageProvider.exportLabelImage(
+            labelImage, timeframe, self.out_label_image, self.label_image_path
+        )
+
+    def _exportRefinedSegmentation(self, timesteps):
+        self._createOutputFile()
         for t in timesteps:
             labelImage = self._readLabelImage(int(t))
             self.relabelMergers(labelImage, int(t))
-            self.imageProvider.exportLabelImage(
-                labelImage, int(t), self.out_label_image, self.label_image_path
-            )
+            self._exportRefinedFrame(labelImage, int(t))
@@ -0,0 +1,199 @@
+"""
+Incremental writing and reading of models and results in our JSON format, for hypotheses graphs that are too large
+to hold their whole dictionary representation in memory.
+
+Files written by the `JsonModelWriter` are plain JSON files that can also be read by `hytra.core.jsongraph.readFromJSON`,
+and `iterateJSONModel` can read any JSON file whose top level element is a dictionary.
+"""
+import json
+import re
+
+_delimiterPattern = re.compile(r"[\s,\]\}]")
+
+
+class JsonModelWriter:
+    """
+    Write a dictionary to JSON entry by entry, where lists and dictionaries can be given as iterators
+    that are consumed while writing, e.g.:
+
+    ```
+    with JsonModelWriter("model.json") as writer:
+        writer.writeList("segmentationHypotheses", (... for n in nodes))
+        writer.writeDictionary("traxelToUniqueId", ((str(t), {...}) for t in timesteps))
+        writer.writeValue("settings", {...})
+    ```
+
+    Every element of a list, and every value of a dictionary, is written on a single line.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, "w")
+        self._numEntries = 0
+        self._file.write("{")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write("\n}\n")
+            self._file.close()
+
+    def _writeKey(self, key):
+        if self._numEntries > 0:
+            self._file.write(",")
+        self._file.write("\n    {}: ".format(json.dumps(key)))
+        self._numEntries += 1
+
+    def _writeSequence(self, opening, closing, elements):
+        self._file.write(opening)
+        numElements = 0
+        for element in elements:
+            if numElements > 0:
+                self._file.write(",")
+            self._file.write("\n        ")
+            self._file.write(element)
+            numElements += 1
+        if numElements > 0:
+            self._file.write("\n    ")
+        self._file.write(closing)
+
+    def writeValue(self, key, value):
+        """ Write a single entry `key: value` """
+        self._writeKey(key)
+        self._file.write(json.dumps(value))
+
+    def writeList(self, key, values):
+        """ Write an entry whose value is a list, taking the list elements from the iterable `values` """
+        self._writeKey(key)
+        self._writeSequence("[", "]", (json.dumps(v) for v in values))
+
+    def writeDictionary(self, key, items):
+        """ Write an entry whose value is a dictionary, taking its entries from the iterable of `(key, value)` tuples `items` """
+        self._writeKey(key)
+        self._writeSequence(
+            "{",
+            "}",
+            ("{}: {}".format(json.dumps(k), json.dumps(v)) for k, v in items),
+        )
+
+
+class _JsonStreamParser:
+    """
+    Parse JSON values from a file while only holding the currently parsed value in memory
+    """
+
+    def __init__(self, f, chunkSize=1 << 16):
+        self._file = f
+        self._chunkSize = chunkSize
+        self._buffer = ""
+        self._position = 0
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """
+        Append the next chunk of the file to the buffer, which grows with the size of the current value.
+
+        **returns** `False` if the end of the file has been reached
+        """
+        chunk = self._file.read(
+            max(self._chunkSize, len(self._buffer) - self._position)
+        )
+        if len(chunk) == 0:
+            return False
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        return True
+
+    def peek(self):
+        """ **returns** the next non-whitespace character """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in " \t\n\r"
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON file")
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError(
+                "Expected '{}' but found '{}' in JSON file".format(
+                    character, self.peek()
+                )
+            )
+        self._position += 1
+
+    def value(self):
+        """ Parse the next complete JSON value """
+        if self.peek() in "-0123456789":
+            # a number is only complete if it is followed by a delimiter
+            while (
+                _delimiterPattern.search(self._buffer, self._position) is None
+                and self._fill()
+            ):
+                pass
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # the value might continue in the next chunk
+                if not self._fill():
+                    raise
+                continue
+            self._position = end
+            return value
+
+    def iterateSequence(self, opening, closing, parseElement):
+        """ Yield all elements of a list or dictionary, parsed by the function `parseElement` """
+        self.expect(opening)
+        if self.peek() == closing:
+            self.expect(closing)
+            return
+        while True:
+            yield parseElement()
+            if self.peek() != ",":
+                break
+            self.expect(",")
+        self.expect(closing)
+
+
+def iterateJSONModel(filename):
+    """
+    Read a JSON file whose top level element is a dictionary, like models, results and weights,
+    without loading it into memory as a whole.
+
+    **returns** a generator of tuples:
+
+    * `(key, element)` for every element of a list, e.g. `("segmentationHypotheses", {"id": 0, ...})`
+    * `(key, (entryKey, entryValue))` for every entry of a dictionary, e.g. `("traxelToUniqueId", ("0", {"1": 0}))`
+    * `(key, value)` for any other value
+    """
+    with open(filename, "r") as f:
+        parser = _JsonStreamParser(f)
+
+        def parseEntry():
+            key = parser.value()
+            parser.expect(":")
+            return key
+
+        def parseDictionaryEntry():
+            key = parseEntry()
+            return key, parser.value()
+
+        for key in parser.iterateSequence("{", "}", parseEntry):
+            nextCharacter = parser.peek()
+            if nextCharacter == "[":
+                for element in parser.iterateSequence("[", "]", parser.value):
+                    yield key, element
+            elif nextCharacter == "{":
+                for entry in parser.iterateSequence("{", "}", parseDictionaryEntry):
+                    yield key, entry
+            else:
+                yield key, parser.value()
@@ -1,11 +1,15 @@
 import logging
 import os
+import concurrent.futures
+import functools
 import numpy as np
 import networkx as nx
+import scipy.ndimage
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
 import hytra.core.probabilitygenerator as probabilitygenerator
 import hytra.core.jsongraph
 from hytra.core.jsongraph import negLog, listify, JsonTrackingGraph
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 from hytra.util.progressbar import DefaultProgressVisitor
 from hytra.core.splittracking import SplitTracking
 
@@ -17,6 +21,93 @@ class MergerResolverException(Exception):
     pass
 
 
+def assignMergerPixels(
+    mergerResolverPlugin, objectCrop, objectId, fits, newIds, offset
+):
+    """
+    Use the `mergerResolverPlugin` to assign the pixels of a merger in `objectCrop`,
+    a crop of the label image at position `offset`, to the `newIds` of its `fits`.
+
+    **returns** the assignment as a tuple `(offset, patch)`, where `patch` is a label image of the shape
+    of the crop that contains the new IDs at the pixels of the merger and 0 everywhere else,
+    see `applyMergerAssignment`
+    """
+    patch = np.array(objectCrop)
+    mergerResolverPlugin.updateLabelImage(patch, objectId, fits, newIds, offset)
+    patch[objectCrop != objectId] = 0
+    return np.array(offset), patch
+
+
+def applyMergerAssignment(labelImage, assignment):
+    """
+    Relabel the pixels of a merger in the full frame `labelImage` (in-place)
+    according to an `assignment` created by `assignMergerPixels`.
+    """
+    offset, patch = assignment
+    crop = labelImage[tuple(slice(o, o + s) for o, s in zip(offset, patch.shape))]
+    np.copyto(crop, patch, where=patch != 0)
+
+
+def fitMergers(fitTasks, mergerResolverPlugin):
+    """
+    Use the `mergerResolverPlugin` to fit each of the `fitTasks`, which are tuples of
+    `(objectCrop, objectId, nextObjectId, count, initializations, offset)`.
+
+    **returns** a list with a tuple `(fittedObjects, assignment)` per task,
+    where `assignment` is the result of `assignMergerPixels` for the new IDs of a merger,
+    or `None` if the object is no merger or was not found in the crop
+    """
+    results = []
+    for fitTask in fitTasks:
+        objectCrop, objectId, nextObjectId, count, _, offset = fitTask
+        fittedObjects = list(mergerResolverPlugin.resolveMerger(*fitTask))
+        assignment = None
+        if count > 1 and offset is not None:
+            assignment = assignMergerPixels(
+                mergerResolverPlugin,
+                objectCrop,
+                objectId,
+                fittedObjects,
+                list(range(nextObjectId, nextObjectId + count)),
+                offset,
+            )
+        results.append((fittedObjects, assignment))
+    return results
+
+
+# the merger resolver plugins that were set up in this process, by plugin paths and plugin name
+_mergerResolverPluginsOfProcess = {}
+
+
+def _getMergerResolverPluginOfProcess(pluginPaths, mergerResolverPluginName):
+    """
+    **returns** a merger resolver plugin that is only set up once per process,
+    so that the plugin directories are not scanned again for every batch of fits
+    """
+    key = (tuple(pluginPaths), mergerResolverPluginName)
+    if key not in _mergerResolverPluginsOfProcess:
+        pluginManager = TrackingPluginManager(pluginPaths=pluginPaths, verbose=False)
+        pluginManager.setMergerResolver(mergerResolverPluginName)
+        _mergerResolverPluginsOfProcess[key] = pluginManager.getMergerResolver()
+    return _mergerResolverPluginsOfProcess[key]
+
+
+def fitMergersInSeparateProcess(
+    fitTasks,
+    pluginPaths=["hytra/plugins"],
+    mergerResolverPluginName="GMMMergerResolver",
+):
+    """
+    Same as `fitMergers`, but uses the merger resolver plugin of the process it runs in.
+
+    Meant to be run in its own process using `concurrent.futures.ProcessPoolExecutor`
+    """
+    return fitMergers(
+        fitTasks,
+        _getMergerResolverPluginOfProcess(pluginPaths, mergerResolverPluginName),
+    )
+
+
 class MergerResolver(object):
     """
     Base class for all merger resolving implementations. Use one of the derived classes
@@ -29,7 +120,15 @@ class MergerResolver(object):
         numSplits=None,
         verbose=False,
         progressVisitor=DefaultProgressVisitor(),
+        useMultiprocessing=False,
+        streamFrames=False,
     ):
+        """
+        If `useMultiprocessing=True`, the merger fits of each frame are computed in parallel
+        in a `ProcessPoolExecutor`, and so are the submodels if `numSplits` is given.
+
+        If `streamFrames=True`, `run()` resolves the mergers frame by frame, see `_resolveFramesStreaming`.
+        """
         self.unresolvedGraph = None
         self.resolvedGraph = None
         self.mergersPerTimestep = None
@@ -39,10 +138,18 @@ class MergerResolver(object):
         )
         self.mergerResolverPlugin = self.pluginManager.getMergerResolver()
         self.numSplits = numSplits
+        self._pluginPaths = pluginPaths
+        self._useMultiprocessing = useMultiprocessing
+        self._streamFrames = streamFrames
+        # the pixel assignments of all resolved mergers, see `assignMergerPixels`, indexed by node
+        self._mergerAssignments = {}
 
         # should be filled by constructors of derived classes!
         self.model = None
         self.result = None
+        # mapping between the UUIDs and traxels of `model`, which is updated while refining the model.
+        # Created from the model in `run()` if the derived class does not set it
+        self.uuidTraxelMapping = None
         self.progressVisitor = progressVisitor
 
     def _createUnresolvedGraph(
@@ -140,88 +247,318 @@ class MergerResolver(object):
         """
         raise NotImplementedError()
 
+    def _findObjectBoundingBoxes(self, labelImage):
+        """
+        Find the bounding boxes of all objects in `labelImage` in one pass over the image.
+
+        **returns** a dictionary mapping each object ID to a tuple of slices
+        """
+        return dict(
+            (objectId, boundingBox)
+            for objectId, boundingBox in enumerate(
+                scipy.ndimage.find_objects(labelImage), start=1
+            )
+            if boundingBox is not None
+        )
+
+    def _cropToObject(self, labelImage, objectId, boundingBoxes):
+        """
+        **returns** a view on the part of `labelImage` inside the bounding box of `objectId`,
+        and the offset of that crop inside the `labelImage` (which is `None` if the object is not present).
+        """
+        if objectId not in boundingBoxes:
+            return labelImage, None
+        boundingBox = boundingBoxes[objectId]
+        return labelImage[boundingBox], np.array([s.start for s in boundingBox])
+
+    def _getFitExecution(self):
+        """
+        **returns** the type of executor that fits mergers, and a function `submitFits(executor, fitTasks)`
+        that distributes the `fitTasks` to such an executor and returns the list of jobs
+        (see `_collectFits`)
+        """
+        if self._useMultiprocessing:
+            # use ProcessPoolExecutor, which instanciates as many processes as there CPU cores by default
+            ExecutorType = concurrent.futures.ProcessPoolExecutor
+            numChunks = os.cpu_count() or 1
+            fitFunction = functools.partial(
+                fitMergersInSeparateProcess,
+                pluginPaths=self._pluginPaths,
+                mergerResolverPluginName=self.pluginManager.chosen_merger_resolver,
+            )
+            logger.info(
+                "Parallelizing merger fitting via multiprocessing on all cores!"
+            )
+        else:
+            ExecutorType = probabilitygenerator.DummyExecutor
+            numChunks = 1
+            fitFunction = functools.partial(
+                fitMergers, mergerResolverPlugin=self.mergerResolverPlugin
+            )
+
+        def submitFits(executor, fitTasks):
+            chunkSize = max(1, int(np.ceil(len(fitTasks) / float(numChunks))))
+            return [
+                executor.submit(fitFunction, fitTasks[i : i + chunkSize])
+                for i in range(0, len(fitTasks), chunkSize)
+            ]
+
+        return ExecutorType, submitFits
+
+    @staticmethod
+    def _collectFits(jobs):
+        """ **returns** the list of `(fittedObjects, assignment)` per task of all jobs """
+        return [fit for job in jobs for fit in job.result()]
+
+    def _createFitTasks(
+        self, timestep, labelImage, detectionsPerTimestep, mergersPerTimestep
+    ):
+        """
+        Crop all objects of the given frame that are still in the `resolvedGraph` from its `labelImage`.
+
+        **returns** a tuple of
+
+        * a list of `(node, count, nextObjectId)` tuples, as expected by `_refineNodesOfFrame`
+        * a list of `(node, fitTask)` for all nodes without predecessors
+        * a list of `(node, fitTask)` for all other nodes, which need the fits of their predecessors,
+
+        where `fitTask = (objectCrop, objectId, nextObjectId, count, offset)`
+        """
+        t = str(timestep)
+        nextObjectId = labelImage.max() + 1
+        boundingBoxes = self._findObjectBoundingBoxes(labelImage)
+
+        nodes, independentTasks, dependentTasks = [], [], []
+        for idx in detectionsPerTimestep[t]:
+            node = (timestep, idx)
+            if node not in self.resolvedGraph:
+                continue
+
+            count = 1
+            if idx in mergersPerTimestep[t]:
+                count = mergersPerTimestep[t][idx]
+            logger.debug(
+                "Looking at node {} in timestep {} with count {}".format(idx, t, count)
+            )
+            nodes.append((node, count, nextObjectId))
+
+            # the merger resolving plugin only gets to see the object's bounding box,
+            # copied such that the full label image does not need to be kept around
+            objectCrop, offset = self._cropToObject(labelImage, idx, boundingBoxes)
+            fitTask = (np.array(objectCrop), idx, nextObjectId, count, offset)
+            if len(self.unresolvedGraph.in_edges(node)) == 0:
+                independentTasks.append((node, fitTask))
+            else:
+                dependentTasks.append((node, fitTask))
+
+            if count > 1:
+                nextObjectId += count
+
+        return nodes, independentTasks, dependentTasks
+
+    @staticmethod
+    def _addInitializations(fitTask, initializations):
+        """ **returns** the task for `fitMergers` given a `fitTask` created by `_createFitTasks` """
+        crop, idx, nextId, count, offset = fitTask
+        return (crop, idx, nextId, count, initializations, offset)
+
+    def _getInitializations(self, node):
+        """ **returns** the fits of all predecessors of `node`, which must have been fitted already """
+        # collect initializations from incoming
+        initializations = []
+        for predecessor, _ in self.unresolvedGraph.in_edges(node):
+            initializations.extend(self.unresolvedGraph.nodes[predecessor]["fits"])
+        # TODO: what shall we do if e.g. a 2-merger and a single object merge to 2 + 1,
+        # so there are 3 initializations for the 2-merger, and two initializations for the 1 merger?
+        # What does pgmlink do in that case?
+        return initializations
+
+    def _refineNodesOfFrame(self, timestep, nodes, fitsPerNode):
+        """
+        Split up all nodes of one frame into their fitted objects in the `resolvedGraph`,
+        store the fits in the `unresolvedGraph`, and remember the pixel assignments of the mergers.
+
+        `nodes` is a list of `(node, count, nextObjectId)` tuples, see `_createFitTasks`,
+        and `fitsPerNode` contains the `(fittedObjects, assignment)` tuples returned by `fitMergers`.
+        """
+        for node, count, nextObjectId in nodes:
+            fittedObjects, assignment = fitsPerNode[node]
+            assert len(fittedObjects) == count
+            if assignment is not None:
+                self._mergerAssignments[node] = assignment
+
+            # split up node if count > 1, duplicate incoming and outgoing arcs
+            if count > 1:
+                for idx in range(nextObjectId, nextObjectId + count):
+                    newNode = (timestep, idx)
+                    self.resolvedGraph.add_node(
+                        newNode, division=False, count=1, origin=node
+                    )
+
+                    for e in self.unresolvedGraph.out_edges(node):
+                        self.resolvedGraph.add_edge(newNode, e[1])
+                    for e in self.unresolvedGraph.in_edges(node):
+                        if "newIds" in self.unresolvedGraph.nodes[e[0]]:
+                            for newId in self.unresolvedGraph.nodes[e[0]]["newIds"]:
+                                self.resolvedGraph.add_edge((e[0][0], newId), newNode)
+                        else:
+                            self.resolvedGraph.add_edge(e[0], newNode)
+
+                self.resolvedGraph.remove_node(node)
+                self.unresolvedGraph.nodes[node]["newIds"] = range(
+                    nextObjectId, nextObjectId + count
+                )
+
+            # each unresolved node stores its fitted shape(s) to be used
+            # as initialization in the next frame, this way division duplicates
+            # and de-merged nodes in the resolved graph do not need to store a fit as well
+            self.unresolvedGraph.nodes[node]["fits"] = fittedObjects
+
     def _fitAndRefineNodes(self, detectionsPerTimestep, mergersPerTimestep, timesteps):
         """
         Update segmentation of mergers (nodes in unresolvedGraph) from first timeframe to last
         and create new nodes in `resolvedGraph`. Links to merger nodes are duplicated to all new nodes.
 
         Uses the mergerResolver plugin to update the segmentations in the labelImages.
+
+        A fit only depends on the fits of its predecessors in the previous frame, so all fits of
+        one frame are independent of each other, and nodes without predecessors can be fitted right away.
+        The fits are dispatched to an executor accordingly, but the graph is always refined
+        in the same order, so the result does not depend on `self._useMultiprocessing`.
+
+        With multiprocessing, the objects of the next few frames (see `_getNumFramesToPrefetch`)
+        are cropped and the fits without predecessors are started ahead of time,
+        otherwise the frames are processed one by one.
         """
 
         intTimesteps = [int(t) for t in timesteps]
         intTimesteps.sort()
+        ExecutorType, submitFits = self._getFitExecution()
+        numFramesToPrefetch = self._getNumFramesToPrefetch()
+
+        with ExecutorType() as executor:
+            # per prefetched frame: nodes, nodes and jobs without predecessors, and the remaining fit tasks
+            prefetchedFrames = {}
+
+            def prefetchFrame(intT):
+                # use image provider plugin to load labelimage
+                labelImage = self._readLabelImage(intT)
+                nodes, independentTasks, dependentTasks = self._createFitTasks(
+                    intT, labelImage, detectionsPerTimestep, mergersPerTimestep
+                )
+                independentJobs = submitFits(
+                    executor,
+                    [
+                        self._addInitializations(fitTask, [])
+                        for _, fitTask in independentTasks
+                    ],
+                )
+                prefetchedFrames[intT] = (
+                    nodes,
+                    [node for node, _ in independentTasks],
+                    independentJobs,
+                    dependentTasks,
+                )
 
-        for intT in intTimesteps:
-            t = str(intT)
-            # use image provider plugin to load labelimage
-            labelImage = self._readLabelImage(int(t))
-            nextObjectId = labelImage.max() + 1
-
-            for idx in detectionsPerTimestep[t]:
-                node = (intT, idx)
-                if node not in self.resolvedGraph:
-                    continue
-
-                count = 1
-                if idx in mergersPerTimestep[t]:
-                    count = mergersPerTimestep[t][idx]
-                logger.debug(
-                    "Looking at node {} in timestep {} with count {}".format(
-                        idx, t, count
-                    )
+            # frame by frame, fit the remaining objects given the fits of their predecessors,
+            # and refine the graph
+            for i, intT in enumerate(intTimesteps):
+                for nextT in intTimesteps[i : i + numFramesToPrefetch]:
+                    if nextT not in prefetchedFrames:
+                        prefetchFrame(nextT)
+
+                (
+                    nodes,
+                    independentNodes,
+                    independentJobs,
+                    dependentTasks,
+                ) = prefetchedFrames.pop(intT)
+                fitsPerNode = dict(
+                    zip(independentNodes, self._collectFits(independentJobs))
                 )
 
-                # collect initializations from incoming
-                initializations = []
-                for predecessor, _ in self.unresolvedGraph.in_edges(node):
-                    initializations.extend(
-                        self.unresolvedGraph.nodes[predecessor]["fits"]
+                dependentNodes, dependentFitTasks = [], []
+                for node, fitTask in dependentTasks:
+                    dependentNodes.append(node)
+                    dependentFitTasks.append(
+                        self._addInitializations(
+                            fitTask, self._getInitializations(node)
+                        )
                     )
-                # TODO: what shall we do if e.g. a 2-merger and a single object merge to 2 + 1,
-                # so there are 3 initializations for the 2-merger, and two initializations for the 1 merger?
-                # What does pgmlink do in that case?
-
-                # use merger resolving plugin to fit `count` objects, also updates labelimage!
-                fittedObjects = list(
-                    self.mergerResolverPlugin.resolveMerger(
-                        labelImage, idx, nextObjectId, count, initializations
+                fitsPerNode.update(
+                    zip(
+                        dependentNodes,
+                        self._collectFits(submitFits(executor, dependentFitTasks)),
                     )
                 )
-                assert len(fittedObjects) == count
-
-                # split up node if count > 1, duplicate incoming and outgoing arcs
-                if count > 1:
-                    for idx in range(nextObjectId, nextObjectId + count):
-                        newNode = (intT, idx)
-                        self.resolvedGraph.add_node(
-                            newNode, division=False, count=1, origin=node
-                        )
 
-                        for e in self.unresolvedGraph.out_edges(node):
-                            self.resolvedGraph.add_edge(newNode, e[1])
-                        for e in self.unresolvedGraph.in_edges(node):
-                            if "newIds" in self.unresolvedGraph.nodes[e[0]]:
-                                for newId in self.unresolvedGraph.nodes[e[0]]["newIds"]:
-                                    self.resolvedGraph.add_edge(
-                                        (e[0][0], newId), newNode
-                                    )
-                            else:
-                                self.resolvedGraph.add_edge(e[0], newNode)
-
-                    self.resolvedGraph.remove_node(node)
-                    self.unresolvedGraph.nodes[node]["newIds"] = range(
-                        nextObjectId, nextObjectId + count
+                self._refineNodesOfFrame(intT, nodes, fitsPerNode)
+
+    def _getNumFramesToPrefetch(self):
+        """
+        **returns** the number of frames whose objects are cropped before they are refined,
+        which bounds the number of crops kept in memory
+        """
+        if self._useMultiprocessing:
+            return os.cpu_count() or 1
+        return 1
+
+    def _resolveFramesStreaming(
+        self, detectionsPerTimestep, mergersPerTimestep, timesteps
+    ):
+        """
+        Does the same as `_fitAndRefineNodes`, `_computeObjectFeatures` and `_exportRefinedSegmentation`,
+        but one frame after another, so that only the label image of the current frame needs to be in memory.
+        The fits of the previous frame are handed forward in the `unresolvedGraph`.
+
+        As soon as all nodes of a frame are refined, `_processResolvedFrame` relabels and exports that frame,
+        and computes the features of its objects. The pixel assignments of its mergers are dropped afterwards.
+
+        **returns** the object features of all nodes in the `resolvedGraph`, like `_computeObjectFeatures`
+        """
+        intTimesteps = [int(t) for t in timesteps]
+        intTimesteps.sort()
+        ExecutorType, submitFits = self._getFitExecution()
+
+        objectFeatures = {}
+        with ExecutorType() as executor:
+            for intT in intTimesteps:
+                labelImage = self._readLabelImage(intT)
+                nodes, independentTasks, dependentTasks = self._createFitTasks(
+                    intT, labelImage, detectionsPerTimestep, mergersPerTimestep
+                )
+
+                # the predecessors of all nodes have been fitted in the previous frame
+                fitNodes, fitTasks = [], []
+                for node, fitTask in independentTasks + dependentTasks:
+                    fitNodes.append(node)
+                    fitTasks.append(
+                        self._addInitializations(
+                            fitTask, self._getInitializations(node)
+                        )
                     )
-                    nextObjectId += count
+                fitsPerNode = dict(
+                    zip(fitNodes, self._collectFits(submitFits(executor, fitTasks)))
+                )
+                self._refineNodesOfFrame(intT, nodes, fitsPerNode)
+
+                objectFeatures.update(self._processResolvedFrame(intT, labelImage))
+                # the pixel assignments are only needed to relabel this frame
+                for node, _, _ in nodes:
+                    self._mergerAssignments.pop(node, None)
 
-                # each unresolved node stores its fitted shape(s) to be used
-                # as initialization in the next frame, this way division duplicates
-                # and de-merged nodes in the resolved graph do not need to store a fit as well
-                self.unresolvedGraph.nodes[node]["fits"] = fittedObjects
+        return objectFeatures
 
-        # import matplotlib.pyplot as plt
-        # nx.draw_networkx(resolvedGraph)
-        # plt.savefig("/Users/chaubold/test.pdf")
+    def _processResolvedFrame(self, timestep, labelImage):
+        """
+        Called by `_resolveFramesStreaming` as soon as all nodes of frame `timestep` are refined,
+        with the unmodified `labelImage` of that frame. Should relabel the mergers, export the refined
+        label image of this frame, and
+
+        **returns** the features of the objects of this frame in the `resolvedGraph`,
+        see `_computeObjectFeatures`
+        """
+        raise NotImplementedError()
 
     def _minCostMaxFlowMergerResolving(
         self, objectFeatures, transitionClassifier=None, transitionParameter=5.0
@@ -304,19 +641,11 @@ class MergerResolver(object):
             trackingGraph.addLinkingHypotheses(src, dest, listify(negLog(probs)))
 
         # Set TraxelToUniqueId on resolvedGraph's json graph
-        uuidToTraxelMap = {}
-        traxelIdPerTimestepToUniqueIdMap = {}
-
+        resolvedMapping = UuidTraxelMapping()
         for node in self.resolvedGraph.nodes():
-            uuid = self.resolvedGraph.nodes[node]["id"]
-            uuidToTraxelMap[uuid] = [node]
-
-            for t in uuidToTraxelMap[uuid]:
-                traxelIdPerTimestepToUniqueIdMap.setdefault(str(t[0]), {})[
-                    str(t[1])
-                ] = uuid
+            resolvedMapping.add(self.resolvedGraph.nodes[node]["id"], [node])
 
-        trackingGraph.setTraxelToUniqueId(traxelIdPerTimestepToUniqueIdMap)
+        trackingGraph.setTraxelToUniqueId(resolvedMapping.toTraxelToUniqueId())
 
         # track
         import dpct
@@ -327,11 +656,15 @@ class MergerResolver(object):
             mergerResult = dpct.trackMaxFlow(trackingGraph.model, weights)
         else:
             logger.info("Running split tracking with {} splits.".format(self.numSplits))
+            frames = [t for t, _ in self.resolvedGraph.nodes()]
+            numFramesPerSplit = max(1, (max(frames) - min(frames)) // self.numSplits)
             mergerResult = SplitTracking.trackFlowBasedWithSplits(
                 trackingGraph.model,
                 weights,
-                numSplits=self.numSplits,
+                numFramesPerSplit=numFramesPerSplit,
+                numThreads=os.cpu_count() if self._useMultiprocessing else None,
                 withMergerResolver=True,
+                useMultiprocessing=self._useMultiprocessing,
             )
 
         # transform results to dictionaries that can be indexed by id or (src,dest)
@@ -347,16 +680,20 @@ class MergerResolver(object):
 
         return nodeFlowMap, arcFlowMap
 
-    def _refineModel(
-        self,
-        uuidToTraxelMap,
-        traxelIdPerTimestepToUniqueIdMap,
-        mergerNodeFilter,
-        mergerLinkFilter,
-    ):
+    def _getMergerUuids(self):
+        """
+        **returns** the set of UUIDs of all nodes in `self.model` that contain a merger
+        """
+        return set(
+            self.uuidTraxelMapping.getUuid(int(t), idx)
+            for t, mergers in self.mergersPerTimestep.items()
+            for idx in mergers
+        )
+
+    def _refineModel(self, mergerNodeFilter, mergerLinkFilter):
         """
         Take the `self.model` (JSON format) with mergers, remove the merger nodes, but add new
-        de-merged nodes and links. Also updates `traxelIdPerTimestepToUniqueIdMap` locally and in the resulting file,
+        de-merged nodes and links. Also updates `self.uuidTraxelMapping` and the `traxelToUniqueId` of the model,
         such that the traxel IDs match the new connected component IDs in the refined images.
 
         `mergerNodeFilter` and `mergerLinkFilter` are methods that can filter merger detections
@@ -376,52 +713,44 @@ class MergerResolver(object):
         ]
 
         # insert new nodes and update UUID to traxel map
-        nextUuid = max(uuidToTraxelMap.keys()) + 1
+        nextUuid = self.uuidTraxelMapping.getNextUuid()
         for node in self.unresolvedGraph.nodes():
             if (
                 "count" in self.unresolvedGraph.nodes[node]
                 and self.unresolvedGraph.nodes[node]["count"] > 1
             ):
                 newIds = self.unresolvedGraph.nodes[node]["newIds"]
-                del traxelIdPerTimestepToUniqueIdMap[str(node[0])][str(node[1])]
+                self.uuidTraxelMapping.removeTraxel(node[0], node[1])
                 for newId in newIds:
                     newDetection = {}
                     newDetection["id"] = nextUuid
                     newDetection["timestep"] = [node[0], node[0]]
                     self.model["segmentationHypotheses"].append(newDetection)
-                    traxelIdPerTimestepToUniqueIdMap[str(node[0])][
-                        str(newId)
-                    ] = nextUuid
+                    self.uuidTraxelMapping.add(nextUuid, [(node[0], newId)])
                     nextUuid += 1
 
         # insert new links
         for edge in self.resolvedGraph.edges():
             newLink = {}
-            newLink["src"] = traxelIdPerTimestepToUniqueIdMap[str(edge[0][0])][
-                str(edge[0][1])
-            ]
-            newLink["dest"] = traxelIdPerTimestepToUniqueIdMap[str(edge[1][0])][
-                str(edge[1][1])
-            ]
+            newLink["src"] = self.uuidTraxelMapping.getUuid(*edge[0])
+            newLink["dest"] = self.uuidTraxelMapping.getUuid(*edge[1])
             self.model["linkingHypotheses"].append(newLink)
 
+        self.model["traxelToUniqueId"] = self.uuidTraxelMapping.toTraxelToUniqueId()
+
         # save
         return self.model
 
     def _refineResult(
-        self,
-        nodeFlowMap,
-        arcFlowMap,
-        traxelIdPerTimestepToUniqueIdMap,
-        mergerNodeFilter,
-        mergerLinkFilter,
+        self, nodeFlowMap, arcFlowMap, mergerNodeFilter, mergerLinkFilter
     ):
         """
         Update the `self.result` dict by removing the mergers and adding the refined nodes and links.
 
         Operates on a `result` dictionary in our JSON result style with mergers,
         the resolved and unresolved graph as well as
-        the `nodeFlowMap` and `arcFlowMap` obtained by running tracking on the `resolvedGraph`.
+        the `nodeFlowMap` and `arcFlowMap` obtained by running tracking on the `resolvedGraph`,
+        and `self.uuidTraxelMapping` as updated by `_refineModel`.
 
         Updates the `result` dictionary so that all merger nodes are removed but the new nodes
         are contained with the appropriate links and values.
@@ -448,7 +777,7 @@ class MergerResolver(object):
             ):
                 newIds = self.unresolvedGraph.nodes[node]["newIds"]
                 for newId in newIds:
-                    uuid = traxelIdPerTimestepToUniqueIdMap[str(node[0])][str(newId)]
+                    uuid = self.uuidTraxelMapping.getUuid(node[0], newId)
                     resolvedNode = (node[0], newId)
                     resolvedResultId = self.resolvedGraph.nodes[resolvedNode]["id"]
                     newDetection = {"id": uuid, "value": nodeFlowMap[resolvedResultId]}
@@ -457,12 +786,8 @@ class MergerResolver(object):
         # add new links
         for edge in self.resolvedGraph.edges():
             newLink = {}
-            newLink["src"] = traxelIdPerTimestepToUniqueIdMap[str(edge[0][0])][
-                str(edge[0][1])
-            ]
-            newLink["dest"] = traxelIdPerTimestepToUniqueIdMap[str(edge[1][0])][
-                str(edge[1][1])
-            ]
+            newLink["src"] = self.uuidTraxelMapping.getUuid(*edge[0])
+            newLink["dest"] = self.uuidTraxelMapping.getUuid(*edge[1])
             srcId = self.resolvedGraph.nodes[edge[0]]["id"]
             destId = self.resolvedGraph.nodes[edge[1]]["id"]
             newLink["value"] = arcFlowMap[(srcId, destId)]
@@ -499,21 +824,15 @@ class MergerResolver(object):
         **Returns** a nested dictionary, indexed first by time, then object Id, containing a list of new segmentIDs per merger
         """
 
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(
-            self.model
-        )
-        # timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
-        # there might be empty frames. We want them as output too.
-        timesteps = [
-            str(t)
-            for t in range(
-                int(min(traxelIdPerTimestepToUniqueIdMap.keys())),
-                max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1,
+        if self.uuidTraxelMapping is None:
+            self.uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(
+                self.model["traxelToUniqueId"]
             )
-        ]
+        # there might be empty frames. We want them as output too.
+        timesteps = [str(t) for t in range(*self.uuidTraxelMapping.getTimeRange())]
 
         mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(
-            self.result, uuidToTraxelMap
+            self.result, self.uuidTraxelMapping.getUuidToTraxelMap()
         )
 
         # ------------------------------------------------------------
@@ -548,13 +867,19 @@ class MergerResolver(object):
                 divisionsPerTimestep, self.mergersPerTimestep, mergerLinks
             )
             self._prepareResolvedGraph()
-            self._fitAndRefineNodes(
-                self.detectionsPerTimestep, self.mergersPerTimestep, timesteps
-            )
+            if self._streamFrames:
+                # refine, compute features and export one frame after another
+                objectFeatures = self._resolveFramesStreaming(
+                    self.detectionsPerTimestep, self.mergersPerTimestep, timesteps
+                )
+            else:
+                self._fitAndRefineNodes(
+                    self.detectionsPerTimestep, self.mergersPerTimestep, timesteps
+                )
 
-            # ------------------------------------------------------------
-            # compute new object features
-            objectFeatures = self._computeObjectFeatures(timesteps)
+                # ------------------------------------------------------------
+                # compute new object features
+                objectFeatures = self._computeObjectFeatures(timesteps)
 
             # ------------------------------------------------------------
             # load transition classifier if any
@@ -583,46 +908,29 @@ class MergerResolver(object):
             #     a) how do we deal with the smaller number of states?
             #        Does it matter as we're done with tracking anyway..?
 
+            mergerUuids = self._getMergerUuids()
+
             def mergerNodeFilter(jsonNode):
-                uuid = int(jsonNode["id"])
-                traxels = uuidToTraxelMap[uuid]
-                return not any(
-                    t[1] in self.mergersPerTimestep[str(t[0])] for t in traxels
-                )
+                return int(jsonNode["id"]) not in mergerUuids
 
             def mergerLinkFilter(jsonLink):
-                srcUuid = int(jsonLink["src"])
-                destUuid = int(jsonLink["dest"])
-                srcTraxels = uuidToTraxelMap[srcUuid]
-                destTraxels = uuidToTraxelMap[destUuid]
-
-                # return True if there was no traxel in either source or target node that was a merger.
-                return not (
-                    any(t[1] in self.mergersPerTimestep[str(t[0])] for t in srcTraxels)
-                    or any(
-                        t[1] in self.mergersPerTimestep[str(t[0])] for t in destTraxels
-                    )
+                # return True if neither source nor target node contained a merger.
+                return (
+                    int(jsonLink["src"]) not in mergerUuids
+                    and int(jsonLink["dest"]) not in mergerUuids
                 )
 
-            self.model = self._refineModel(
-                uuidToTraxelMap,
-                traxelIdPerTimestepToUniqueIdMap,
-                mergerNodeFilter,
-                mergerLinkFilter,
-            )
+            self.model = self._refineModel(mergerNodeFilter, mergerLinkFilter)
 
             # 2.) new result = union(old result, resolved mergers) - old mergers
 
             self.result = self._refineResult(
-                nodeFlowMap,
-                arcFlowMap,
-                traxelIdPerTimestepToUniqueIdMap,
-                mergerNodeFilter,
-                mergerLinkFilter,
+                nodeFlowMap, arcFlowMap, mergerNodeFilter, mergerLinkFilter
             )
 
-            # 3.) export refined segmentation
-            self._exportRefinedSegmentation(timesteps)
+            # 3.) export refined segmentation, unless that happened while streaming
+            if not self._streamFrames:
+                self._exportRefinedSegmentation(timesteps)
 
             # return a dictionary telling about which mergers were resolved into what
             mergerDict = {}
@@ -641,25 +949,36 @@ class MergerResolver(object):
 
     def relabelMergers(self, labelImage, time):
         """
-        Calls the merger resolving plugin to relabel the mergers based on a previously found fit,
+        Relabel the mergers based on the pixel assignments that were found while fitting them.
+        If there is none, calls the merger resolving plugin to relabel the mergers based on a previously found fit,
         which is stored in the hypotheses graph node
         """
         t = str(time)
 
         if self.detectionsPerTimestep is not None and t in self.detectionsPerTimestep:
+            boundingBoxes = None
             for idx in self.detectionsPerTimestep[t]:
                 node = (time, idx)
 
                 if idx not in self.mergersPerTimestep[t]:
                     continue
 
+                if node in self._mergerAssignments:
+                    applyMergerAssignment(labelImage, self._mergerAssignments[node])
+                    continue
+
+                if boundingBoxes is None:
+                    boundingBoxes = self._findObjectBoundingBoxes(labelImage)
+
                 # use fits stored in graph
                 fits = self.unresolvedGraph.nodes[node]["fits"]
                 newIds = self.unresolvedGraph.nodes[node]["newIds"]
 
-                # use merger resolving plugin to update labelImage with merger IDs
+                # use merger resolving plugin to update labelImage with merger IDs,
+                # the crop is a view so the labelImage is changed in-place
+                objectCrop, offset = self._cropToObject(labelImage, idx, boundingBoxes)
                 self.mergerResolverPlugin.updateLabelImage(
-                    labelImage, idx, fits, newIds
+                    objectCrop, idx, fits, newIds, offset
                 )
 
         return labelImage
@@ -1,6 +1,7 @@
 import numpy as np
 import logging
 import time
+import collections
 import concurrent.futures
 
 import hytra.core.divisionfeatures
@@ -8,6 +9,7 @@ from hytra.util.progressbar import ProgressBar
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
 from hytra.core.random_forest_classifier import RandomForestClassifier
 from hytra.core.ilastik_project_options import IlastikProjectOptions
+from hytra.core.traxelstore import TraxelStore
 
 
 logger = logging.getLogger("ProbabilityGenerator")
@@ -84,6 +86,7 @@ def computeRegionFeaturesOnCloud(
     featuresPerFrame=None,
     imageProviderPluginName="LocalImageLoader",
     featureSerializerPluginName="LocalFeatureSerializer",
+    returnLabelImage=False,
 ):
     """
     Allow to use dispy to schedule feature computation to nodes running a dispynode,
@@ -98,9 +101,11 @@ def computeRegionFeaturesOnCloud(
     * `labelImageFilename`: the base filename of the label image volume, or a dvid server address
     * `labelImagePath`: path inside the label image HDF5 file, or DVID dataset UUID
     * `pluginPaths`: where all yapsy plugins are stored (should be absolute for DVID)
+    * `returnLabelImage`: whether to also return the loaded label image, e.g. to pass it on to
+      `computeDivisionFeaturesOnCloud` of the previous frame (only worthwhile if both run in the same process)
 
     **returns** the feature dictionary for this frame if `featureSerializerPluginName == 'LocalFeatureSerializer'`
-    and `featuresPerFrame == None`.
+    and `featuresPerFrame == None`. Then the label image is appended to the returned tuple if `returnLabelImage=True`.
     """
 
     # set up plugin manager
@@ -119,6 +124,7 @@ def computeRegionFeaturesOnCloud(
     labelImage = pluginManager.getImageProvider().getLabelImageForFrame(
         labelImageFilename, labelImagePath, frame
     )
+    loadedLabelImage = labelImage
 
     # untwist axes, if just x and y are messed up
     if (
@@ -150,6 +156,8 @@ def computeRegionFeaturesOnCloud(
         "LocalFeatureSerializer",
     ]:
         # simply return resulting dict
+        if returnLabelImage:
+            return frame, frameFeatures, loadedLabelImage
         return frame, frameFeatures
     else:
         # set up feature serializer (local or DVID for now)
@@ -175,6 +183,7 @@ def computeDivisionFeaturesOnCloud(
     labelImagePath,
     numDimensions,
     divisionFeatureNames,
+    labelImageAtTPlus1=None,
 ):
     """
     Allow to compute division features using multiprocessing
@@ -187,13 +196,15 @@ def computeDivisionFeaturesOnCloud(
     * `imageProviderPlugin`: plugin for feature loading
     * `numDimensions`: number of dimensions of the dataset
     * `divisionFeatureNames`: list of feature names for the `hytra.divisionfeatures.FeatureManager`
+    * `labelImageAtTPlus1`: the label image of the next frame if it was already loaded,
+      otherwise it is read using the `imageProviderPlugin`
 
     **returns** a tuple of `frameT` and the dictionary of the newly computed division 
     features for `frameT`
     """
 
     # get the label image of the next frame
-    if (
+    if labelImageAtTPlus1 is None and (
         frameT + 1
         < imageProviderPlugin.getTimeRange(labelImageFilename, labelImagePath)[1]
     ):
@@ -244,6 +255,45 @@ class DummyExecutor(object):
         return f
 
 
+class SerializedFeaturesPerFrame(object):
+    """
+    Read-only dictionary-like access to the features of all frames that were stored using
+    a feature serializer plugin. Only the `cacheSize` most recently used frames are kept in memory.
+    """
+
+    def __init__(self, featureSerializer, frames, cacheSize=2):
+        self._featureSerializer = featureSerializer
+        self._frames = list(frames)
+        self._cacheSize = cacheSize
+        self._cache = collections.OrderedDict()
+
+    def __getitem__(self, frame):
+        if frame in self._cache:
+            self._cache.move_to_end(frame)
+        else:
+            if frame not in self._frames:
+                raise KeyError(frame)
+            self._cache[frame] = self._featureSerializer.loadFeaturesForFrame(
+                None, frame
+            )
+            if len(self._cache) > self._cacheSize:
+                self._cache.popitem(last=False)
+        return self._cache[frame]
+
+    def __contains__(self, frame):
+        return frame in self._frames
+
+    def __len__(self):
+        return len(self._frames)
+
+    def keys(self):
+        return list(self._frames)
+
+    def items(self):
+        for frame in self._frames:
+            yield frame, self[frame]
+
+
 class ProbabilityGenerator(object):
     """
     The ProbabilityGenerator contains a dictionary of all traxels. The traxels themself contain the 
@@ -269,8 +319,20 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
         useMultiprocessing=True,
         pluginPaths=["hytra/plugins"],
         verbose=False,
+        maxNumFramesInFlight=None,
+        featureStoreFilename=None,
     ):
+        """
+        If `maxNumFramesInFlight` is given, `fillTraxels` runs in streaming mode: features are extracted
+        for at most that many frames at once, and the features of a frame are discarded as soon as
+        its traxels have been created. To still be able to look up the features later
+        (e.g. for the transition classifier), specify a `featureStoreFilename`
+        where the `Hdf5FeatureSerializer` plugin stores them. Streaming with a transition classifier
+        but without a `featureStoreFilename` raises a `ValueError`.
+        """
         self._useMultiprocessing = useMultiprocessing
+        self._maxNumFramesInFlight = maxNumFramesInFlight
+        self._featureStoreFilename = featureStoreFilename
         self._options = ilpOptions
         self._pluginPaths = pluginPaths
         self._pluginManager = TrackingPluginManager(
@@ -278,12 +340,26 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
         )
         self._pluginManager.setImageProvider(ilpOptions.imageProviderName)
         self._pluginManager.setFeatureSerializer(ilpOptions.featureSerializerName)
+        if featureStoreFilename is not None:
+            self._pluginManager.setFeatureSerializer("Hdf5FeatureSerializer")
 
         self._countClassifier = None
         self._divisionClassifier = None
         self._transitionClassifier = None
 
         self._loadClassifiers()
+        if (
+            maxNumFramesInFlight is not None
+            and featureStoreFilename is None
+            and self._transitionClassifier is not None
+        ):
+            raise ValueError(
+                "The transition classifier needs the features of all frames, "
+                "please specify a featureStoreFilename when streaming feature extraction"
+            )
+
+        # filled by fillTraxels, None if the features are discarded while streaming
+        self._featuresPerFrame = None
 
         self.shape, self.timeRange = self._getShapeAndTimeRange()
 
@@ -307,6 +383,9 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
         self.TraxelsPerFrame = {}
         """ this public variable contains all traxels if we're not using pgmlink """
 
+        # the features of all traxels in TraxelsPerFrame are stored in here column by column
+        self._traxelStore = TraxelStore()
+
     def _loadClassifiers(self):
         if (
             self._options.objectCountClassifierPath != None
@@ -517,10 +596,68 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
             progressBar.show(increase=0)
 
             with ExecutorType() as executor:
-                # 1st pass for region features
-                jobs = []
+                # Division features of frame t are computed as soon as the region features of t and t+1
+                # are done. On a single core they reuse the label image of t+1 that was loaded for the
+                # region features, worker processes read it themselves instead of pickling it twice.
+                computeDivisionFeatures = self._divisionClassifier is not None
+                passLabelImages = computeDivisionFeatures and ExecutorType is DummyExecutor
+                # map from each job to its frame, and whether it computes division features
+                pendingJobs = {}
+                divisionFeaturesPerFrame = {}
+                labelImagesPerFrame = {}
+
+                def submitDivisionJob(frame):
+                    pendingJobs[
+                        executor.submit(
+                            computeDivisionFeaturesOnCloud,
+                            frame,
+                            dict(featuresPerFrame[frame]),
+                            dict(featuresPerFrame[frame + 1]),
+                            self._pluginManager.getImageProvider(),
+                            self._options.labelImageFilename,
+                            self._options.labelImagePath,
+                            self.getNumDimensions(),
+                            self._divisionFeatureNames,
+                            labelImageAtTPlus1=labelImagesPerFrame.pop(frame + 1, None),
+                        )
+                    ] = (frame, True)
+
+                def handleFinishedJobs(timeout):
+                    done, _ = concurrent.futures.wait(
+                        list(pendingJobs.keys()),
+                        timeout=timeout,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for job in done:
+                        progressBar.show()
+                        _, isDivisionJob = pendingJobs.pop(job)
+                        if isDivisionJob:
+                            frame, feats = job.result()
+                            divisionFeaturesPerFrame[frame] = feats
+                            continue
+
+                        if passLabelImages:
+                            frame, feats, labelImage = job.result()
+                            if frame > self.timeRange[0]:
+                                labelImagesPerFrame[frame] = labelImage
+                        else:
+                            frame, feats = job.result()
+                        featuresPerFrame[frame] = feats
+
+                        if computeDivisionFeatures:
+                            for t in [frame - 1, frame]:
+                                if (
+                                    t in featuresPerFrame
+                                    and t + 1 in featuresPerFrame
+                                    and (
+                                        t + 1 in labelImagesPerFrame
+                                        or not passLabelImages
+                                    )
+                                ):
+                                    submitDivisionJob(t)
+
                 for frame in range(self.timeRange[0], self.timeRange[1]):
-                    jobs.append(
+                    pendingJobs[
                         executor.submit(
                             computeRegionFeaturesOnCloud,
                             frame,
@@ -531,35 +668,17 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
                             self._options.labelImagePath,
                             turnOffFeatures,
                             self._pluginPaths,
+                            returnLabelImage=passLabelImages,
                         )
-                    )
-                for job in concurrent.futures.as_completed(jobs):
-                    progressBar.show()
-                    frame, feats = job.result()
-                    featuresPerFrame[frame] = feats
-
-                # 2nd pass for division features
-                if self._divisionClassifier is not None:
-                    jobs = []
-                    for frame in range(self.timeRange[0], self.timeRange[1] - 1):
-                        jobs.append(
-                            executor.submit(
-                                computeDivisionFeaturesOnCloud,
-                                frame,
-                                featuresPerFrame[frame],
-                                featuresPerFrame[frame + 1],
-                                self._pluginManager.getImageProvider(),
-                                self._options.labelImageFilename,
-                                self._options.labelImagePath,
-                                self.getNumDimensions(),
-                                self._divisionFeatureNames,
-                            )
-                        )
+                    ] = (frame, False)
+                    # start division jobs early, and don't keep label images around when running on a single core
+                    handleFinishedJobs(timeout=0)
 
-                    for job in concurrent.futures.as_completed(jobs):
-                        progressBar.show()
-                        frame, feats = job.result()
-                        featuresPerFrame[frame].update(feats)
+                while len(pendingJobs) > 0:
+                    handleFinishedJobs(timeout=None)
+
+                for frame, feats in divisionFeaturesPerFrame.items():
+                    featuresPerFrame[frame].update(feats)
 
             # # serialize features??
             # for frame in range(self.timeRange[0], self.timeRange[1]):
@@ -618,6 +737,120 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
 
         return featuresPerFrame
 
+    def _extractFeaturesAndCreateTraxelsStreaming(
+        self, usePgmlink, ts, fs, turnOffFeatures=[]
+    ):
+        """
+        Extract the features of all frames like `_extractAllFeatures`, but with at most `self._maxNumFramesInFlight`
+        region feature computations submitted at once. Frames are processed in order, and as soon as the features
+        of a frame are complete its traxels are created. Afterwards the features of that frame are written
+        to the feature store (if any) and dropped, so only the frames t and t+1 that are needed
+        for the division features of frame t stay resident.
+
+        **returns** a `SerializedFeaturesPerFrame` giving access to the stored features,
+        or `None` if no `featureStoreFilename` was given.
+        """
+        assert self._maxNumFramesInFlight > 0
+
+        if self._useMultiprocessing:
+            # use ProcessPoolExecutor, which instanciates as many processes as there CPU cores by default
+            ExecutorType = concurrent.futures.ProcessPoolExecutor
+            logger.info(
+                "Parallelizing feature extraction via multiprocessing on all cores, streaming {} frames at once!".format(
+                    self._maxNumFramesInFlight
+                )
+            )
+        else:
+            ExecutorType = DummyExecutor
+            logger.info("Running feature extraction on single core!")
+
+        featureSerializer = None
+        if self._featureStoreFilename is not None:
+            featureSerializer = self._pluginManager.getFeatureSerializer()
+            featureSerializer.filename = self._featureStoreFilename
+            logger.info("Storing features in {}".format(self._featureStoreFilename))
+
+        frames = range(self.timeRange[0], self.timeRange[1])
+        progressBar = ProgressBar(stop=len(frames))
+        progressBar.show(increase=0)
+        t0 = time.time()
+
+        with ExecutorType() as executor:
+            regionJobs = collections.deque()
+            framesToSubmit = collections.deque(frames)
+            residentFeatures = {}
+            residentLabelImages = {}
+            computeDivisionFeatures = self._divisionClassifier is not None
+            # worker processes read the label image of t+1 themselves instead of pickling it twice
+            passLabelImages = computeDivisionFeatures and ExecutorType is DummyExecutor
+
+            def submitRegionJobs():
+                while (
+                    len(framesToSubmit) > 0
+                    and len(regionJobs) < self._maxNumFramesInFlight
+                ):
+                    regionJobs.append(
+                        executor.submit(
+                            computeRegionFeaturesOnCloud,
+                            framesToSubmit.popleft(),
+                            self._options.rawImageFilename,
+                            self._options.rawImagePath,
+                            self._options.rawImageAxes,
+                            self._options.labelImageFilename,
+                            self._options.labelImagePath,
+                            turnOffFeatures,
+                            self._pluginPaths,
+                            returnLabelImage=passLabelImages,
+                        )
+                    )
+
+            def getRegionFeatures(frame):
+                if frame not in residentFeatures:
+                    # region jobs were submitted in frame order
+                    if passLabelImages:
+                        jobFrame, feats, labelImage = regionJobs.popleft().result()
+                        residentLabelImages[jobFrame] = labelImage
+                    else:
+                        jobFrame, feats = regionJobs.popleft().result()
+                    assert jobFrame == frame
+                    residentFeatures[frame] = feats
+                    submitRegionJobs()
+                return residentFeatures[frame]
+
+            submitRegionJobs()
+            for frame in frames:
+                features = getRegionFeatures(frame)
+                residentLabelImages.pop(frame, None)
+                if computeDivisionFeatures and frame + 1 < self.timeRange[1]:
+                    divisionJob = executor.submit(
+                        computeDivisionFeaturesOnCloud,
+                        frame,
+                        features,
+                        getRegionFeatures(frame + 1),
+                        self._pluginManager.getImageProvider(),
+                        self._options.labelImageFilename,
+                        self._options.labelImagePath,
+                        self.getNumDimensions(),
+                        self._divisionFeatureNames,
+                        labelImageAtTPlus1=residentLabelImages.get(frame + 1),
+                    )
+                    features.update(divisionJob.result()[1])
+
+                self._createTraxelsForFrame(frame, features, usePgmlink, ts, fs)
+                if featureSerializer is not None:
+                    featureSerializer.storeFeaturesForFrame(features, frame)
+                del residentFeatures[frame]
+                progressBar.show()
+
+        t1 = time.time()
+        logger.info(
+            "Feature computation and traxel creation took {} secs".format(t1 - t0)
+        )
+
+        if featureSerializer is None:
+            return None
+        return SerializedFeaturesPerFrame(featureSerializer, frames)
+
     def _setTraxelFeatureArray(self, traxel, featureArray, name):
         """ store the specified `featureArray` in a `traxel`'s feature dictionary under the specified key=`name` """
         if isinstance(featureArray, np.ndarray):
@@ -626,6 +859,160 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
         for i, v in enumerate(featureArray):
             traxel.set_feature_value(name, i, float(v))
 
+    def _createTraxelsForFrame(self, frame, features, usePgmlink, ts=None, fs=None):
+        """
+        Predict object count as well as division probabilities for all objects in the `features` dict of `frame`,
+        and create the traxels holding this information (and all other features).
+        The traxels are added to the pgmlink::TraxelStore `ts` if `usePgmlink=True`, otherwise to `self.TraxelsPerFrame`.
+        """
+        if usePgmlink:
+            import pgmlink
+
+        # predict random forests
+        objectCountProbabilities = None
+        if self._countClassifier is not None:
+            objectCountProbabilities = self._countClassifier.predictProbabilities(
+                features=None, featureDict=features
+            )
+
+        divisionProbabilities = None
+        if self._divisionClassifier is not None and frame + 1 < self.timeRange[1]:
+            divisionProbabilities = self._divisionClassifier.predictProbabilities(
+                features=None, featureDict=features
+            )
+
+        # select all objects that are present and pass the size filter
+        pixelSizes = np.asarray(features["Count"])
+        pixelSizes = pixelSizes.reshape(pixelSizes.shape[0], -1)[:, 0]
+        isValid = pixelSizes != 0
+        if self._options.sizeFilter is not None:
+            isValid &= (pixelSizes >= self._options.sizeFilter[0]) & (
+                pixelSizes <= self._options.sizeFilter[1]
+            )
+        objectIds = np.flatnonzero(isValid[1:]) + 1
+
+        if not usePgmlink:
+            self._addTraxelsToStore(
+                frame,
+                objectIds,
+                features,
+                objectCountProbabilities,
+                divisionProbabilities,
+            )
+            return
+
+        # create traxels for all objects
+        for objectId in objectIds.tolist():
+            # create traxel
+            traxel = pgmlink.Traxel()
+            traxel.Id = objectId
+            traxel.Timestep = frame
+
+            # add raw features
+            for key, val in features.items():
+                if key == "id":
+                    traxel.idInSegmentation = val[objectId]
+                elif key == "filename":
+                    traxel.segmentationFilename = val[objectId]
+                else:
+                    try:
+                        if isinstance(val, list):  # polygon feature returns a list!
+                            featureValues = val[objectId]
+                        else:
+                            featureValues = val[objectId, ...]
+                    except:
+                        logger.error(
+                            "Could not get feature values of {} for key {} from matrix with shape {}".format(
+                                objectId, key, val.shape
+                            )
+                        )
+                        raise AssertionError()
+                    try:
+                        self._setTraxelFeatureArray(traxel, featureValues, key)
+                        if key == "RegionCenter":
+                            self._setTraxelFeatureArray(traxel, featureValues, "com")
+                    except:
+                        logger.error(
+                            "Could not add feature array {} for {}".format(
+                                featureValues, key
+                            )
+                        )
+                        raise AssertionError()
+
+            # add random forest predictions
+            if objectCountProbabilities is not None:
+                self._setTraxelFeatureArray(
+                    traxel,
+                    objectCountProbabilities[objectId, :],
+                    self.detectionProbabilityFeatureName,
+                )
+
+            if divisionProbabilities is not None:
+                self._setTraxelFeatureArray(
+                    traxel,
+                    divisionProbabilities[objectId, :],
+                    self.divisionProbabilityFeatureName,
+                )
+
+            # set other parameters
+            traxel.set_x_scale(self.x_scale)
+            traxel.set_y_scale(self.y_scale)
+            traxel.set_z_scale(self.z_scale)
+
+            # add to pgmlink's traxelstore
+            ts.add(fs, traxel)
+
+    def _addTraxelsToStore(
+        self,
+        frame,
+        objectIds,
+        features,
+        objectCountProbabilities=None,
+        divisionProbabilities=None,
+    ):
+        """
+        Create the traxels of all `objectIds` of `frame` in the columnar `self._traxelStore`,
+        and add them to `self.TraxelsPerFrame`.
+        """
+        traxelFeatures = {}
+        for key, val in features.items():
+            if key in ["id", "filename"]:
+                continue
+            if len(objectIds) > 0 and len(val) <= objectIds[-1]:
+                logger.error(
+                    "Could not get feature values of {} for key {} from matrix with shape {}".format(
+                        objectIds[-1], key, np.asarray(val).shape
+                    )
+                )
+                raise AssertionError()
+            traxelFeatures[key] = val
+            if key == "RegionCenter":
+                traxelFeatures["com"] = val
+
+        # add random forest predictions
+        if objectCountProbabilities is not None:
+            traxelFeatures[self.detectionProbabilityFeatureName] = (
+                objectCountProbabilities
+            )
+        if divisionProbabilities is not None:
+            traxelFeatures[self.divisionProbabilityFeatureName] = divisionProbabilities
+
+        traxels = self._traxelStore.addTraxels(
+            frame,
+            objectIds,
+            traxelFeatures,
+            scale=(self.x_scale, self.y_scale, self.z_scale),
+        )
+
+        for objectId, traxel in traxels.items():
+            if "id" in features:
+                traxel.idInSegmentation = features["id"][objectId]
+            if "filename" in features:
+                traxel.segmentationFilename = features["filename"][objectId]
+
+        if len(traxels) > 0:
+            self.TraxelsPerFrame.setdefault(frame, {}).update(traxels)
+
     def fillTraxels(
         self, usePgmlink=True, ts=None, fs=None, dispyNodeIps=[], turnOffFeatures=[]
     ):
@@ -650,120 +1037,46 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
                 assert fs is not None
 
         logger.info("Extracting features...")
-        self._featuresPerFrame = self._extractAllFeatures(
-            dispyNodeIps=dispyNodeIps, turnOffFeatures=turnOffFeatures
-        )
-
-        logger.info("Creating traxels...")
-        progressBar = ProgressBar(stop=len(self._featuresPerFrame))
-        progressBar.show(increase=0)
-
-        for frame, features in self._featuresPerFrame.items():
-            # predict random forests
-            if self._countClassifier is not None:
-                objectCountProbabilities = self._countClassifier.predictProbabilities(
-                    features=None, featureDict=features
-                )
-
-            if self._divisionClassifier is not None and frame + 1 < self.timeRange[1]:
-                divisionProbabilities = self._divisionClassifier.predictProbabilities(
-                    features=None, featureDict=features
-                )
-
-            # create traxels for all objects
-            for objectId in range(1, list(features.values())[0].shape[0]):
-                # print("Frame {} Object {}".format(frame, objectId))
-                pixelSize = features["Count"][objectId]
-                if pixelSize == 0 or (
-                    self._options.sizeFilter is not None
-                    and (
-                        pixelSize < self._options.sizeFilter[0]
-                        or pixelSize > self._options.sizeFilter[1]
-                    )
-                ):
-                    continue
-
-                # create traxel
-                if usePgmlink:
-                    traxel = pgmlink.Traxel()
-                else:
-                    traxel = Traxel()
-                traxel.Id = objectId
-                traxel.Timestep = frame
-
-                # add raw features
-                for key, val in features.items():
-                    if key == "id":
-                        traxel.idInSegmentation = val[objectId]
-                    elif key == "filename":
-                        traxel.segmentationFilename = val[objectId]
-                    else:
-                        try:
-                            if isinstance(val, list):  # polygon feature returns a list!
-                                featureValues = val[objectId]
-                            else:
-                                featureValues = val[objectId, ...]
-                        except:
-                            logger.error(
-                                "Could not get feature values of {} for key {} from matrix with shape {}".format(
-                                    objectId, key, val.shape
-                                )
-                            )
-                            raise AssertionError()
-                        try:
-                            self._setTraxelFeatureArray(traxel, featureValues, key)
-                            if key == "RegionCenter":
-                                self._setTraxelFeatureArray(
-                                    traxel, featureValues, "com"
-                                )
-                        except:
-                            logger.error(
-                                "Could not add feature array {} for {}".format(
-                                    featureValues, key
-                                )
-                            )
-                            raise AssertionError()
-
-                # add random forest predictions
-                if self._countClassifier is not None:
-                    self._setTraxelFeatureArray(
-                        traxel,
-                        objectCountProbabilities[objectId, :],
-                        self.detectionProbabilityFeatureName,
-                    )
-
-                if (
-                    self._divisionClassifier is not None
-                    and frame + 1 < self.timeRange[1]
-                ):
-                    self._setTraxelFeatureArray(
-                        traxel,
-                        divisionProbabilities[objectId, :],
-                        self.divisionProbabilityFeatureName,
-                    )
+        if self._maxNumFramesInFlight is not None:
+            assert len(dispyNodeIps) == 0
+            self._featuresPerFrame = self._extractFeaturesAndCreateTraxelsStreaming(
+                usePgmlink, ts, fs, turnOffFeatures=turnOffFeatures
+            )
+        else:
+            self._featuresPerFrame = self._extractAllFeatures(
+                dispyNodeIps=dispyNodeIps, turnOffFeatures=turnOffFeatures
+            )
 
-                # set other parameters
-                traxel.set_x_scale(self.x_scale)
-                traxel.set_y_scale(self.y_scale)
-                traxel.set_z_scale(self.z_scale)
+            logger.info("Creating traxels...")
+            progressBar = ProgressBar(stop=len(self._featuresPerFrame))
+            progressBar.show(increase=0)
 
-                if usePgmlink:
-                    # add to pgmlink's traxelstore
-                    ts.add(fs, traxel)
-                else:
-                    self.TraxelsPerFrame.setdefault(frame, {})[objectId] = traxel
-            progressBar.show()
+            for frame, features in self._featuresPerFrame.items():
+                self._createTraxelsForFrame(frame, features, usePgmlink, ts, fs)
+                progressBar.show()
 
         if usePgmlink:
             return ts, fs
 
+    def _getFeaturesPerFrame(self):
+        """
+        **returns** the features of all frames, raises a `ValueError` if they are not available
+        """
+        if self._featuresPerFrame is None:
+            if self._maxNumFramesInFlight is not None:
+                raise ValueError(
+                    "Features were discarded while streaming feature extraction, "
+                    "please specify a featureStoreFilename to look them up later"
+                )
+            raise ValueError("Features are only available after calling fillTraxels")
+        return self._featuresPerFrame
+
     def getTraxelFeatureDict(self, frame, objectId):
         """
         Getter method for features per traxel
         """
-        assert self._featuresPerFrame != None
         traxelFeatureDict = {}
-        for k, v in self._featuresPerFrame[frame].items():
+        for k, v in self._getFeaturesPerFrame()[frame].items():
             if "Polygon" in k:
                 traxelFeatureDict[k] = v[objectId]
             else:
@@ -784,6 +1097,22 @@ class IlpProbabilityGenerator(ProbabilityGenerator):
         features = np.expand_dims(features, axis=0)
         return features
 
+    def getTransitionFeatureMatrix(
+        self, frameA, objectIdsA, frameB, objectIdsB, selectedFeatures
+    ):
+        """
+        Return the transition feature vectors (see `getTransitionFeatureVector`) of all transitions
+        from `objectIdsA[i]` in `frameA` to `objectIdsB[i]` in `frameB` as one matrix with a row per transition
+        """
+        featuresPerFrame = self._getFeaturesPerFrame()
+        return self._pluginManager.applyTransitionFeatureMatrixConstructionPlugins(
+            featuresPerFrame[frameA],
+            featuresPerFrame[frameB],
+            objectIdsA,
+            objectIdsB,
+            selectedFeatures,
+        )
+
 
 if __name__ == "__main__":
     """
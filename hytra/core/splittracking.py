@@ -5,15 +5,37 @@ splits the graph into N parts, and tracks them independently.
 # standard imports
 import logging
 import copy
+import pickle
+import time
+import concurrent.futures
 import numpy as np
 import networkx as nx
 import hytra.core.jsongraph
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 import dpct
 
 
 logger = logging.getLogger("split-track-stitch")
 
 
+def trackSubmodel(submodel, weights, withMergerResolver=None):
+    """
+    Run flow-based tracking on one submodel. The submodel can also be given as a blob serialized with `pickle`,
+    which is how it is sent to worker processes.
+
+    **returns** a tuple of the tracking result and the time in seconds the solver took
+    """
+    if isinstance(submodel, bytes):
+        submodel = pickle.loads(submodel)
+
+    t0 = time.time()
+    if withMergerResolver:
+        result = dpct.trackMaxFlow(submodel, weights)
+    else:
+        result = dpct.trackFlowBased(submodel, weights)
+    return result, time.time() - t0
+
+
 class SplitTracking:
     """
     Run DPCT flow-based tracking solveron sub-sections of video in order to parallelize tracking and speed up processing.
@@ -25,21 +47,31 @@ class SplitTracking:
 
     @staticmethod
     def trackFlowBasedWithSplits(
-        model, weights, numFramesPerSplit, numThreads=None, withMergerResolver=None
+        model,
+        weights,
+        numFramesPerSplit,
+        numThreads=None,
+        withMergerResolver=None,
+        useMultiprocessing=False,
     ):
         """
         Splits video and runs tracking separately for each sub-section, followed by stitching together the results.
+
+        If `numThreads` is given, the sub-sections are tracked by a pool of that many workers.
+        As the solver holds the GIL, they only run concurrently if `useMultiprocessing=True`,
+        in which case every submodel is serialized once and sent to a worker process.
+        The time needed to solve each submodel is logged, which helps choosing `numFramesPerSplit`.
         """
         logging.basicConfig(level=logging.INFO)
 
-        _, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(
-            model
+        uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(
+            model["traxelToUniqueId"]
         )
 
         detectionTimestepTuples = [
             (timestepIdTuple, entry)
             for entry in model["segmentationHypotheses"]
-            for timestepIdTuple in uuidToTraxelMap[int(entry["id"])]
+            for timestepIdTuple in uuidTraxelMapping.getTraxels(int(entry["id"]))
         ]
         detectionsPerTimestep = {}
         for timestep_id, detection in detectionTimestepTuples:
@@ -65,7 +97,7 @@ class SplitTracking:
         for t in detectionsPerTimestep.keys():
             nonSingletonCosts = []
             for d in detectionsPerTimestep[t]:
-                d["nid"] = uuidToTraxelMap[d["id"]][0]
+                d["nid"] = uuidTraxelMapping.getTraxels(d["id"])[0]
                 detectionsById[d["id"]] = d
                 f = d["features"][:]
                 del f[1]
@@ -155,6 +187,7 @@ class SplitTracking:
             return submodel
 
         submodels = []
+        submodelTimeRanges = []
         lastSplit = 0
         splitPoints.append(lastFrame)  # so that we get the last split as well
         for splitPoint in splitPoints:
@@ -164,6 +197,7 @@ class SplitTracking:
                 )
             )
             submodels.append(getSubmodel(lastSplit, splitPoint + 1))
+            submodelTimeRanges.append((lastSplit, splitPoint + 1))
             logger.info(
                 "\t contains {} nodes and {} edges".format(
                     len(submodels[-1]["segmentationHypotheses"]),
@@ -172,54 +206,51 @@ class SplitTracking:
             )
             lastSplit = splitPoint + 1
 
-        # Will store submodel results
+        # Will store submodel results, in the same order as the submodels
         results = []
+        solveTimes = []
 
         if numThreads:
-            logger.info("Using {} threads for solver".format(numThreads))
-
-            # dummy replicates the multiprocessing API using the threading module
-            # this is necessary to to prevent multiprocessing pickling error
-            # see: http://stackoverflow.com/questions/8804830/python-multiprocessing-pickling-error
-            from multiprocessing.dummy import Pool
-
-            # callback function
-            def result_callback(result):
-                results.append(result)
-
-            pool = Pool(numThreads)
-            for i, submodel in enumerate(submodels):
-                # TODO: be robust against changes of num weights!
-                # TODO: release GIL in tracking python wrappers to allow parallel solving!!
-                logger.info("Tracking submodel {}/{}".format(i, len(submodels)))
-
-                if withMergerResolver:
-                    pool.apply_async(
-                        dpct.trackMaxFlow,
-                        args=(submodel, weights),
-                        callback=result_callback,
-                    )
-                else:
-                    pool.apply_async(
-                        dpct.trackFlowBased,
-                        args=(submodel, weights),
-                        callback=result_callback,
+            if useMultiprocessing:
+                logger.info("Using {} processes for solver".format(numThreads))
+                ExecutorType = concurrent.futures.ProcessPoolExecutor
+            else:
+                # the solver holds the GIL, so threads will not track the submodels concurrently
+                logger.info("Using {} threads for solver".format(numThreads))
+                ExecutorType = concurrent.futures.ThreadPoolExecutor
+
+            with ExecutorType(max_workers=numThreads) as executor:
+                jobs = []
+                for i, submodel in enumerate(submodels):
+                    # TODO: be robust against changes of num weights!
+                    logger.info("Tracking submodel {}/{}".format(i, len(submodels)))
+                    if useMultiprocessing:
+                        submodel = pickle.dumps(submodel, pickle.HIGHEST_PROTOCOL)
+                    jobs.append(
+                        executor.submit(
+                            trackSubmodel, submodel, weights, withMergerResolver
+                        )
                     )
 
-            # Close pool and run async tasks
-            pool.close()
-            pool.join()
+                for job in jobs:
+                    result, solveTime = job.result()
+                    results.append(result)
+                    solveTimes.append(solveTime)
 
         else:
             for i, submodel in enumerate(submodels):
                 # TODO: be robust against changes of num weights!
-                # TODO: release GIL in tracking python wrappers to allow parallel solving!!
                 logger.info("Tracking submodel {}/{}".format(i, len(submodels)))
+                result, solveTime = trackSubmodel(submodel, weights, withMergerResolver)
+                results.append(result)
+                solveTimes.append(solveTime)
 
-                if withMergerResolver:
-                    results.append(dpct.trackMaxFlow(submodel, weights))
-                else:
-                    results.append(dpct.trackFlowBased(submodel, weights))
+        for i, (timeRange, solveTime) in enumerate(zip(submodelTimeRanges, solveTimes)):
+            logger.info(
+                "Submodel {}/{} from t={} to t={} was solved in {} secs".format(
+                    i, len(submodels), timeRange[0], timeRange[1], solveTime
+                )
+            )
 
         # merge results
         # make detection weight higher, or accumulate energy over tracks (but what to do with mergers then?),
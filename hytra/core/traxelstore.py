@@ -0,0 +1,228 @@
+"""
+Columnar storage of traxels: instead of keeping a dictionary of small arrays per traxel,
+the `TraxelStore` keeps one matrix per feature and frame with a row per traxel.
+The traxels handed out by the store are lightweight views into these matrices
+that provide the same interface as `hytra.core.probabilitygenerator.Traxel`.
+"""
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+import numpy as np
+
+
+class _FrameColumns(object):
+    """
+    The feature columns of all traxels of one frame. A column is either a matrix of shape
+    `(numTraxels, featureLength)`, or a list with one flat array per traxel for features
+    whose length differs between objects (e.g. polygons).
+    Features that are added to single traxels later on are stored in `extraFeatures`, a dictionary
+    per row.
+    """
+
+    __slots__ = ("columns", "extraFeatures", "scale")
+
+    def __init__(self, scale):
+        self.columns = {}
+        self.extraFeatures = {}
+        self.scale = scale
+
+
+class TraxelFeatures(MutableMapping):
+    """
+    Dictionary-like access to the features of one traxel in a `TraxelStore`, as the `Features` dict
+    of a `Traxel`. Values of columns are returned as views into the column matrix, so
+    modifying them in place modifies the store.
+    Assigning a new feature only affects this traxel.
+    """
+
+    __slots__ = ("_frameColumns", "_row")
+
+    def __init__(self, frameColumns, row):
+        self._frameColumns = frameColumns
+        self._row = row
+
+    def _extras(self):
+        return self._frameColumns.extraFeatures.get(self._row, {})
+
+    def __getitem__(self, name):
+        extras = self._extras()
+        if name in extras:
+            return extras[name]
+        return self._frameColumns.columns[name][self._row]
+
+    def __setitem__(self, name, value):
+        self._frameColumns.extraFeatures.setdefault(self._row, {})[name] = value
+
+    def __delitem__(self, name):
+        extras = self._extras()
+        if name in extras:
+            del extras[name]
+        elif name in self._frameColumns.columns:
+            raise TypeError(
+                "Cannot remove feature {} of a single traxel, it is stored in a column of the TraxelStore".format(
+                    name
+                )
+            )
+        else:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._frameColumns.columns or name in self._extras()
+
+    def __iter__(self):
+        extras = self._extras()
+        for name in self._frameColumns.columns:
+            if name not in extras:
+                yield name
+        for name in extras:
+            yield name
+
+    def __len__(self):
+        extras = self._extras()
+        return len(self._frameColumns.columns) + len(
+            [name for name in extras if name not in self._frameColumns.columns]
+        )
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class TraxelView(object):
+    """
+    A traxel whose features live in a `TraxelStore`. It offers the same interface as
+    `hytra.core.probabilitygenerator.Traxel` (and thus pgmlink's traxel), but only holds
+    a reference to the columns of its frame and its row therein.
+
+    Note that the scale is shared by all traxels of a frame.
+    """
+
+    __slots__ = (
+        "_frameColumns",
+        "_row",
+        "Id",
+        "Timestep",
+        "conflictingTraxelIds",
+        "idInSegmentation",
+        "segmentationFilename",
+    )
+
+    def __init__(self, frameColumns, row, objectId, timestep):
+        self._frameColumns = frameColumns
+        self._row = row
+        self.Id = objectId
+        self.Timestep = timestep
+
+        # conflicting traxel ids in the same frame
+        self.conflictingTraxelIds = None
+
+    @property
+    def Features(self):
+        return TraxelFeatures(self._frameColumns, self._row)
+
+    @property
+    def _scale(self):
+        return self._frameColumns.scale
+
+    def set_x_scale(self, val):
+        self._frameColumns.scale[0] = val
+
+    def set_y_scale(self, val):
+        self._frameColumns.scale[1] = val
+
+    def set_z_scale(self, val):
+        self._frameColumns.scale[2] = val
+
+    def X(self):
+        return self.Features["com"][0]
+
+    def Y(self):
+        return self.Features["com"][1]
+
+    def Z(self):
+        try:
+            return self.Features["com"][2]
+        except:
+            return 0.0
+
+    def add_feature_array(self, name, length):
+        self.Features[name] = np.zeros(length)
+
+    def set_feature_value(self, name, index, value):
+        features = self.Features
+        assert name in features
+        features[name][index] = value
+
+    def get_feature_value(self, name, index):
+        features = self.Features
+        assert name in features
+        return features[name][index]
+
+    def print_available_features(self):
+        print(list(self.Features.keys()))
+
+    def __repr__(self):
+        return "Traxel(Timestep={},Id={})".format(self.Timestep, self.Id)
+
+
+class TraxelStore(object):
+    """
+    Stores the features of all traxels frame by frame in one matrix per feature,
+    and hands out `TraxelView`s that behave like `Traxel`s.
+    """
+
+    def __init__(self):
+        self._columnsPerFrame = {}
+
+    def frames(self):
+        return self._columnsPerFrame.keys()
+
+    def addTraxels(self, frame, objectIds, features, scale=(1.0, 1.0, 1.0)):
+        """
+        Add traxels for all `objectIds` in `frame`, taking their features from the `features` dict.
+        Every value of `features` must be indexable by object id, i.e. an array with
+        one row per object of the frame, or a list for features with a different length per object.
+        All features are converted to flat float64 arrays per traxel, like `Traxel.set_feature_value` would.
+        If the same array is given under several names, it is only stored once.
+
+        Adding traxels of a frame again replaces all traxels of that frame.
+
+        **returns** a dictionary with a `TraxelView` per object id
+        """
+        objectIds = np.asarray(objectIds, dtype=np.int64)
+        frameColumns = _FrameColumns(np.array(scale, dtype=np.float64))
+
+        convertedColumns = {}
+        for name, values in features.items():
+            if id(values) not in convertedColumns:
+                convertedColumns[id(values)] = self._createColumn(values, objectIds)
+            frameColumns.columns[name] = convertedColumns[id(values)]
+        self._columnsPerFrame[frame] = frameColumns
+
+        return dict(
+            (objectId, TraxelView(frameColumns, row, objectId, frame))
+            for row, objectId in enumerate(objectIds.tolist())
+        )
+
+    @staticmethod
+    def _createColumn(values, objectIds):
+        if isinstance(values, list):
+            return [
+                np.asarray(values[objectId], dtype=np.float64).flatten()
+                for objectId in objectIds
+            ]
+        column = np.asarray(values)[objectIds, ...].astype(np.float64)
+        return column.reshape(len(objectIds), -1)
+
+    def getFeatureMatrix(self, frame, name):
+        """
+        **returns** the matrix of feature `name` with a row per traxel of `frame`, in the order
+        the traxels were added.
+        """
+        column = self._columnsPerFrame[frame].columns[name]
+        assert not isinstance(column, list), "Feature {} has no fixed length".format(
+            name
+        )
+        return column
@@ -0,0 +1,114 @@
+class UuidTraxelMapping(object):
+    """
+    Bidirectional mapping between the unique IDs (UUIDs) of the nodes of a tracking model
+    and the traxels `(int(timestep), int(labelimageId))` they represent (several ones for tracklets).
+
+    It replaces the two dictionaries returned by `getMappingsBetweenUUIDsAndTraxels`: all keys are integers,
+    and the string keyed `traxelToUniqueId` dictionary of our JSON format is only created by `toTraxelToUniqueId()`
+    when a model is serialized. The mapping is created once by the `HypothesesGraph`
+    (see `HypothesesGraph.getUuidTraxelMapping()`) or `JsonTrackingGraph` (see `JsonTrackingGraph.uuidTraxelMapping`),
+    and handed on from there. Use `copy()` before modifying a mapping that is owned by a graph.
+    """
+
+    def __init__(self):
+        self._uuidToTraxels = {}
+        self._traxelToUuid = {}
+
+    @classmethod
+    def fromTraxelToUniqueId(cls, traxelToUniqueId):
+        """
+        Create the mapping from the `traxelToUniqueId` dictionary of a model,
+        which has the structure `{str(timestep):{str(labelimageId):int(uuid), ...}, ...}`
+        """
+        mapping = cls()
+        for timestep, uuidPerId in traxelToUniqueId.items():
+            timestep = int(timestep)
+            for objectId, uuid in uuidPerId.items():
+                traxel = (timestep, int(objectId))
+                mapping._traxelToUuid[traxel] = uuid
+                mapping._uuidToTraxels.setdefault(uuid, []).append(traxel)
+
+        # sort the list of traxels per UUID by their timesteps
+        for traxels in mapping._uuidToTraxels.values():
+            traxels.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
+        return mapping
+
+    def copy(self):
+        mapping = UuidTraxelMapping()
+        mapping._uuidToTraxels = dict(
+            (uuid, list(traxels)) for uuid, traxels in self._uuidToTraxels.items()
+        )
+        mapping._traxelToUuid = dict(self._traxelToUuid)
+        return mapping
+
+    def __len__(self):
+        """ **returns** the number of UUIDs """
+        return len(self._uuidToTraxels)
+
+    def add(self, uuid, traxels):
+        """
+        Map the list of `traxels`, given as `(timestep, labelimageId)` tuples, to `uuid`.
+        If the UUID is already known, the traxels are added to the ones it represents.
+        """
+        uuidTraxels = self._uuidToTraxels.setdefault(uuid, [])
+        for timestep, objectId in traxels:
+            traxel = (int(timestep), int(objectId))
+            self._traxelToUuid[traxel] = uuid
+            uuidTraxels.append(traxel)
+        uuidTraxels.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
+
+    def removeTraxel(self, timestep, objectId):
+        """
+        Remove a traxel from the mapping, and its UUID if that does not represent any other traxels.
+
+        **returns** the UUID the traxel was mapped to
+        """
+        traxel = (timestep, objectId)
+        uuid = self._traxelToUuid.pop(traxel)
+        uuidTraxels = self._uuidToTraxels[uuid]
+        uuidTraxels.remove(traxel)
+        if len(uuidTraxels) == 0:
+            del self._uuidToTraxels[uuid]
+        return uuid
+
+    def hasTraxel(self, timestep, objectId):
+        return (timestep, objectId) in self._traxelToUuid
+
+    def hasUuid(self, uuid):
+        return uuid in self._uuidToTraxels
+
+    def getUuid(self, timestep, objectId):
+        """ **returns** the UUID of the node that contains the traxel `(timestep, objectId)` """
+        return self._traxelToUuid[(timestep, objectId)]
+
+    def getTraxels(self, uuid):
+        """ **returns** the list of `(timestep, labelimageId)` tuples of a node, sorted by timestep """
+        return self._uuidToTraxels[uuid]
+
+    def getUuidToTraxelMap(self):
+        """
+        **returns** the dictionary `{int(uuid): [(int(timestep), int(labelimageId)), ...]}`
+        as used by `getMappingsBetweenUUIDsAndTraxels`. It must not be modified.
+        """
+        return self._uuidToTraxels
+
+    def getNextUuid(self):
+        """ **returns** the smallest UUID that is larger than all UUIDs in this mapping """
+        if len(self._uuidToTraxels) == 0:
+            return 0
+        return max(self._uuidToTraxels.keys()) + 1
+
+    def getTimeRange(self):
+        """ **returns** a tuple of the first timestep and one past the last timestep that contain traxels """
+        timesteps = [timestep for timestep, _ in self._traxelToUuid.keys()]
+        return min(timesteps), max(timesteps) + 1
+
+    def toTraxelToUniqueId(self):
+        """
+        **returns** the `traxelToUniqueId` dictionary of our JSON format:
+        `{str(timestep):{str(labelimageId):int(uuid), ...}, ...}`
+        """
+        traxelToUniqueId = {}
+        for (timestep, objectId), uuid in self._traxelToUuid.items():
+            traxelToUniqueId.setdefault(str(timestep), {})[str(objectId)] = uuid
+        return traxelToUniqueId
@@ -10,6 +10,7 @@ from hytra.core.probabilitygenerator import (
     DummyExecutor,
 )
 from hytra.util.progressbar import ProgressBar
+from hytra.util.labeloverlap import computeLabelOverlaps, computeLabelSizes
 
 
 logger = logging.getLogger(__name__)
@@ -38,37 +39,41 @@ def findConflictingHypothesesInSeparateProcess(
 
     overlaps = {}  # overlap dict: key=globalId, value=[list of globalIds]
 
+    # load every segmentation hypothesis of this frame only once
+    labelImages = [
+        pluginManager.getImageProvider().getLabelImageForFrame(filename, path, frame)
+        for filename, path in zip(labelImageFilenames, labelImagePaths)
+    ]
+
     for labelImageIndexA in range(len(labelImageFilenames)):
-        labelImageA = pluginManager.getImageProvider().getLabelImageForFrame(
-            labelImageFilenames[labelImageIndexA],
-            labelImagePaths[labelImageIndexA],
-            frame,
+        labelImageA = labelImages[labelImageIndexA]
+        objectIdsA = [o for o in np.unique(labelImageA) if o != 0]
+        globalIdsA = dict(
+            (
+                o,
+                labelImageFrameIdToGlobalId[
+                    (labelImageFilenames[labelImageIndexA], frame, o)
+                ],
+            )
+            for o in objectIdsA
         )
         for labelImageIndexB in range(labelImageIndexA + 1, len(labelImageFilenames)):
-            labelImageB = pluginManager.getImageProvider().getLabelImageForFrame(
-                labelImageFilenames[labelImageIndexB],
-                labelImagePaths[labelImageIndexB],
-                frame,
-            )
+            for globalIdA in globalIdsA.values():
+                overlaps.setdefault(globalIdA, [])
+
             # check for overlaps - even a 1-pixel overlap is enough to be mutually exclusive!
-            for objectIdA in np.unique(labelImageA):
-                if objectIdA == 0:
-                    continue
-                overlapping = set(
-                    np.unique(labelImageB[labelImageA == objectIdA])
-                ) - set([0])
-                overlappingGlobalIds = [
-                    labelImageFrameIdToGlobalId[
-                        (labelImageFilenames[labelImageIndexB], frame, o)
-                    ]
-                    for o in overlapping
-                ]
-                globalIdA = labelImageFrameIdToGlobalId[
-                    (labelImageFilenames[labelImageIndexA], frame, objectIdA)
+            overlappingIdsA, overlappingIdsB, _ = computeLabelOverlaps(
+                labelImageA, labelImages[labelImageIndexB]
+            )
+            for objectIdA, objectIdB in zip(
+                overlappingIdsA.tolist(), overlappingIdsB.tolist()
+            ):
+                globalIdA = globalIdsA[objectIdA]
+                globalIdB = labelImageFrameIdToGlobalId[
+                    (labelImageFilenames[labelImageIndexB], frame, objectIdB)
                 ]
-                overlaps.setdefault(globalIdA, []).extend(overlappingGlobalIds)
-                for globalIdB in overlappingGlobalIds:
-                    overlaps.setdefault(globalIdB, []).append(globalIdA)
+                overlaps[globalIdA].append(globalIdB)
+                overlaps.setdefault(globalIdB, []).append(globalIdA)
 
     return frame, overlaps
 
@@ -104,6 +109,7 @@ def computeJaccardScoresOnCloud(
     groundTruthLabelImage = pluginManager.getImageProvider().getLabelImageForFrame(
         groundTruthFilename, groundTruthPath, frame
     )
+    groundTruthLabelSizes = computeLabelSizes(groundTruthLabelImage)
 
     for labelImageIndexA in range(len(labelImageFilenames)):
         labelImageA = pluginManager.getImageProvider().getLabelImageForFrame(
@@ -111,37 +117,38 @@ def computeJaccardScoresOnCloud(
             labelImagePaths[labelImageIndexA],
             frame,
         )
-        # check for overlaps - even a 1-pixel overlap is enough to be mutually exclusive!
-        for objectIdA in np.unique(labelImageA):
-            if objectIdA == 0:
-                continue
+        labelSizesA = computeLabelSizes(labelImageA)
+
+        # all intersections between objects and GT labels at once, sorted by objectId and gtLabel
+        overlappingIdsA, overlappingGtLabels, intersectingPixels = computeLabelOverlaps(
+            labelImageA, groundTruthLabelImage
+        )
+        for objectIdA, gtLabel, intersection in zip(
+            overlappingIdsA.tolist(),
+            overlappingGtLabels.tolist(),
+            intersectingPixels.tolist(),
+        ):
             globalIdA = labelImageFrameIdToGlobalId[
                 (labelImageFilenames[labelImageIndexA], frame, objectIdA)
             ]
-            overlap = groundTruthLabelImage[labelImageA == objectIdA]
-            overlappingGtElements = set(np.unique(overlap)) - set([0])
-
-            for gtLabel in overlappingGtElements:
-                # compute Jaccard scores
-                intersectingPixels = np.sum(overlap == gtLabel)
-                unionPixels = np.sum(
-                    np.logical_or(
-                        groundTruthLabelImage == gtLabel, labelImageA == objectIdA
-                    )
+
+            # compute Jaccard scores
+            unionPixels = (
+                labelSizesA[objectIdA] + groundTruthLabelSizes[gtLabel] - intersection
+            )
+            jaccardScore = float(intersection) / float(unionPixels)
+
+            # append to object's score list
+            scores.setdefault(globalIdA, []).append((gtLabel, jaccardScore))
+
+            # store this as GT mapping if there was no better object for this GT label yet
+            if jaccardScore > groundTruthMinJaccardScore and (
+                (frame, gtLabel) not in gtToGlobalIdMap
+                or gtToGlobalIdMap[(frame, gtLabel)][-1][1] < jaccardScore
+            ):
+                gtToGlobalIdMap.setdefault((frame, gtLabel), []).append(
+                    (globalIdA, jaccardScore)
                 )
-                jaccardScore = float(intersectingPixels) / float(unionPixels)
-
-                # append to object's score list
-                scores.setdefault(globalIdA, []).append((gtLabel, jaccardScore))
-
-                # store this as GT mapping if there was no better object for this GT label yet
-                if jaccardScore > groundTruthMinJaccardScore and (
-                    (frame, gtLabel) not in gtToGlobalIdMap
-                    or gtToGlobalIdMap[(frame, gtLabel)][-1][1] < jaccardScore
-                ):
-                    gtToGlobalIdMap.setdefault((frame, gtLabel), []).append(
-                        (globalIdA, jaccardScore)
-                    )
 
     # sort all gt mappings by ascending jaccard score
     for _, v in gtToGlobalIdMap.items():
@@ -339,9 +346,7 @@ class ConflictingSegmentsProbabilityGenerator(IlpProbabilityGenerator):
         logger.info("Finding jaccard scores took {} secs".format(t1 - t0))
 
         # create JSON result by mapping it to the hypotheses graph
-        traxelIdPerTimestepToUniqueIdMap, _ = (
-            hypothesesGraph.getMappingsBetweenUUIDsAndTraxels()
-        )
+        uuidTraxelMapping = hypothesesGraph.getUuidTraxelMapping()
         detectionResults = []
         for (
             gtFrameAndId,
@@ -349,9 +354,9 @@ class ConflictingSegmentsProbabilityGenerator(IlpProbabilityGenerator):
         ) in gtFrameIdToGlobalIdsWithScoresMap.items():
             detectionResults.append(
                 {
-                    "id": traxelIdPerTimestepToUniqueIdMap[str(gtFrameAndId[0])][
-                        str(globalIdsAndScores[-1][0])
-                    ],
+                    "id": uuidTraxelMapping.getUuid(
+                        gtFrameAndId[0], globalIdsAndScores[-1][0]
+                    ),
                     "value": 1,
                 }
             )
@@ -415,9 +420,9 @@ class ConflictingSegmentsProbabilityGenerator(IlpProbabilityGenerator):
             return True
 
         def gtIdPerFrameToUuid(frame, gtId):
-            return traxelIdPerTimestepToUniqueIdMap[str(frame)][
-                str(gtFrameIdToGlobalIdsWithScoresMap[(frame, gtId)][-1][0])
-            ]
+            return uuidTraxelMapping.getUuid(
+                frame, gtFrameIdToGlobalIdsWithScoresMap[(frame, gtId)][-1][0]
+            )
 
         # add links of all tracks
         for track in tracks:
@@ -0,0 +1,52 @@
+from hytra.pluginsystem import feature_serializer_plugin
+import numpy as np
+import h5py
+import pickle
+
+
+class Hdf5FeatureSerializer(feature_serializer_plugin.FeatureSerializerPlugin):
+    """
+    serializes features into a local HDF5 file, one group per frame
+    """
+
+    def _frameGroupName(self, timeframe):
+        return "frame-{}".format(timeframe)
+
+    def storeFeaturesForFrame(self, features, timeframe):
+        """
+        Stores feature data
+        """
+        assert self.filename is not None
+        with h5py.File(self.filename, "a") as h5file:
+            groupName = self._frameGroupName(timeframe)
+            if groupName in h5file:
+                del h5file[groupName]
+            group = h5file.create_group(groupName)
+
+            # feature names may contain slashes, so they are stored as attributes
+            for i, (name, value) in enumerate(features.items()):
+                if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+                    dataset = group.create_dataset(str(i), data=value)
+                    dataset.attrs["pickled"] = False
+                else:
+                    # e.g. polygon features are lists of arrays with varying length
+                    dataset = group.create_dataset(
+                        str(i), data=np.void(pickle.dumps(value))
+                    )
+                    dataset.attrs["pickled"] = True
+                dataset.attrs["name"] = name
+
+    def loadFeaturesForFrame(self, features, timeframe):
+        """
+        loads feature data
+        """
+        assert self.filename is not None
+        frameFeatures = {}
+        with h5py.File(self.filename, "r") as h5file:
+            for dataset in h5file[self._frameGroupName(timeframe)].values():
+                if dataset.attrs["pickled"]:
+                    value = pickle.loads(dataset[()].tobytes())
+                else:
+                    value = dataset[()]
+                frameFeatures[dataset.attrs["name"]] = value
+        return frameFeatures
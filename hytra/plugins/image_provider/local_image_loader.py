@@ -1,17 +1,54 @@
 from hytra.pluginsystem import image_provider_plugin
 import hytra.util.axesconversion
+from hytra.util.h5filepool import defaultPool
 import numpy as np
 import h5py
 import logging
 
 
+def parseBlockSlice(blockSlice):
+    """
+    **returns** the list of `(start, stop)` tuples per axis of a `blockSlice` attribute like `[0:1,0:100,...]`
+    """
+    bs = blockSlice[1:-1]
+    if isinstance(bs, bytes):
+        bs = bs.decode()
+    return [(int(r.split(":")[0]), int(r.split(":")[1])) for r in bs.split(",")]
+
+
+def buildBlockIndex(blockGroup):
+    """
+    Read the `blockSlice` attribute of every block of a `LabelImage_v2` group once.
+
+    **returns** a dictionary `{timeframe: (blockName, timeIndexInBlock)}`
+    """
+    blockIndex = {}
+    for blockName, block in blockGroup.items():
+        assert "blockSlice" in block.attrs
+        roi = parseBlockSlice(block.attrs["blockSlice"])
+        for timeframe in range(roi[0][0], roi[0][1]):
+            # WARNING we assume that every block captures the full image extent or more timeframes,
+            # which might not always be true (are 3D frames separated into multiple blocks?)
+            blockIndex.setdefault(timeframe, (blockName, timeframe - roi[0][0]))
+    return blockIndex
+
+
 class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
     """
-    Computes the subtraction of features in the feature vector
+    Loads images from local HDF5 files.
+
+    The files are kept open in the process-wide `hytra.util.h5filepool.defaultPool`
+    between calls, together with the index of the blocks of `LabelImage_v2` label images.
     """
 
     shape = None
 
+    def deactivate(self):
+        """
+        Close all files that are kept open for reading
+        """
+        defaultPool.release()
+
     def getImageDataAtTimeFrame(self, Resource, PathInResource, axes, timeframe):
         """
         Loads image data from local resource file in hdf5 format.
@@ -19,7 +56,7 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
         Return numpy array of image data at timeframe.
         """
         logging.getLogger("LocalImageLoader").debug("opening {}".format(Resource))
-        with h5py.File(Resource, "r") as rawH5:
+        with defaultPool.openFile(Resource) as rawH5:
             logging.getLogger("LocalImageLoader").debug(
                 "PathInResource {}".format(timeframe)
             )
@@ -45,7 +82,7 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
         if self.shape == None:
             self.getImageShape(Resource, PathInResource)
 
-        with h5py.File(Resource, "r") as h5file:
+        with defaultPool.openFile(Resource) as h5file:
             if PathInResource.count("%") == 5 and not "LabelImage_v2" in PathInResource:
                 internalPath = PathInResource % (
                     timeframe,
@@ -59,26 +96,16 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
                 )
                 labelImage = h5file[internalPath][0, ..., 0]
             elif "LabelImage_v2" in PathInResource:
-                # loop though all blocks in h5 file and read the blockshape, and figure out whether this frame is in there.
-                labelImage = None
-                for block in h5file[PathInResource].values():
-                    assert "blockSlice" in block.attrs
-                    blockSlice = block.attrs["blockSlice"]
-                    bs = blockSlice[1:-1]
-                    if isinstance(bs, bytes):
-                        bs = bs.decode()
-
-                    roi = [
-                        (int(r.split(":")[0]), int(r.split(":")[1]))
-                        for r in bs.split(",")
-                    ]
-                    if timeframe in range(roi[0][0], roi[0][1]):
-                        timeStart = timeframe - roi[0][0]
-                        # WARNING we assume that every block captures the full image extent or more timeframes,
-                        # which might not always be true (are 3D frames separated into multiple blocks?)
-                        labelImage = block[timeStart : timeStart + 1, ..., 0]
-                        break
-                assert labelImage is not None
+                # look up the block that contains this frame in the index of all blocks of the h5 file
+                blockIndex = defaultPool.getCached(
+                    Resource,
+                    ("blockIndex", PathInResource),
+                    lambda f: buildBlockIndex(f[PathInResource]),
+                )
+                assert timeframe in blockIndex
+                blockName, timeStart = blockIndex[timeframe]
+                block = h5file[PathInResource][blockName]
+                labelImage = block[timeStart : timeStart + 1, ..., 0]
             else:
                 raise ValueError("Invalid PathInResource: {}".format(PathInResource))
             return labelImage.squeeze().astype(np.uint32)
@@ -92,7 +119,7 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
 
         Works with both `PathInResource` styles: LabelImage and LabelImage_v2
         """
-        with h5py.File(Resource, "r") as h5file:
+        with defaultPool.openFile(Resource) as h5file:
             shape = list(h5file["/".join(PathInResource.split("/")[:-1])].values())[
                 0
             ].shape[1:4]
@@ -106,7 +133,7 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
         PathInResource provides the internal image path
         Return tuple of (first frame, last frame)
         """
-        with h5py.File(Resource, "r") as h5file:
+        with defaultPool.openFile(Resource) as h5file:
             maxTime = len(h5file["/".join(PathInResource.split("/")[:-1])].keys())
             return (0, maxTime)
 
@@ -114,6 +141,8 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
         """
         export labelimage of timeframe
         """
+        # the file can not be written while it is open for reading
+        defaultPool.release(Resource)
         with h5py.File(Resource, "r+") as h5file:
             if PathInResource.count("%") == 5 and not "LabelImage_v2" in PathInResource:
                 internalPath = PathInResource % (
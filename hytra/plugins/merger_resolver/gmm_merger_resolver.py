@@ -10,7 +10,8 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
     """
 
     def initGMM(self, mergerCount, object_init_list=None):
-        gmm = mixture.GaussianMixture(n_components=mergerCount)
+        # fixed random state, so that merger resolving is reproducible
+        gmm = mixture.GaussianMixture(n_components=mergerCount, random_state=0)
         if object_init_list is not None and len(object_init_list) > 0:
             gmm.weights_ = np.array([o[0] for o in object_init_list])
             gmm.covariances_ = np.array([o[1] for o in object_init_list])
@@ -45,7 +46,13 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
         return self.getObjectInitializationList(gmm)
 
     def resolveMerger(
-        self, labelImage, objectId, nextId, mergerCount, initializations=None
+        self,
+        labelImage,
+        objectId,
+        nextId,
+        mergerCount,
+        initializations=None,
+        offset=None,
     ):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into `mergerCount`
@@ -53,13 +60,18 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
         in the preceding frame of all possible incomings (list may be empty, but could
         also be more than `mergerCount`).
   
-        `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation
+        `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation.
+        It can also be a crop around the object, in which case `offset` must contain
+        the position of the crop inside the full frame so that the fits are in frame coordinates.
   
         **returns** a list of fitted objects
         """
 
         # fit GMM to label image data
         coordinates = np.transpose(np.vstack(np.where(labelImage == objectId)))
+        if offset is not None:
+            assert coordinates.shape[1] == len(offset)
+            coordinates = coordinates + offset
         gmm = self.initGMM(mergerCount, initializations)
         gmm.fit(coordinates)
         assert gmm.converged_
@@ -71,12 +83,16 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
         Resolve the object with the ID `objectId` in the `labelImage` into the fitted models with the given new IDs.
         `labelImage` should be updated by replacing all pixels that were labelled with `objectId`
         to get a new Id depending on the fit.
+
+        `labelImage` can also be a view of a crop around the object,
+        with `offset` being the position of the crop inside the full frame.
         """
 
         if len(fits) > 1:
             assert len(fits) == len(newIds)
             # edit labelimage in-place
-            coordinates = np.transpose(np.vstack(np.where(labelImage == objectId)))
+            objectMask = labelImage == objectId
+            coordinates = np.transpose(np.vstack(np.where(objectMask)))
             if offset is not None:
                 assert coordinates.shape[1] == len(offset)
                 coordinates = coordinates + offset
@@ -84,4 +100,4 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
             responsibilities = gmm.predict(coordinates)
             newIds = np.array(newIds)
             newObjectIds = newIds[responsibilities]
-            labelImage[labelImage == objectId] = newObjectIds
+            labelImage[objectMask] = newObjectIds
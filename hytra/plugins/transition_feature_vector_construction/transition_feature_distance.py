@@ -20,6 +20,37 @@ class TransitionFeaturesDistance(
             ]
         return []
 
+    def constructFeatureMatrix(
+        self,
+        frameFeaturesA,
+        frameFeaturesB,
+        objectIdsA,
+        objectIdsB,
+        selectedFeatures,
+    ):
+        key = "RegionCenter"
+        if key in selectedFeatures:
+            objectIdsA = np.asarray(objectIdsA, dtype=np.int64)
+            objectIdsB = np.asarray(objectIdsB, dtype=np.int64)
+            centersA = np.asarray(frameFeaturesA[key])[objectIdsA]
+            centersB = np.asarray(frameFeaturesB[key])[objectIdsB]
+            return np.column_stack(
+                [
+                    self._rowNorms(centersA - centersB),
+                    self._rowNorms(centersA * centersB),
+                ]
+            )
+        return np.zeros((len(objectIdsA), 0))
+
+    @staticmethod
+    def _rowNorms(vectors):
+        """
+        Euclidean norm of every row. Uses the same dot product as `np.linalg.norm` on single vectors,
+        so that the results are bitwise identical to `constructFeatureVector`.
+        """
+        squaredNorms = np.matmul(vectors[:, np.newaxis, :], vectors[:, :, np.newaxis])
+        return np.sqrt(squaredNorms.ravel())
+
     def getFeatureNames(self, featureDictObjectA, featureDictObjectB, selectedFeatures):
         key = "RegionCenter"
         if key in selectedFeatures:
@@ -1,6 +1,5 @@
 from hytra.pluginsystem import transition_feature_vector_construction_plugin
 import numpy as np
-from compiler.ast import flatten
 
 
 class TransitionFeaturesMultiplication(
@@ -33,12 +32,12 @@ class TransitionFeaturesMultiplication(
                     )
                 else:
                     features.extend(
-                        flatten(
-                            (
-                                featureDictObjectA[key].astype("float32")
-                                * featureDictObjectB[key].astype("float32")
-                            ).tolist()
+                        (
+                            featureDictObjectA[key].astype("float32")
+                            * featureDictObjectB[key].astype("float32")
                         )
+                        .flatten()
+                        .tolist()
                     )
 
         # there should be no nans or infs
@@ -46,6 +45,48 @@ class TransitionFeaturesMultiplication(
 
         return features
 
+    def constructFeatureMatrix(
+        self,
+        frameFeaturesA,
+        frameFeaturesB,
+        objectIdsA,
+        objectIdsB,
+        selectedFeatures,
+    ):
+        assert "Global<Maximum >" not in selectedFeatures
+        assert "Global<Minimum >" not in selectedFeatures
+        assert "Histrogram" not in selectedFeatures
+        assert "Polygon" not in selectedFeatures
+
+        objectIdsA = np.asarray(objectIdsA, dtype=np.int64)
+        objectIdsB = np.asarray(objectIdsB, dtype=np.int64)
+        columns = [np.zeros((len(objectIdsA), 0))]
+
+        for key in selectedFeatures:
+            if key == "RegionCenter":
+                continue
+            else:
+                valuesA = np.asarray(frameFeaturesA[key])[objectIdsA]
+                valuesB = np.asarray(frameFeaturesB[key])[objectIdsB]
+                numValues = int(np.prod(valuesA.shape[1:]))
+                valuesA = valuesA.reshape(len(objectIdsA), numValues)
+                valuesB = valuesB.reshape(len(objectIdsB), numValues)
+                if valuesA.shape[1] == 1:
+                    columns.append(
+                        valuesA.astype(np.float64) * valuesB.astype(np.float64)
+                    )
+                else:
+                    columns.append(
+                        valuesA.astype("float32") * valuesB.astype("float32")
+                    )
+
+        features = np.hstack(columns).astype(np.float64)
+
+        # there should be no nans or infs
+        assert np.all(np.isfinite(features))
+
+        return features
+
     def getFeatureNames(self, featureDictObjectA, featureDictObjectB, selectedFeatures):
         assert "Global<Maximum >" not in selectedFeatures
         assert "Global<Minimum >" not in selectedFeatures
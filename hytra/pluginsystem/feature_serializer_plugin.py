@@ -15,6 +15,9 @@ class FeatureSerializerPlugin(IPlugin):
     features_per_frame = None
     """ dictionary of features per frame (only used by local serializer plugin) """
 
+    filename = None
+    """ filename of the HDF5 file holding the features (only used by the hdf5 serializer plugin) """
+
     def activate(self):
         """
         Activation of plugin could do something, but not needed here
@@ -38,7 +38,13 @@ class MergerResolverPlugin(IPlugin):
         return []
 
     def resolveMerger(
-        self, labelImage, objectId, nextId, mergerCount, initializations=None
+        self,
+        labelImage,
+        objectId,
+        nextId,
+        mergerCount,
+        initializations=None,
+        offset=None,
     ):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into `mergerCount`
@@ -46,7 +52,9 @@ class MergerResolverPlugin(IPlugin):
         in the preceding frame of all possible incomings (list may be empty, but could
         also be more than `mergerCount`).
 
-        `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation
+        `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation.
+        It can also be a crop around the object, in which case `offset` must contain
+        the position of the crop inside the full frame so that the fits are in frame coordinates.
 
         **returns** a list of fitted objects
         """
@@ -59,5 +67,8 @@ class MergerResolverPlugin(IPlugin):
         Resolve the object with the ID `objectId` in the `labelImage` into the fitted models with the given new IDs.
         `labelImage` should be updated by replacing all pixels that were labelled with `objectId`
         to get a new Id depending on the fit.
+
+        `labelImage` can also be a view of a crop around the object,
+        with `offset` being the position of the crop inside the full frame.
         """
         raise NotImplementedError()
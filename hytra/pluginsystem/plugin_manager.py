@@ -1,6 +1,7 @@
 from yapsy.PluginManager import PluginManager
 from yapsy.FilteredPluginManager import FilteredPluginManager
 import logging
+import numpy as np
 from hytra.pluginsystem.object_feature_computation_plugin import (
     ObjectFeatureComputationPlugin,
 )
@@ -143,6 +144,36 @@ class TrackingPluginManager(object):
 
         return featureVector
 
+    def applyTransitionFeatureMatrixConstructionPlugins(
+        self,
+        frameFeaturesA,
+        frameFeaturesB,
+        objectIdsA,
+        objectIdsB,
+        selectedFeatures,
+    ):
+        """
+        constructs the transition feature vectors of many transitions at once, given the feature
+        dictionaries of two whole frames and the index arrays `objectIdsA`, `objectIdsB` of the objects
+        participating in each transition.
+
+        **returns** a 2-D numpy array with one row per transition, whose rows are the same as
+        the results of `applyTransitionFeatureVectorConstructionPlugins` for each pair of objects.
+        """
+        featureMatrices = [np.zeros((len(objectIdsA), 0))]
+
+        def appendFeatures(plugin):
+            f = plugin.constructFeatureMatrix(
+                frameFeaturesA, frameFeaturesB, objectIdsA, objectIdsB, selectedFeatures
+            )
+            featureMatrices.append(f)
+
+        self._applyToAllPluginsOfCategory(
+            appendFeatures, "TransitionFeatureVectorConstruction"
+        )
+
+        return np.hstack(featureMatrices)
+
     def getTransitionFeatureNames(
         self, featureDictObjectA, featureDictObjectB, selectedFeatures
     ):
@@ -1,4 +1,5 @@
 from yapsy.IPlugin import IPlugin
+import numpy as np
 
 
 class TransitionFeatureVectorConstructionPlugin(IPlugin):
@@ -42,3 +43,42 @@ class TransitionFeatureVectorConstructionPlugin(IPlugin):
         """
         raise NotImplementedError()
         return []
+
+    def constructFeatureMatrix(
+        self,
+        frameFeaturesA,
+        frameFeaturesB,
+        objectIdsA,
+        objectIdsB,
+        selectedFeatures,
+    ):
+        """
+        Set up the feature vectors of many transitions at once. The features are given as
+        frame-level dictionaries (feature name -> array with one row per object), and the
+        transitions by the index arrays `objectIdsA` and `objectIdsB` into those arrays.
+
+        Return a 2-D numpy array with one row per transition, where each row equals
+        the result of `constructFeatureVector` for that pair of objects.
+
+        This default implementation calls `constructFeatureVector` for every transition,
+        plugins should override it with a vectorized version.
+        """
+
+        def getObjectFeatureDict(frameFeatures, objectId):
+            return dict(
+                (k, v[objectId] if isinstance(v, list) else v[objectId, ...])
+                for k, v in frameFeatures.items()
+            )
+
+        if len(objectIdsA) == 0:
+            return np.zeros((0, 0))
+
+        rows = [
+            self.constructFeatureVector(
+                getObjectFeatureDict(frameFeaturesA, a),
+                getObjectFeatureDict(frameFeaturesB, b),
+                selectedFeatures,
+            )
+            for a, b in zip(objectIdsA, objectIdsB)
+        ]
+        return np.array(rows, dtype=np.float64)
@@ -0,0 +1,111 @@
+"""
+This module keeps HDF5 files open for reading, so that reading many frames from the same file
+does not reopen it for every frame. Along with each open file, data that was derived from its contents
+(like an index of the blocks of a label image) can be cached.
+
+Files that changed on disk since they were opened are reopened, and all data cached for them is dropped.
+Handles are only used by the process that opened them, a forked process starts with an empty pool.
+Before a file is written to, it must be released from the pool using `release`.
+"""
+
+import os
+import threading
+import contextlib
+import collections
+import logging
+import h5py
+
+logger = logging.getLogger(__name__)
+
+
+class _OpenFile:
+    """ An open HDF5 file, the state of the file on disk when it was opened, and data derived from it """
+
+    def __init__(self, filename):
+        self.signature = _getSignature(filename)
+        self.h5file = h5py.File(filename, "r")
+        self.cache = {}
+
+
+def _getSignature(filename):
+    """ **returns** a tuple that changes whenever the file is modified """
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class H5FilePool:
+    """
+    A pool of at most `maxOpenFiles` HDF5 files that are open for reading,
+    the least recently used file is closed if more files are opened.
+    """
+
+    def __init__(self, maxOpenFiles=16):
+        self.maxOpenFiles = maxOpenFiles
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._openFiles = collections.OrderedDict()
+
+    def _checkProcess(self):
+        if self._pid != os.getpid():
+            # the handles were inherited from the parent process and must not be used here
+            self._pid = os.getpid()
+            self._openFiles = collections.OrderedDict()
+
+    def _getOpenFile(self, filename):
+        self._checkProcess()
+        key = os.path.abspath(filename)
+        openFile = self._openFiles.get(key)
+        if openFile is not None and openFile.signature != _getSignature(filename):
+            logger.debug("{} changed on disk, reopening it".format(filename))
+            self._close(key)
+            openFile = None
+
+        if openFile is None:
+            logger.debug("opening {}".format(filename))
+            openFile = _OpenFile(filename)
+            self._openFiles[key] = openFile
+            while len(self._openFiles) > self.maxOpenFiles:
+                self._close(next(iter(self._openFiles)))
+        self._openFiles.move_to_end(key)
+        return openFile
+
+    def _close(self, key):
+        self._openFiles.pop(key).h5file.close()
+
+    @contextlib.contextmanager
+    def openFile(self, filename):
+        """
+        Use as `with pool.openFile(filename) as h5file:` to read from the file without closing it afterwards.
+        The file is only accessed by one thread at a time.
+        """
+        with self._lock:
+            yield self._getOpenFile(filename).h5file
+
+    def getCached(self, filename, key, compute):
+        """
+        **returns** the data cached for `key` in `filename`, which is created by `compute(h5file)`
+        if it was not cached yet or the file has changed since
+        """
+        with self._lock:
+            openFile = self._getOpenFile(filename)
+            if key not in openFile.cache:
+                openFile.cache[key] = compute(openFile.h5file)
+            return openFile.cache[key]
+
+    def release(self, filename=None):
+        """
+        Close `filename`, or all files if no filename is given, e.g. before the file is written to
+        """
+        with self._lock:
+            self._checkProcess()
+            if filename is None:
+                keys = list(self._openFiles.keys())
+            else:
+                keys = [os.path.abspath(filename)]
+            for key in keys:
+                if key in self._openFiles:
+                    self._close(key)
+
+
+# the pool that is shared by all readers of a process
+defaultPool = H5FilePool()
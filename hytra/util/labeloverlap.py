@@ -0,0 +1,53 @@
+"""
+This module computes which labels of two label images of the same shape overlap, and by how many pixels,
+in a single pass over both images (a sparse contingency table).
+"""
+
+import numpy as np
+
+
+def computeLabelOverlaps(labelImageA, labelImageB, ignoreBackground=True):
+    """
+    Find all pairs of labels that share at least one pixel in `labelImageA` and `labelImageB`.
+
+    If `ignoreBackground` is `True`, pixels where either image is 0 are not counted.
+
+    **returns** a tuple `(labelsA, labelsB, numPixels)` of 1-D arrays of the same length,
+    sorted by `labelsA` first and `labelsB` second, where `numPixels[i]` is the number of pixels
+    that have label `labelsA[i]` in image A and label `labelsB[i]` in image B.
+    """
+    assert labelImageA.shape == labelImageB.shape
+
+    labelsA = np.asarray(labelImageA).ravel()
+    labelsB = np.asarray(labelImageB).ravel()
+    assert labelsA.size == 0 or (labelsA.min() >= 0 and labelsB.min() >= 0)
+
+    if ignoreBackground:
+        foreground = (labelsA != 0) & (labelsB != 0)
+        labelsA = labelsA[foreground]
+        labelsB = labelsB[foreground]
+
+    if labelsA.size == 0:
+        empty = np.zeros(0, dtype=np.uint64)
+        return empty, empty.copy(), np.zeros(0, dtype=np.int64)
+
+    # encode every pair of labels as one integer, so that a single np.unique finds all pairs
+    labelsA = labelsA.astype(np.uint64)
+    labelsB = labelsB.astype(np.uint64)
+    numLabelsB = labelsB.max() + np.uint64(1)
+    pairKeys, numPixels = np.unique(labelsA * numLabelsB + labelsB, return_counts=True)
+
+    return pairKeys // numLabelsB, pairKeys % numLabelsB, numPixels
+
+
+def computeLabelSizes(labelImage, ignoreBackground=True):
+    """
+    Count the number of pixels of every label in `labelImage`.
+
+    **returns** a dictionary with the label as key and its number of pixels as value
+    """
+    labels, numPixels = np.unique(np.asarray(labelImage), return_counts=True)
+    labelSizes = dict(zip(labels.tolist(), numPixels.tolist()))
+    if ignoreBackground:
+        labelSizes.pop(0, None)
+    return labelSizes
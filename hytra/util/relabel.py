@@ -0,0 +1,132 @@
+"""
+This module replaces the labels of a label image according to a mapping from old to new labels,
+e.g. from the segmentation's object IDs to track IDs when exporting a tracking result.
+
+Small label ranges are remapped by indexing a dense lookup table with the label image.
+If the largest label is too large for such a table, the labels are found
+in the sorted list of mapped labels with `np.searchsorted` instead.
+"""
+
+import numpy as np
+
+# the largest number of entries of a dense lookup table, larger label ranges use a sparse mapping
+maxLookupTableSize = 1 << 24
+
+
+def _mappingToArrays(mapping):
+    """
+    **returns** a tuple `(oldLabels, newLabels)` of 1-D arrays, sorted by `oldLabels`,
+    from a dictionary `{oldLabel: newLabel}` or a tuple of two sequences
+    """
+    if isinstance(mapping, dict):
+        oldLabels = np.array(list(mapping.keys()))
+        newLabels = np.array(list(mapping.values()))
+    else:
+        oldLabels, newLabels = mapping
+        oldLabels = np.asarray(oldLabels)
+        newLabels = np.asarray(newLabels)
+    assert oldLabels.shape == newLabels.shape and oldLabels.ndim == 1
+    if len(oldLabels) == 0:
+        # an empty mapping would otherwise be of type float
+        oldLabels = oldLabels.astype(np.int64)
+        newLabels = newLabels.astype(np.int64)
+
+    order = np.argsort(oldLabels, kind="stable")
+    return oldLabels[order], newLabels[order]
+
+
+class LabelMapping:
+    """
+    A mapping from old to new labels that can be applied to many label images,
+    e.g. to all chunks of a volume, while its lookup table is only created once.
+
+    The `mapping` is either a dictionary `{oldLabel: newLabel}` or a tuple `(oldLabels, newLabels)` of arrays.
+    All labels that are not in the mapping, including the background if it is not mapped explicitly,
+    get the value `default`.
+    """
+
+    def __init__(self, mapping, default=0, dtype=None):
+        self.oldLabels, self.newLabels = _mappingToArrays(mapping)
+        self.default = default
+        self.dtype = dtype
+        self._lookupTable = None
+
+    def _getLookupTable(self, numLabels, dtype):
+        """ **returns** a dense lookup table with at least `numLabels` entries, or `None` if that is too large """
+        if numLabels > maxLookupTableSize:
+            return None
+        if (
+            self._lookupTable is None
+            or len(self._lookupTable) < numLabels
+            or self._lookupTable.dtype != dtype
+        ):
+            if len(self.oldLabels) > 0:
+                # cover all mapped labels if possible, so that the table can be reused for further images
+                numLabels = max(
+                    numLabels, min(int(self.oldLabels[-1]) + 1, maxLookupTableSize)
+                )
+            self._lookupTable = np.full(numLabels, self.default, dtype=dtype)
+            # labels that can not occur in the image do not need an entry
+            isInTable = (self.oldLabels >= 0) & (self.oldLabels < numLabels)
+            self._lookupTable[self.oldLabels[isInTable]] = self.newLabels[isInTable]
+        return self._lookupTable
+
+    def _applySparse(self, labelImage, out):
+        if len(self.oldLabels) == 0:
+            out[...] = self.default
+            return
+        indices = np.searchsorted(self.oldLabels, labelImage)
+        np.minimum(indices, len(self.oldLabels) - 1, out=indices)
+        isMapped = self.oldLabels[indices] == labelImage
+        out[...] = np.where(isMapped, self.newLabels[indices], self.default)
+
+    def _applyToChunk(self, labelImage, out):
+        if labelImage.size == 0:
+            return
+        minLabel = labelImage.min()
+        lookupTable = None
+        if minLabel >= 0:
+            lookupTable = self._getLookupTable(int(labelImage.max()) + 1, out.dtype)
+        if lookupTable is not None:
+            out[...] = lookupTable[labelImage]
+        else:
+            self._applySparse(labelImage, out)
+
+    def apply(self, labelImage, out=None, chunkSize=None):
+        """
+        Relabel `labelImage`. The result is written to `out` if given, which may also be `labelImage` itself
+        to relabel it in place. Otherwise a new array of `dtype` (or the dtype of `labelImage`) is created.
+
+        If `chunkSize` is given, the image is processed in slices along its first axis of at most
+        (roughly) that many pixels, so that temporary arrays only need as much memory as one slice.
+
+        **returns** the relabeled image
+        """
+        labelImage = np.asarray(labelImage)
+        if out is None:
+            dtype = self.dtype if self.dtype is not None else labelImage.dtype
+            out = np.empty(labelImage.shape, dtype=dtype)
+        assert out.shape == labelImage.shape
+
+        if chunkSize is None or labelImage.ndim == 0:
+            self._applyToChunk(labelImage, out)
+        else:
+            pixelsPerSlice = max(1, int(np.prod(labelImage.shape[1:])))
+            slicesPerChunk = max(1, chunkSize // pixelsPerSlice)
+            for start in range(0, labelImage.shape[0], slicesPerChunk):
+                chunk = slice(start, start + slicesPerChunk)
+                self._applyToChunk(labelImage[chunk], out[chunk])
+        return out
+
+
+def relabel(labelImage, mapping, default=0, out=None, chunkSize=None):
+    """
+    Replace the labels in `labelImage` according to `mapping`, which is a dictionary `{oldLabel: newLabel}`
+    or a tuple `(oldLabels, newLabels)` of arrays. All labels that are not mapped get the value `default`.
+
+    Pass `out=labelImage` to relabel in place. See `LabelMapping.apply` for the other arguments,
+    and use a `LabelMapping` directly if the same mapping is applied to several images.
+
+    **returns** the relabeled image
+    """
+    return LabelMapping(mapping, default).apply(labelImage, out, chunkSize)
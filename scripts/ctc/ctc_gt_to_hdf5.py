@@ -14,6 +14,7 @@ from skimage.external import tifffile
 import glob
 import hytra.util.axesconversion
 from hytra.util.skimage_tifffile_hack import hack
+from hytra.util.relabel import relabel
 
 def find_splits(filename, start_frame):
     # store split events indexed by timestep, then parent
@@ -45,11 +46,7 @@ def remap_label_image(label_image, mapping):
     given a label image and a mapping, creates and 
     returns a new label image with remapped object pixel values 
     """
-    remapped_label_image = np.zeros_like(label_image)
-    for src, dest in mapping.items():
-        remapped_label_image[label_image == src] = dest
-
-    return remapped_label_image
+    return relabel(label_image, mapping)
 
 def remap_events(events, mappingA, mappingB=None):
     """
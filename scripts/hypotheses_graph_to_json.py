@@ -13,6 +13,7 @@ import hytra.core.hypothesesgraph as hypothesesgraph
 import hytra.core.ilastikhypothesesgraph as ilastikhypothesesgraph
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
 import hytra.core.jsongraph
+from hytra.core.binarygraph import isBinaryFilename
 
 def getConfigAndCommandLineArguments():
     parser = configargparse.ArgumentParser(description=""" 
@@ -54,7 +55,8 @@ def getConfigAndCommandLineArguments():
                         help='internal hdf5 path to label image')
     parser.add_argument('--image-provider', type=str, dest='image_provider_name', default="LocalImageLoader")
     parser.add_argument('--graph-json-file', type=str, required=True, dest='json_filename', default=None,
-                      help='filename where to save the generated JSON file to')
+                      help='filename where to save the generated JSON file to. '
+                      'Use a .h5, .hdf5 or .npz extension to store it in the compact binary format instead')
     parser.add_argument('--max-number-objects', dest='max_num_objects', type=float, default=2,
                         help='Give maximum number of objects one connected component may consist of')
     parser.add_argument('--max-neighbor-distance', dest='mnd', type=float, default=200)
@@ -97,9 +99,26 @@ def getConfigAndCommandLineArguments():
     parser.add_argument('--transition-classifier-file', dest='transition_classifier_filename', type=str,
                         default=None)
     parser.add_argument('--transition-classifier-path', dest='transition_classifier_path', type=str, default='/')
+    parser.add_argument('--batch-transition-prediction', dest='batch_transition_prediction', action='store_true',
+                        help='Predict the transition classifier probabilities of all links at once', default=False)
+    parser.add_argument('--vectorized-energies', dest='vectorized_energies', action='store_true',
+                        help='Compute distance based transition energies and border costs of all nodes and arcs at once',
+                        default=False)
     parser.add_argument('--disable-multiprocessing', dest='disableMultiprocessing', action='store_true',
                         help='Do not use multiprocessing to speed up computation',
                         default=False)
+    parser.add_argument('--max-frames-in-flight', dest='maxNumFramesInFlight', type=int, default=None,
+                        help='Stream feature extraction with at most this many frames in memory at once')
+    parser.add_argument('--feature-store-file', dest='featureStoreFilename', type=str, default=None,
+                        help='HDF5 file where features are stored when streaming feature extraction')
+    parser.add_argument('--graph-workers', dest='numGraphWorkers', type=int, default=None,
+                        help='Search the links between all pairs of frames with this many processes '
+                             '(or threads if multiprocessing is disabled)')
+    parser.add_argument('--array-graph', dest='useArrayGraph', action='store_true',
+                        help='Store the hypotheses graph in arrays instead of a networkx graph to save memory')
+    parser.add_argument('--stream-json', dest='streamJson', action='store_true',
+                        help='Write the JSON model node by node instead of building it in memory first '
+                             '(not available with the legacy pgmlink graph or binary output files)')
     parser.add_argument('--turn-off-features', dest='turnOffFeatures', type=str, nargs='+', default=[])
     parser.add_argument('--skip-links', dest='skipLinks', type=int, default=1)
     parser.add_argument('--skip-links-bias', dest='skipLinksBias', type=int, default=20)
@@ -111,6 +130,11 @@ def getConfigAndCommandLineArguments():
 
     options, unknown = parser.parse_known_args()
 
+    if options.maxNumFramesInFlight is not None and options.featureStoreFilename is None \
+            and options.transition_classifier_filename is not None:
+        parser.error('--transition-classifier-file needs the features of all frames, '
+                     'please also specify --feature-store-file when using --max-frames-in-flight')
+
     return options, unknown
 
 
@@ -497,7 +521,9 @@ def loadProbabilityGenerator(options,
     probGenerator = traxelstore.IlpProbabilityGenerator(ilpOptions, 
                                             turnOffFeatures=options.turnOffFeatures, 
                                             pluginPaths=options.pluginPaths,
-                                            useMultiprocessing=not options.disableMultiprocessing)
+                                            useMultiprocessing=not options.disableMultiprocessing,
+                                            maxNumFramesInFlight=options.maxNumFramesInFlight,
+                                            featureStoreFilename=options.featureStoreFilename)
     if time_range is not None:
         probGenerator.timeRange = time_range
 
@@ -570,7 +596,11 @@ def getHypothesesGraphAndIterators(options, shape, t0, t1, ts, probGenerator, tr
         fov = getPythonFovFromOptions(options, shape, t0, t1)
         maxNumObjects = int(options.max_num_objects)
         margin = float(options.border_width)
-        hypotheses_graph = ilastikhypothesesgraph.IlastikHypothesesGraph(
+        if options.useArrayGraph:
+            hypothesesGraphClass = ilastikhypothesesgraph.IlastikArrayHypothesesGraph
+        else:
+            hypothesesGraphClass = ilastikhypothesesgraph.IlastikHypothesesGraph
+        hypotheses_graph = hypothesesGraphClass(
             probGenerator,
             [t0, t1],
             maxNumObjects=maxNumObjects,
@@ -583,7 +613,9 @@ def getHypothesesGraphAndIterators(options, shape, t0, t1, ts, probGenerator, tr
             transitionParameter=options.trans_par,
             transitionClassifier=transitionClassifier,
             skipLinks=skipLinks,
-            skipLinksBias=skipLinksBias)
+            skipLinksBias=skipLinksBias,
+            numWorkers=options.numGraphWorkers,
+            useMultiprocessing=not options.disableMultiprocessing)
 
         if not options.without_tracklets:
             hypotheses_graph = hypotheses_graph.generateTrackletGraph()
@@ -767,10 +799,15 @@ if __name__ == "__main__":
             boundaryCostMultiplierFunc,
             divisionProbabilityFunc)
     else:
-        hypotheses_graph.insertEnergies()
+        hypotheses_graph.insertEnergies(batchTransitionPrediction=options.batch_transition_prediction,
+                                        vectorized=options.vectorized_energies)
+        if options.streamJson and not isBinaryFilename(options.json_filename):
+            # write nodes and links to JSON one by one, without creating the model dictionary
+            hypotheses_graph.writeTrackingGraph(options.json_filename, settings={'optimizerEpGap': options.ep_gap})
+            sys.exit(0)
         trackingGraph = hypotheses_graph.toTrackingGraph()
 
     trackingGraph.model['settings']['optimizerEpGap'] = options.ep_gap
 
     # write everything to JSON
-    hytra.core.jsongraph.writeToFormattedJSON(options.json_filename, trackingGraph.model)
+    hytra.core.jsongraph.writeToFile(options.json_filename, trackingGraph.model)
@@ -4,16 +4,13 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('..'))
 # standard imports
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import logging
 import configargparse as argparse
 import numpy as np
 import h5py
 from multiprocessing import Pool
 import hytra.core.jsongraph
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
 
 def writeEvents(timestep, activeLinks, activeDivisions, mergers, detections, fn, labelImagePath, ilpFilename, verbose, pluginPaths):
@@ -103,13 +100,11 @@ if __name__ == "__main__":
     
     args, unknown = parser.parse_known_args()
 
-    with open(args.model_filename, 'r') as f:
-        model = json.load(f)
+    model = hytra.core.jsongraph.readFromFile(args.model_filename)
 
-    with open(args.result_filename, 'r') as f:
-        result = json.load(f)
-        assert(result['detectionResults'] is not None)
-        assert(result['linkingResults'] is not None)
+    result = hytra.core.jsongraph.readFromFile(args.result_filename)
+    assert(result['detectionResults'] is not None)
+    assert(result['linkingResults'] is not None)
 
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG)
@@ -117,12 +112,11 @@ if __name__ == "__main__":
         logging.basicConfig(level=logging.INFO)
     logging.getLogger('json_result_to_events.py').debug("Ignoring unknown parameters: {}".format(unknown))
 
-    traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(model)
-    # timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
-    # there might be empty frames. We want them as output too. A little messy, but:
-    timesteps = [str(t) for t in range(int(min(traxelIdPerTimestepToUniqueIdMap.keys())), max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()])+1 )]
+    uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(model['traxelToUniqueId'])
+    # there might be empty frames. We want them as output too.
+    timesteps = [str(t) for t in range(*uuidTraxelMapping.getTimeRange())]
 
-    mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(result, uuidToTraxelMap)
+    mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(result, uuidTraxelMapping.getUuidToTraxelMap())
 
     # group by timestep for event creation
     mergersPerTimestep = hytra.core.jsongraph.getMergersPerTimestep(mergers, timesteps)
@@ -9,27 +9,10 @@ import logging
 import h5py
 import vigra
 from vigra import numpy as np
-try:
-    import commentjson as json
-except ImportError:
-    import json
 from hytra.util.progressbar import ProgressBar
-
-def get_uuid_to_traxel_map(traxelIdPerTimestepToUniqueIdMap):
-    timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
-    uuidToTraxelMap = {}
-    for t in timesteps:
-        for i in traxelIdPerTimestepToUniqueIdMap[t].keys():
-            uuid = traxelIdPerTimestepToUniqueIdMap[t][i]
-            if uuid not in uuidToTraxelMap:
-                uuidToTraxelMap[uuid] = []
-            uuidToTraxelMap[uuid].append((int(t), int(i)))
-
-    # sort the list of traxels per UUID by their timesteps
-    for v in uuidToTraxelMap.values():
-        v.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
-
-    return uuidToTraxelMap
+from hytra.core.jsongraph import readFromFile
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
+from hytra.util.relabel import relabel
 
 def getLabelImageForFrame(labelImageFilename, labelImagePath, timeframe, shape):
     """
@@ -50,22 +33,13 @@ def getShape(labelImageFilename, labelImagePath):
 def relabelImage(volume, replace):
     """
     Apply a set of label replacements to the given volume.
+    All labels that are not replaced are set to 0.
 
     Parameters:
         volume - numpy array
         replace - dictionary{[(oldValueInVolume)->(newValue), ...]}
     """
-    mp = np.arange(0, np.amax(volume) + 1, dtype=volume.dtype)
-    mp[1:] = 1
-    labels = np.unique(volume)
-    for label in labels:
-        if label > 0:
-            try:
-                r = replace[label]
-                mp[label] = r
-            except:                
-                pass
-    return mp[volume]
+    return relabel(volume, replace)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Perform the segmentation as in ilastik for a new predicition map,'
@@ -90,15 +64,12 @@ if __name__ == "__main__":
     shape = getShape(args.labelImageFilename, args.labelImagePath)
 
     # load json model and results
-    with open(args.modelFilename, 'r') as f:
-        model = json.load(f)
-
-    with open(args.resultFilename, 'r') as f:
-        result = json.load(f)
+    model = readFromFile(args.modelFilename)
+    result = readFromFile(args.resultFilename)
 
     # load forward mapping and create reverse mapping from json uuid to (timestep,ID)
-    traxelIdPerTimestepToUniqueIdMap = model['traxelToUniqueId']
-    uuidToTraxelMap = get_uuid_to_traxel_map(traxelIdPerTimestepToUniqueIdMap)
+    uuidTraxelMapping = UuidTraxelMapping.fromTraxelToUniqueId(model['traxelToUniqueId'])
+    uuidToTraxelMap = uuidTraxelMapping.getUuidToTraxelMap()
 
     # load links and map indices
     links = [(uuidToTraxelMap[int(entry['src'])][-1], uuidToTraxelMap[int(entry['dest'])][0]) for entry in result['linkingResults'] if entry['value'] > 0]
@@ -112,9 +83,8 @@ if __name__ == "__main__":
             prev = timestepIdTuple
 
     # group by timestep
-    # timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
     # there might be empty frames. We want them as output too.
-    timesteps = [str(t).decode("utf-8") for t in range(int(min(traxelIdPerTimestepToUniqueIdMap.keys())) , int(max(traxelIdPerTimestepToUniqueIdMap.keys()))+1 )]
+    timesteps = [str(t) for t in range(*uuidTraxelMapping.getTimeRange())]
     linksPerTimestep = dict([(t, [(a[1], b[1]) for a, b in links if b[0] == int(t)]) for t in timesteps])
     assert(len(linksPerTimestep['0']) == 0)
 
@@ -141,12 +111,7 @@ if __name__ == "__main__":
                 lastFrameColorMap[a] = thisFrameColorMap[b]  # also store in last frame's color map as it must have been present to participate in a link
                 nextUnusedColor += 1
 
-        # see which objects have been assigned a color in the last frame. set all others to 0 (1?)
-        unusedLabels = set(np.unique(lastFrameLabelImage)) - set([0]) - set(lastFrameColorMap.keys())
-        for l in unusedLabels:
-            lastFrameColorMap[l] = 0
-
-        # write relabeled image
+        # write relabeled image, objects that have not been assigned a color in the last frame are set to 0
         resultVolume[t-1,...,0] = relabelImage(lastFrameLabelImage, lastFrameColorMap)
 
         # swap the color maps so that in the next frame we use "this" as "last"
@@ -154,11 +119,6 @@ if __name__ == "__main__":
         lastFrameLabelImage = thisFrameLabelImage
 
     # handle last frame:
-    # see which objects have been assigned a color in the last frame. set all others to 0 (1?)
-    unusedLabels = set(np.unique(lastFrameLabelImage)) - set([0]) - set(lastFrameColorMap.keys())
-    for l in unusedLabels:
-        lastFrameColorMap[l] = 0
-
     # write last frame relabeled image
     resultVolume[t,...,0] = relabelImage(lastFrameLabelImage, lastFrameColorMap)
     progressBar.show()
@@ -6,7 +6,7 @@ sys.path.insert(0, os.path.abspath('..'))
 # standard imports
 import logging
 import configargparse as argparse
-from hytra.core.jsongraph import JsonTrackingGraph, writeToFormattedJSON
+from hytra.core.jsongraph import JsonTrackingGraph, writeToFile
 from hytra.core.jsonmergerresolver import JsonMergerResolver
 
 if __name__ == "__main__":
@@ -44,6 +44,14 @@ if __name__ == "__main__":
                         help='alpha for the transition prior')
     parser.add_argument('--verbose', dest='verbose', action='store_true',
                         help='Turn on verbose logging', default=False)
+    parser.add_argument('--use-multiprocessing', dest='useMultiprocessing', action='store_true',
+                        help='Fit the mergers of each frame in parallel on all cores', default=False)
+    parser.add_argument('--features-in-bounding-box', dest='featuresInBoundingBox', action='store_true',
+                        help='Compute the object features of each frame only inside the bounding box of the resolved objects',
+                        default=False)
+    parser.add_argument('--stream-frames', dest='streamFrames', action='store_true',
+                        help='Resolve mergers frame by frame, and write each refined frame right away, '
+                        'such that only one frame needs to be held in memory', default=False)
     parser.add_argument('--plugin-paths', dest='pluginPaths', type=str, nargs='+',
                         default=[os.path.abspath('../hytra/plugins')],
                         help='A list of paths to search for plugins for the tracking pipeline.')
@@ -64,11 +72,14 @@ if __name__ == "__main__":
         args.raw_path,
         args.raw_axes,
         args.pluginPaths,
-        args.verbose)
+        args.verbose,
+        args.useMultiprocessing,
+        args.featuresInBoundingBox,
+        args.streamFrames)
     merger_resolver.run(
         args.transition_classifier_filename,
         args.transition_classifier_path)
 
     # save
-    writeToFormattedJSON(args.out_model_filename, merger_resolver.model)
-    writeToFormattedJSON(args.out_result, merger_resolver.result)
+    writeToFile(args.out_model_filename, merger_resolver.model)
+    writeToFile(args.out_result, merger_resolver.result)
@@ -23,6 +23,7 @@ from hytra.core.ilastikhypothesesgraph import IlastikHypothesesGraph
 from hytra.core.fieldofview import FieldOfView
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
 from hytra.core.jsongraph import writeToFormattedJSON
+from hytra.util.relabel import relabel
 import hytra.jst.conflictingsegmentsprobabilitygenerator as probabilitygenerator
 import hytra.jst.classifiertrainingexampleextractor
 from hytra.core.ilastik_project_options import IlastikProjectOptions
@@ -45,9 +46,13 @@ def remap_label_image(label_images, mapping):
     returns a new label image with remapped object pixel values 
     """
     remapped_label_image = np.zeros(list(label_images.values())[0].shape, dtype=list(label_images.values())[0].dtype)
-    for origObject, trackId in mapping.items():
-        objectId, filename = origObject
-        remapped_label_image[label_images[filename] == objectId] = trackId
+    mappingPerFile = {}
+    for (objectId, filename), trackId in mapping.items():
+        mappingPerFile.setdefault(filename, {})[objectId] = trackId
+
+    for filename, fileMapping in mappingPerFile.items():
+        remapped = relabel(label_images[filename], fileMapping)
+        np.copyto(remapped_label_image, remapped, where=remapped != 0)
 
     return remapped_label_image
 
@@ -4,7 +4,6 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('..'))
 # standard imports
-from compiler.ast import flatten
 import logging
 import glob
 import vigra
@@ -157,10 +156,39 @@ class TransitionClassifier:
             self.mydata[self._nextIdx, :] = features
             self._nextIdx += 1
 
+    def addSamples(self, features, labels):
+        """
+        Add a matrix of samples (one row per sample, see `constructSampleFeatureMatrix`) and their labels at once
+        """
+        self.labels.extend(labels)
+
+        if self._numSamples is None:
+            # use vstack
+            if self.mydata is None:
+                self.mydata = features
+            else:
+                self.mydata = np.vstack((self.mydata, features))
+        else:
+            # allocate full array once, then fill in block by block
+            if self.mydata is None:
+                self.mydata = np.zeros((self._numSamples, features.shape[1]))
+
+            assert(self._nextIdx + features.shape[0] <= self._numSamples)
+            self.mydata[self._nextIdx:self._nextIdx + features.shape[0], :] = features
+            self._nextIdx += features.shape[0]
+
     def constructSampleFeatureVector(self, f1, f2, pluginManager):
         featVec = pluginManager.applyTransitionFeatureVectorConstructionPlugins(f1, f2, self.selectedFeatures)
         return np.array(featVec)
 
+    def constructSampleFeatureMatrix(self, frameFeatures1, frameFeatures2, objectIds1, objectIds2, pluginManager):
+        """
+        Construct the feature vectors of all transitions from `objectIds1[i]` to `objectIds2[i]` at once,
+        given the feature dictionaries of both frames
+        """
+        return pluginManager.applyTransitionFeatureMatrixConstructionPlugins(
+            frameFeatures1, frameFeatures2, objectIds1, objectIds2, self.selectedFeatures)
+
     # adding a comfortable function, where one can easily introduce the data
     def add_allData(self, mydata, labels):
         self.mydata = mydata
@@ -321,21 +349,24 @@ if __name__ == '__main__':
 
 
         for k in range(0, len(features) - 1):
-            for i in pos_labels[k]:
-                # positive
-                logger.debug("Adding positive sample {} from pos {} to {}".format(
-                    i, features[k]['RegionCenter'][i[0]], features[k + 1]['RegionCenter'][i[1]]))
-                TC.addSample(compute_ObjFeatures(
-                    features[k], i[0]), compute_ObjFeatures(features[k + 1], i[1]), 1, trackingPluginManager)
-                TC.addSample(compute_ObjFeatures(
-                    features[k + 1], i[1]), compute_ObjFeatures(features[k], i[0]), 1, trackingPluginManager)
-            
-            for i in neg_labels[k]:
-                # negative
-                logger.debug("Adding negative sample {} from pos {} to {}".format(i,
-                              features[k]['RegionCenter'][i[0]], features[k + 1]['RegionCenter'][i[1]]))
-                TC.addSample(compute_ObjFeatures(
-                    features[k], i[0]), compute_ObjFeatures(features[k + 1], i[1]), 0, trackingPluginManager)
+            # positive, each annotated move is used in forward and backward direction
+            positives = np.asarray(pos_labels[k], dtype=int).reshape(-1, 2)
+            logger.debug("Adding {} positive samples from frame {} to {}".format(len(positives), k, k + 1))
+            forward = TC.constructSampleFeatureMatrix(
+                features[k], features[k + 1], positives[:, 0], positives[:, 1], trackingPluginManager)
+            backward = TC.constructSampleFeatureMatrix(
+                features[k + 1], features[k], positives[:, 1], positives[:, 0], trackingPluginManager)
+            positiveSamples = np.zeros((2 * len(positives), forward.shape[1]))
+            positiveSamples[0::2, :] = forward
+            positiveSamples[1::2, :] = backward
+            TC.addSamples(positiveSamples, [1] * positiveSamples.shape[0])
+
+            # negative
+            negatives = np.asarray(neg_labels[k], dtype=int).reshape(-1, 2)
+            logger.debug("Adding {} negative samples from frame {} to {}".format(len(negatives), k, k + 1))
+            TC.addSamples(TC.constructSampleFeatureMatrix(
+                features[k], features[k + 1], negatives[:, 0], negatives[:, 1], trackingPluginManager),
+                [0] * len(negatives))
         mlabels =TC.labels
 
     logger.info('Done adding samples to RF. Beginning training...')
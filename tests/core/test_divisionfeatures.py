@@ -0,0 +1,47 @@
+import numpy as np
+from hytra.core.divisionfeatures import FeatureManager
+
+
+def test_computeFeatures_at():
+    labelImageNext = np.zeros((60, 60), dtype=np.uint32)
+    labelImageNext[20:23, 10:13] = 1
+    labelImageNext[20:23, 30:33] = 2
+    labelImageNext[21, 20] = 3  # too small to be a child
+    labelImageNext[54:57, 54:57] = 4
+    featsNext = {
+        "RegionCenter": np.array(
+            [[0, 0], [21, 11], [21, 31], [21, 20], [55, 55]], dtype=np.float32
+        ),
+        "Count": np.array([0, 9, 9, 1, 9], dtype=np.float32),
+    }
+    featsCur = {
+        "RegionCenter": np.array([[0, 0], [21, 21], [55, 52]], dtype=np.float32),
+        "Count": np.array([0, 18, 9], dtype=np.float32),
+    }
+
+    featureNames = [
+        "ParentChildrenRatio_Count",
+        "ChildrenRatio_Count",
+        "ParentChildrenAngle_RegionCenter",
+    ]
+    result = FeatureManager().computeFeatures_at(
+        featsCur, featsNext, labelImageNext, featureNames
+    )
+    assert set(result.keys()) == set(
+        featureNames + ["SquaredDistances_{}".format(i) for i in range(3)]
+    )
+    for values in result.values():
+        assert values.shape == (3, 1)
+
+    # the first object divides into objects 1 and 2, the second one only has object 4 nearby
+    assert np.allclose(result["SquaredDistances_0"][1:, 0], [10, 3])
+    assert np.allclose(result["SquaredDistances_1"][1:, 0], [10, 9999])
+    assert np.allclose(result["SquaredDistances_2"][1:, 0], [9999, 9999])
+    assert np.allclose(result["ParentChildrenRatio_Count"][1:, 0], [1, 0])
+    assert np.allclose(result["ChildrenRatio_Count"][1:, 0], [1, 0])
+    assert np.allclose(result["ParentChildrenAngle_RegionCenter"][1:, 0], [180, 0])
+
+    # without a next frame, all features have their default value
+    result = FeatureManager().computeFeatures_at(featsCur, None, None, featureNames)
+    assert np.allclose(result["SquaredDistances_0"], 9999)
+    assert np.allclose(result["ParentChildrenRatio_Count"], 0)
@@ -0,0 +1,48 @@
+import pickle
+import numpy as np
+from hytra.core.fieldofview import FieldOfView
+
+
+def test_distanceToBorder():
+    fov2D = FieldOfView(0, 0, 0, 0, 3, 100, 50, 0)
+    assert fov2D.spatial_distance_to_border(0, 10.0, 20.0, 0.0) == 10.0
+    assert fov2D.spatial_distance_to_border(0, 90.0, 45.0, 0.0) == 5.0
+    assert fov2D.spatial_distance_to_border(0, 90.0, 45.0, 0.0, True) == 0.1
+
+    fov3D = FieldOfView(0, 0, 0, 0, 3, 100, 50, 20)
+    assert fov3D.spatial_distance_to_border(0, 10.0, 20.0, 2.0) == 2.0
+    assert fov3D.spatial_distance_to_border(0, 10.0, 20.0, 18.0, True) == 0.1
+
+
+def test_batchDistancesToBorder():
+    randomState = np.random.RandomState(42)
+    coordinates = randomState.rand(100, 3) * [100, 50, 20]
+    for fov in [
+        FieldOfView(0, 0, 0, 0, 3, 100, 50, 0),
+        FieldOfView(0, 0, 0, 0, 3, 100, 50, 20),
+    ]:
+        for relative in [False, True]:
+            distances = fov.spatial_distances_to_border(coordinates, relative)
+            assert np.array_equal(
+                distances,
+                [
+                    fov.spatial_distance_to_border(0, x, y, z, relative)
+                    for x, y, z in coordinates
+                ],
+            )
+
+    fov = FieldOfView(0, 0, 0, 0, 3, 100, 50, 0)
+    assert np.array_equal(
+        fov.spatial_distances_to_border(coordinates[:, :2]),
+        fov.spatial_distances_to_border(coordinates * [1, 1, 0]),
+    )
+    unpickledFov = pickle.loads(pickle.dumps(fov))
+    assert np.array_equal(
+        unpickledFov.spatial_distances_to_border(coordinates),
+        fov.spatial_distances_to_border(coordinates),
+    )
+
+
+if __name__ == "__main__":
+    test_distanceToBorder()
+    test_batchDistancesToBorder()
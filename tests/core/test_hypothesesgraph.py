@@ -19,6 +19,40 @@ def test_trackletgraph():
     assert "tracklet" in t._graph.nodes[(0, 1)]
 
 
+def test_trackletgraphWithBranches():
+    h = hg.HypothesesGraph()
+    # edges are added from the last frame backwards, so that later links are contracted first
+    h._graph.add_edges_from(
+        [((3, 1), (4, 1)), ((2, 1), (3, 1)), ((2, 1), (3, 2))], src=0, dest=0
+    )
+    h._graph.add_edges_from([((1, 1), (2, 1)), ((0, 1), (1, 1))], src=0, dest=0)
+    h._graph.add_edges_from([((5, 1), (6, 1))], src=0, dest=0)
+    for n in h._graph.nodes:
+        t = Traxel()
+        t.Timestep = n[0]
+        t.Id = n[1]
+        h._graph.nodes[n]["traxel"] = t
+
+    t = h.generateTrackletGraph()
+    tracklets = dict(
+        (n, [(traxel.Timestep, traxel.Id) for traxel in t._graph.nodes[n]["tracklet"]])
+        for n in t.nodeIterator()
+    )
+    assert tracklets == {
+        (0, 1): [(0, 1), (1, 1), (2, 1)],
+        (3, 1): [(3, 1), (4, 1)],
+        (3, 2): [(3, 2)],
+        # single links without other connections are not contracted into a length-one track
+        (5, 1): [(5, 1)],
+        (6, 1): [(6, 1)],
+    }
+    assert set(t.arcIterator()) == set(
+        [((0, 1), (3, 1)), ((0, 1), (3, 2)), ((5, 1), (6, 1))]
+    )
+    assert t._graph.edges[(5, 1), (6, 1)] == {"src": 0, "dest": 0}
+    assert h.countNodes() == 8 and "traxel" in h._graph.nodes[(4, 1)]
+
+
 def test_computeLineagesAndPrune():
     h = hg.HypothesesGraph()
     h._graph.add_path([(0, 0), (1, 1), (2, 2)])
@@ -228,9 +262,72 @@ def test_insertEnergies():
         ]
 
 
+def test_buildFromProbabilityGenerator():
+    class SimpleProbabilityGenerator(pg.ProbabilityGenerator):
+        def __init__(self, centersPerFrame):
+            super(SimpleProbabilityGenerator, self).__init__()
+            for frame, centers in centersPerFrame.items():
+                for objectId, center in centers.items():
+                    t = Traxel()
+                    t.Id = objectId
+                    t.Timestep = frame
+                    t.Features["com"] = np.array(center, dtype=np.float64)
+                    t.Features["divProb"] = np.array([0.9 if objectId == 1 else 0.0])
+                    self.TraxelsPerFrame.setdefault(frame, {})[objectId] = t
+
+    # frame 2 is empty, so links from frame 1 need to skip it
+    probabilityGenerator = SimpleProbabilityGenerator(
+        {
+            0: {1: [0, 0], 2: [10, 10]},
+            1: {1: [1, 1], 2: [10, 11], 3: [30, 30]},
+            3: {1: [2, 2], 2: [50, 50], 3: [100, 100]},
+        }
+    )
+    h = hg.HypothesesGraph()
+    h.buildFromProbabilityGenerator(
+        probabilityGenerator,
+        maxNeighborDist=15,
+        numNearestNeighbors=1,
+        forwardBackwardCheck=True,
+        withDivisions=True,
+        divisionThreshold=0.5,
+        skipLinks=2,
+    )
+
+    assert h.countNodes() == 8
+    assert set(h.arcIterator()) == set(
+        [
+            ((0, 1), (1, 1)),
+            ((0, 1), (1, 2)),  # object 1 might divide, so it gets two neighbors
+            ((0, 2), (1, 2)),
+            ((1, 1), (3, 1)),
+            ((1, 2), (3, 1)),
+        ]
+    )
+    for a in h.arcIterator():
+        assert h._graph.edges[a]["src"] == h._graph.nodes[h.source(a)]["id"]
+        assert h._graph.edges[a]["dest"] == h._graph.nodes[h.target(a)]["id"]
+
+    # searching links with several workers yields the same graph
+    parallelH = hg.HypothesesGraph()
+    parallelH.buildFromProbabilityGenerator(
+        probabilityGenerator,
+        maxNeighborDist=15,
+        numNearestNeighbors=1,
+        forwardBackwardCheck=True,
+        withDivisions=True,
+        divisionThreshold=0.5,
+        skipLinks=2,
+        numWorkers=2,
+    )
+    assert list(parallelH._graph.nodes(data=True)) == list(h._graph.nodes(data=True))
+    assert list(parallelH._graph.edges(data=True)) == list(h._graph.edges(data=True))
+
+
 if __name__ == "__main__":
     test_trackletgraph()
     test_insertAndExtractSolution()
     test_computeLineagesAndPrune()
     test_computeLineagesWithMergers()
     test_insertEnergies()
+    test_buildFromProbabilityGenerator()
@@ -0,0 +1,281 @@
+import os
+import pickle
+import tempfile
+import numpy as np
+from hytra.core.ilastikhypothesesgraph import (
+    IlastikHypothesesGraph,
+    IlastikArrayHypothesesGraph,
+)
+from hytra.core.fieldofview import FieldOfView
+from hytra.core.jsongraph import readFromJSON
+from hytra.core.jsonstream import iterateJSONModel
+
+
+class SimpleTraxel(object):
+    def __init__(self, timestep, objectId, com):
+        self.Timestep = timestep
+        self.Id = objectId
+        self.Features = {
+            "com": np.array(com, dtype=np.float64),
+            "detProb": np.array([0.1, 0.7, 0.2]),
+            "divProb": np.array([0.9, 0.1]),
+        }
+        self.conflictingTraxelIds = None
+
+    def X(self):
+        return self.Features["com"][0]
+
+    def Y(self):
+        return self.Features["com"][1]
+
+    def Z(self):
+        return 0.0
+
+    def get_feature_value(self, name, index):
+        return self.Features[name][index]
+
+
+class SimpleProbabilityGenerator(object):
+    """ provides the parts of the IlpProbabilityGenerator API used by the IlastikHypothesesGraph """
+
+    def __init__(self, centersPerFrame):
+        self.TraxelsPerFrame = {}
+        self._featuresPerFrame = {}
+        for frame, centers in enumerate(centersPerFrame):
+            centers = np.vstack([[0.0, 0.0]] + centers)
+            self._featuresPerFrame[frame] = {
+                "RegionCenter": centers,
+                "Coord<Minimum >": centers - 1.0,
+                "Coord<Maximum >": centers + 1.0,
+            }
+            for objectId in range(1, centers.shape[0]):
+                self.TraxelsPerFrame.setdefault(frame, {})[objectId] = SimpleTraxel(
+                    frame, objectId, centers[objectId]
+                )
+
+    def getTraxelFeatureDict(self, frame, objectId):
+        return dict(
+            (k, v[objectId, ...]) for k, v in self._featuresPerFrame[frame].items()
+        )
+
+    def getTransitionFeatureVector(
+        self, featureDictObjectA, featureDictObjectB, selectedFeatures
+    ):
+        features = np.concatenate(
+            [featureDictObjectA[k] - featureDictObjectB[k] for k in selectedFeatures]
+        )
+        return np.expand_dims(features, axis=0)
+
+    def getTransitionFeatureMatrix(
+        self, frameA, objectIdsA, frameB, objectIdsB, selectedFeatures
+    ):
+        return np.hstack(
+            [
+                self._featuresPerFrame[frameA][k][objectIdsA]
+                - self._featuresPerFrame[frameB][k][objectIdsB]
+                for k in selectedFeatures
+            ]
+        )
+
+
+class SimpleTransitionClassifier(object):
+    selectedFeatures = ["RegionCenter"]
+
+    def __init__(self):
+        self.numPredictCalls = 0
+
+    def predictProbabilities(self, features):
+        self.numPredictCalls += 1
+        prob = np.exp(-np.linalg.norm(features, axis=1) / 10.0)
+        return np.vstack([1.0 - prob, prob]).transpose()
+
+
+def buildGraph(transitionClassifier, hypothesesGraphClass=IlastikHypothesesGraph):
+    centersPerFrame = [
+        [[10.0, 10.0], [40.0, 40.0]],
+        [[12.0, 11.0], [41.0, 43.0]],
+        [[14.0, 13.0], [44.0, 45.0], [60.0, 20.0]],
+        [[15.0, 15.0], [98.0, 50.0]],
+    ]
+    return hypothesesGraphClass(
+        probabilityGenerator=SimpleProbabilityGenerator(centersPerFrame),
+        timeRange=(0, 4),
+        maxNumObjects=2,
+        numNearestNeighbors=2,
+        fieldOfView=FieldOfView(0, 0, 0, 0, 3, 99, 99, 0),
+        withDivisions=False,
+        transitionClassifier=transitionClassifier,
+    )
+
+
+def test_batchTransitionPrediction():
+    for withTracklets in [False, True]:
+        results = []
+        for batch in [False, True]:
+            transitionClassifier = SimpleTransitionClassifier()
+            h = buildGraph(transitionClassifier)
+            if withTracklets:
+                h = h.generateTrackletGraph()
+            h.insertEnergies(batchTransitionPrediction=batch)
+            if batch:
+                assert transitionClassifier.numPredictCalls == 1
+            results.append(h)
+
+        perArc, batched = results
+        for n in perArc.nodeIterator():
+            assert (
+                perArc._graph.nodes[n]["features"]
+                == batched._graph.nodes[n]["features"]
+            )
+        for a in perArc.arcIterator():
+            assert (
+                perArc._graph.edges[a[0], a[1]]["features"]
+                == batched._graph.edges[a[0], a[1]]["features"]
+            )
+
+
+def test_arrayHypothesesGraph():
+    h = buildGraph(None)
+    arrayH = buildGraph(None, IlastikArrayHypothesesGraph)
+    assert list(h.nodeIterator()) == arrayH.nodeIterator()
+    assert list(h.arcIterator()) == arrayH.arcIterator()
+
+    h.insertEnergies()
+    arrayH.insertEnergies()
+    assert h.toTrackingGraph().model == arrayH.toTrackingGraph().model
+
+    # two objects move through all frames, and one appears in frame 2
+    tracks = [[(0, 1), (1, 1), (2, 1), (3, 1)], [(0, 2), (1, 2), (2, 2)], [(2, 3)]]
+    traxelIdPerTimestepToUniqueIdMap, _ = h.getMappingsBetweenUUIDsAndTraxels()
+    uuid = lambda n: traxelIdPerTimestepToUniqueIdMap[str(n[0])][str(n[1])]
+    activeNodes = [n for track in tracks for n in track]
+    activeLinks = [a for track in tracks for a in zip(track, track[1:])]
+    assert all(arrayH.hasEdge(*a) for a in activeLinks)
+    solution = {
+        "detectionResults": [
+            {"id": uuid(n), "value": int(n in activeNodes)} for n in h.nodeIterator()
+        ],
+        "linkingResults": [
+            {"src": uuid(a[0]), "dest": uuid(a[1]), "value": int(a in activeLinks)}
+            for a in h.arcIterator()
+        ],
+        "divisionResults": [],
+    }
+    h.insertSolution(solution)
+    arrayH.insertSolution(solution)
+    assert h.getSolutionDictionary() == arrayH.getSolutionDictionary()
+
+    h.computeLineage()
+    arrayH.computeLineage()
+    for n in h.nodeIterator():
+        assert h.getLineageId(*n) == arrayH.getLineageId(*n)
+        assert h.getTrackId(*n) == arrayH.getTrackId(*n)
+    assert arrayH.getTrackId(3, 2) is None
+
+    # a networkx based copy is needed for tracklets and merger resolving
+    copiedH = arrayH.toHypothesesGraph()
+    assert isinstance(copiedH, IlastikHypothesesGraph)
+    assert copiedH.fieldOfView is arrayH.fieldOfView
+    withoutTraxel = lambda g: [
+        (n, dict((k, v) for k, v in d.items() if k != "traxel"))
+        for n, d in g._graph.nodes(data=True)
+    ]
+    assert withoutTraxel(copiedH) == withoutTraxel(h)
+    assert list(copiedH._graph.edges(data=True)) == list(h._graph.edges(data=True))
+    assert (
+        arrayH.generateTrackletGraph().countNodes()
+        == h.generateTrackletGraph().countNodes()
+    )
+
+    unpickledH = pickle.loads(pickle.dumps(arrayH))
+    assert unpickledH.getSolutionDictionary() == arrayH.getSolutionDictionary()
+
+
+def test_arrayHypothesesGraphAddNodes():
+    h = buildGraph(None, IlastikArrayHypothesesGraph)
+    numNodes = h.countNodes()
+    newTraxels = [SimpleTraxel(4, objectId, [50.0, objectId]) for objectId in [1, 2, 3]]
+    for traxel in newTraxels:
+        h.addNodeFromTraxel(traxel)
+        assert h.hasNode((traxel.Timestep, traxel.Id))
+
+    assert h.countNodes() == numNodes + len(newTraxels)
+    assert h.nodeIterator()[-len(newTraxels) :] == [(4, 1), (4, 2), (4, 3)]
+    traxelMap = h.getNodeTraxelMap()
+    trackletMap = h.getNodeTrackletMap()
+    for traxel in newTraxels:
+        assert traxelMap[(4, traxel.Id)] is traxel
+        assert trackletMap[(4, traxel.Id)] == [traxel]
+
+
+def test_toTrackingGraphCopiesUuidTraxelMapping():
+    for hypothesesGraphClass in [IlastikHypothesesGraph, IlastikArrayHypothesesGraph]:
+        h = buildGraph(None, hypothesesGraphClass)
+        h.insertEnergies()
+        traxelToUniqueId = h.getUuidTraxelMapping().toTraxelToUniqueId()
+
+        trackingGraph = h.toTrackingGraph()
+        assert trackingGraph.uuidTraxelMapping is not h.getUuidTraxelMapping()
+        trackingGraph.addDetectionHypothesesFromTracklet(
+            [SimpleTraxel(4, 1, [50.0, 1.0])], [[0.0], [1.0]]
+        )
+        assert trackingGraph.uuidTraxelMapping.hasTraxel(4, 1)
+        assert not h.getUuidTraxelMapping().hasTraxel(4, 1)
+        assert h.getUuidTraxelMapping().toTraxelToUniqueId() == traxelToUniqueId
+
+
+def test_vectorizedEnergies():
+    for transitionClassifier in [None, SimpleTransitionClassifier()]:
+        models = []
+        for vectorized in [False, True]:
+            h = buildGraph(transitionClassifier)
+            h.insertEnergies(vectorized=vectorized)
+            models.append(h.toTrackingGraph().model)
+
+        perElement, vectorized = models
+        for a, b in zip(
+            perElement["segmentationHypotheses"] + perElement["linkingHypotheses"],
+            vectorized["segmentationHypotheses"] + vectorized["linkingHypotheses"],
+        ):
+            assert a.keys() == b.keys()
+            for k in a.keys():
+                assert np.allclose(a[k], b[k])
+
+    fov = FieldOfView(0, 0, 0, 0, 3, 99, 99, 0)
+    positions = np.array([[10.0, 10.0, 0.0], [98.0, 50.0, 0.0], [60.0, 20.0, 0.0]])
+    assert np.array_equal(
+        fov.spatial_distances_to_border(positions[:, :2]),
+        [fov.spatial_distance_to_border(0, x, y, z) for x, y, z in positions],
+    )
+
+
+def test_writeTrackingGraph(tmpdir):
+    filename = os.path.join(str(tmpdir), "model.json")
+    for hypothesesGraphClass in [IlastikHypothesesGraph, IlastikArrayHypothesesGraph]:
+        h = buildGraph(None, hypothesesGraphClass)
+        h.insertEnergies()
+        model = h.toTrackingGraph().model
+        model["settings"]["optimizerEpGap"] = 0.05
+
+        h.writeTrackingGraph(filename, settings={"optimizerEpGap": 0.05})
+        assert readFromJSON(filename) == model
+
+        streamedModel = {}
+        for key, value in iterateJSONModel(filename):
+            if key in ["traxelToUniqueId", "settings"]:
+                streamedModel.setdefault(key, {})[value[0]] = value[1]
+            else:
+                streamedModel.setdefault(key, []).append(value)
+        assert "divisionHypotheses" not in streamedModel
+        assert "exclusions" not in streamedModel
+        for key in ["segmentationHypotheses", "linkingHypotheses", "traxelToUniqueId"]:
+            assert streamedModel[key] == model[key]
+
+
+if __name__ == "__main__":
+    test_batchTransitionPrediction()
+    test_arrayHypothesesGraph()
+    test_arrayHypothesesGraphAddNodes()
+    test_toTrackingGraphCopiesUuidTraxelMapping()
+    test_vectorizedEnergies()
+    test_writeTrackingGraph(tempfile.mkdtemp())
@@ -1,4 +1,5 @@
 import hytra.core.jsongraph as jg
+from hytra.core.uuidtraxelmapping import UuidTraxelMapping
 
 
 def return_example_model():
@@ -257,3 +258,51 @@ def test_weightListToFromDict():
 
     otherWeights = trackingGraph.weightsDictToList(wd)
     assert otherWeights == [0, 1, 0, 3, 4]
+
+
+def test_binaryRoundTrip(tmpdir):
+    model = return_example_model()
+    model["segmentationHypotheses"][1]["divisionFeatures"] = [[0.5], [1.5]]
+    model["segmentationHypotheses"][2]["features"] = [[1.0, 2.0], [3.0, 4.0], [5]]
+    model["exclusions"] = [[1, 2], [0, 4, 5]]
+    result = return_example_result()
+
+    for extension in [".h5", ".npz"]:
+        modelFilename = str(tmpdir.join("model" + extension))
+        resultFilename = str(tmpdir.join("result" + extension))
+        jg.writeToFile(modelFilename, model)
+        jg.writeToFile(resultFilename, result)
+        assert jg.readFromFile(modelFilename) == model
+        assert jg.readFromFile(resultFilename) == result
+
+        trackingGraph = jg.JsonTrackingGraph(
+            model_filename=modelFilename, result_filename=resultFilename
+        )
+        assert trackingGraph.model == model
+        assert trackingGraph.uuidToTraxelMap[1] == [(3, 2)]
+
+
+def test_uuidTraxelMapping():
+    model = return_example_model()
+    mapping = UuidTraxelMapping.fromTraxelToUniqueId(model["traxelToUniqueId"])
+    assert len(mapping) == 6
+    assert mapping.toTraxelToUniqueId() == model["traxelToUniqueId"]
+    assert mapping.getUuid(3, 2) == 1
+    assert mapping.getTraxels(4) == [(1, 1)]
+    assert mapping.getNextUuid() == 6
+    assert mapping.getTimeRange() == (0, 4)
+
+    trackingGraph = jg.JsonTrackingGraph(model=model)
+    assert trackingGraph.uuidTraxelMapping.getUuidToTraxelMap() == (
+        mapping.getUuidToTraxelMap()
+    )
+
+    # modifying a copy does not change the original
+    refinedMapping = mapping.copy()
+    assert refinedMapping.removeTraxel(3, 2) == 1
+    refinedMapping.add(6, [(3, 3)])
+    refinedMapping.add(6, [(2, 3)])
+    assert not refinedMapping.hasUuid(1)
+    assert refinedMapping.getTraxels(6) == [(2, 3), (3, 3)]
+    assert refinedMapping.toTraxelToUniqueId()["3"] == {"1": 2, "3": 6}
+    assert mapping.hasTraxel(3, 2) and not mapping.hasTraxel(3, 3)
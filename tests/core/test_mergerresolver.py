@@ -0,0 +1,271 @@
+import h5py
+import numpy as np
+import scipy.ndimage
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+from hytra.core.jsongraph import JsonTrackingGraph
+from hytra.core.jsonmergerresolver import JsonMergerResolver
+from hytra.core.mergerresolver import (
+    applyMergerAssignment,
+    assignMergerPixels,
+    fitMergers,
+)
+
+
+def test_mergerAssignment():
+    pluginManager = TrackingPluginManager(pluginPaths=["hytra/plugins"])
+    mergerResolver = pluginManager.getMergerResolver()
+
+    labelImage = np.zeros((60, 50), dtype=np.uint32)
+    labelImage[30:36, 10:16] = 3
+    labelImage[30:36, 22:28] = 3
+    labelImage[33:35, 10:28] = 3
+    labelImage[5:8, 5:8] = 1
+    boundingBox = (slice(30, 36), slice(10, 28))
+    offset = np.array([30, 10])
+
+    [(fits, assignment)] = fitMergers(
+        [(labelImage[boundingBox], 3, 4, 2, [], offset)], mergerResolver
+    )
+    assert np.array_equal(assignment[0], offset)
+    assert set(np.unique(assignment[1])) == set([0, 4, 5])
+
+    expected = labelImage.copy()
+    mergerResolver.updateLabelImage(expected, 3, fits, [4, 5])
+    applyMergerAssignment(labelImage, assignment)
+    assert np.array_equal(labelImage, expected)
+
+    # no assignment for objects that are no mergers
+    [(fits, assignment)] = fitMergers(
+        [(labelImage[5:8, 5:8], 1, 6, 1, [], np.array([5, 5]))], mergerResolver
+    )
+    assert len(fits) == 1 and assignment is None
+    assert np.array_equal(
+        assignMergerPixels(
+            mergerResolver, expected[boundingBox], 7, fits, [7], offset
+        )[1],
+        np.zeros((6, 18)),
+    )
+
+
+class NumpyFeaturePluginManager(TrackingPluginManager):
+    """
+    Computes a few region features with numpy instead of running the vigra based feature plugins
+    """
+
+    def applyObjectFeatureComputationPlugins(
+        self, ndims, rawImage, labelImage, frameNumber, rawFilename
+    ):
+        labelImage = labelImage.squeeze().astype(np.uint32)
+        rawImage = rawImage.squeeze()
+        labels = np.arange(labelImage.max() + 1)
+        coordinates = np.indices(labelImage.shape)
+        count = scipy.ndimage.sum(np.ones(labelImage.shape), labelImage, labels)
+        features = {
+            "Count": count,
+            "Mean": scipy.ndimage.mean(rawImage, labelImage, labels),
+            "RegionCenter": np.stack(
+                [scipy.ndimage.mean(c, labelImage, labels) for c in coordinates], axis=1
+            ),
+            "Coord<Minimum >": np.stack(
+                [scipy.ndimage.minimum(c, labelImage, labels) for c in coordinates],
+                axis=1,
+            ),
+            "Global<Maximum >": np.full(len(labels), labelImage.max()),
+        }
+        return [features], ["Global<Maximum >"]
+
+
+LABEL_IMAGE_PATH = (
+    "/TrackingFeatureExtraction/LabelImage/0000/"
+    "[[%d, 0, 0, 0, 0], [%d, %d, %d, %d, 1]]"
+)
+
+
+def writeMergerLabelImages(filename):
+    """
+    Write label images in which two objects merge in frame 1 and separate again
+    """
+    labelImages = [np.zeros((40, 40), dtype=np.uint32) for _ in range(3)]
+    labelImages[0][5:11, 5:11] = 1
+    labelImages[0][5:11, 25:31] = 2
+    labelImages[1][10:16, 8:14] = 1
+    labelImages[1][10:16, 20:26] = 1
+    labelImages[1][12:14, 8:26] = 1
+    labelImages[2][15:21, 5:11] = 1
+    labelImages[2][15:21, 25:31] = 2
+    with h5py.File(filename, "w") as h5file:
+        for t, labelImage in enumerate(labelImages):
+            h5file.create_dataset(
+                LABEL_IMAGE_PATH % (t, t + 1, 40, 40, 1),
+                data=labelImage[np.newaxis, :, :, np.newaxis, np.newaxis],
+            )
+
+
+def createMergerTrackingGraph():
+    """
+    **returns** a `JsonTrackingGraph` whose result contains the merger of `writeMergerLabelImages`
+    """
+    traxels = [(0, 1), (0, 2), (1, 1), (2, 1), (2, 2)]
+    links = [(0, 2), (1, 2), (2, 3), (2, 4)]
+    model = {
+        "segmentationHypotheses": [
+            {"id": uuid, "features": [[0.0], [1.0], [2.0]]}
+            for uuid in range(len(traxels))
+        ],
+        "linkingHypotheses": [
+            {"src": src, "dest": dest, "features": [[0.0], [1.0], [2.0]]}
+            for src, dest in links
+        ],
+        "traxelToUniqueId": {},
+    }
+    for uuid, (t, idx) in enumerate(traxels):
+        model["traxelToUniqueId"].setdefault(str(t), {})[str(idx)] = uuid
+    result = {
+        "detectionResults": [
+            {"id": uuid, "value": 2 if uuid == 2 else 1} for uuid in range(len(traxels))
+        ],
+        "linkingResults": [
+            {"src": src, "dest": dest, "value": 1} for src, dest in links
+        ],
+        "divisionResults": None,
+    }
+    return JsonTrackingGraph(model=model, result=result)
+
+
+def createJsonMergerResolver(
+    labelImageFilename,
+    outFilename,
+    featuresInBoundingBox=False,
+    streamFrames=False,
+    useMultiprocessing=False,
+):
+    resolver = JsonMergerResolver(
+        createMergerTrackingGraph(),
+        labelImageFilename,
+        LABEL_IMAGE_PATH,
+        outFilename,
+        None,
+        None,
+        None,
+        pluginPaths=["hytra/plugins"],
+        featuresInBoundingBox=featuresInBoundingBox,
+        streamFrames=streamFrames,
+        useMultiprocessing=useMultiprocessing,
+    )
+    resolver.pluginManager = NumpyFeaturePluginManager(pluginPaths=["hytra/plugins"])
+    return resolver
+
+
+def readRefinedLabelImages(filename):
+    with h5py.File(filename, "r") as h5file:
+        return [h5file[LABEL_IMAGE_PATH % (t, t + 1, 40, 40, 1)][()] for t in range(3)]
+
+
+def test_frameFeatures(tmpdir):
+    labelImage = np.zeros((60, 50), dtype=np.uint32)
+    labelImage[30:36, 10:16] = 3
+    labelImage[40:44, 20:28] = 5
+    labelImage[5:8, 5:8] = 1
+    labelImage[50:55, 40:45] = 7
+    # a line of pixels in the last row, whose bounding box must not be squeezed to 1D
+    labelImage[59, 20:30] = 9
+    rawImage = np.random.RandomState(0).rand(60, 50).astype(np.float32)
+    pluginManager = NumpyFeaturePluginManager(pluginPaths=["hytra/plugins"])
+
+    for objectIds in [[5, 3, 7], [9]]:
+        # features of each object computed on its own in the full frame
+        expected = []
+        for idx in objectIds:
+            objectLabelImage = (labelImage == idx).astype(np.uint32)
+            applyPlugins = pluginManager.applyObjectFeatureComputationPlugins
+            featureDicts, ignoreNames = applyPlugins(
+                2, rawImage, objectLabelImage, 0, None
+            )
+            expected.append(
+                dict(
+                    (k, v[1])
+                    for k, v in featureDicts[0].items()
+                    if k not in ignoreNames
+                )
+            )
+
+        for featuresInBoundingBox in [False, True]:
+            resolver = createJsonMergerResolver(
+                str(tmpdir.join("labels.h5")),
+                str(tmpdir.join("out.h5")),
+                featuresInBoundingBox,
+            )
+            objectFeatures = resolver._computeFrameFeatures(
+                2, rawImage, labelImage, 0, objectIds
+            )
+            assert len(objectFeatures) == len(objectIds)
+            for features, expectedFeatures in zip(objectFeatures, expected):
+                assert features.keys() == expectedFeatures.keys()
+                for k in expectedFeatures:
+                    assert np.allclose(features[k], expectedFeatures[k])
+
+
+def test_streamFrames(tmpdir):
+    labelImageFilename = str(tmpdir.join("labels.h5"))
+    writeMergerLabelImages(labelImageFilename)
+    resolvers = []
+    for streamFrames in [False, True]:
+        resolver = createJsonMergerResolver(
+            labelImageFilename,
+            str(tmpdir.join("out_{}.h5".format(streamFrames))),
+            streamFrames=streamFrames,
+        )
+        mergerDict = resolver.run()
+        assert len(mergerDict[1][1]) == 2
+        resolvers.append((resolver, mergerDict))
+
+    (resolver, mergerDict), (streamingResolver, streamingMergerDict) = resolvers
+    assert streamingMergerDict == mergerDict
+    assert streamingResolver.model == resolver.model
+    assert streamingResolver.result == resolver.result
+    # streaming only keeps the pixel assignments of the mergers in the current frame
+    assert len(resolver._mergerAssignments) > 0
+    assert len(streamingResolver._mergerAssignments) == 0
+    for streamingRefined, refined in zip(
+        readRefinedLabelImages(streamingResolver.out_label_image),
+        readRefinedLabelImages(resolver.out_label_image),
+    ):
+        assert np.array_equal(streamingRefined, refined)
+
+
+def test_multiprocessing(tmpdir):
+    labelImageFilename = str(tmpdir.join("labels.h5"))
+    writeMergerLabelImages(labelImageFilename)
+    results = []
+    for useMultiprocessing in [False, True]:
+        resolver = createJsonMergerResolver(
+            labelImageFilename,
+            str(tmpdir.join("out_{}.h5".format(useMultiprocessing))),
+            useMultiprocessing=useMultiprocessing,
+        )
+        mergerDict = resolver.run()
+        results.append(
+            (
+                resolver,
+                mergerDict,
+                resolver._computeObjectFeatures(["0", "1", "2"]),
+                readRefinedLabelImages(resolver.out_label_image),
+            )
+        )
+
+    (
+        (resolver, mergerDict, objectFeatures, refined),
+        (parallelResolver, parallelMergerDict, parallelObjectFeatures, parallelRefined),
+    ) = results
+    assert parallelMergerDict == mergerDict
+    assert sorted(parallelResolver.resolvedGraph.edges()) == sorted(
+        resolver.resolvedGraph.edges()
+    )
+    assert parallelResolver.model == resolver.model
+    assert parallelResolver.result == resolver.result
+    assert parallelObjectFeatures.keys() == objectFeatures.keys()
+    for node, features in objectFeatures.items():
+        for k, v in features.items():
+            assert np.allclose(parallelObjectFeatures[node][k], v)
+    for parallelLabelImage, labelImage in zip(parallelRefined, refined):
+        assert np.array_equal(parallelLabelImage, labelImage)
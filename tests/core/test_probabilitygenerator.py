@@ -0,0 +1,117 @@
+import concurrent.futures
+import h5py
+import numpy as np
+import hytra.core.probabilitygenerator as probabilitygenerator
+from hytra.core.ilastik_project_options import IlastikProjectOptions
+
+NUM_FRAMES = 5
+
+# (function name, frame, keyword arguments) of every job submitted to an executor
+submittedJobs = []
+
+
+class RecordingDummyExecutor(probabilitygenerator.DummyExecutor):
+    def submit(self, func, *args, **kwargs):
+        submittedJobs.append((func.__name__, args[0], kwargs))
+        return super(RecordingDummyExecutor, self).submit(func, *args, **kwargs)
+
+
+class RecordingProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+    def submit(self, func, *args, **kwargs):
+        submittedJobs.append((func.__name__, args[0], kwargs))
+        return super(RecordingProcessPoolExecutor, self).submit(func, *args, **kwargs)
+
+
+def fakeRegionFeatures(frame, *args, returnLabelImage=False, **kwargs):
+    features = {"Frame": np.array([frame])}
+    if returnLabelImage:
+        return frame, features, np.full((10, 10), frame, dtype=np.uint32)
+    return frame, features
+
+
+def fakeDivisionFeatures(
+    frameT, featuresAtT, featuresAtTPlus1, *args, labelImageAtTPlus1=None
+):
+    return (
+        frameT,
+        {
+            "ParentChildFrames": np.array(
+                [featuresAtT["Frame"][0], featuresAtTPlus1["Frame"][0]]
+            )
+        },
+    )
+
+
+def createIlastikProjectOptions(tmpdir):
+    options = IlastikProjectOptions()
+    options.labelImageFilename = str(tmpdir.join("labels.h5"))
+    options.objectCountClassifierFilename = None
+    options.divisionClassifierFilename = None
+    options.transitionClassifierFilename = None
+    with h5py.File(options.labelImageFilename, "w") as h5file:
+        for t in range(NUM_FRAMES):
+            h5file.create_dataset(
+                options.labelImagePath % (t, t + 1, 10, 10, 1),
+                data=np.zeros((1, 10, 10, 1, 1), dtype=np.uint32),
+            )
+    return options
+
+
+def createProbabilityGenerator(options, useMultiprocessing):
+    probabilityGenerator = probabilitygenerator.IlpProbabilityGenerator(
+        options, useMultiprocessing=useMultiprocessing
+    )
+    # division features are only computed if there is a division classifier
+    probabilityGenerator._divisionClassifier = "division classifier"
+    return probabilityGenerator
+
+
+def test_extractAllFeaturesScheduling(tmpdir, monkeypatch):
+    monkeypatch.setattr(
+        probabilitygenerator, "computeRegionFeaturesOnCloud", fakeRegionFeatures
+    )
+    monkeypatch.setattr(
+        probabilitygenerator, "computeDivisionFeaturesOnCloud", fakeDivisionFeatures
+    )
+    monkeypatch.setattr(probabilitygenerator, "DummyExecutor", RecordingDummyExecutor)
+    monkeypatch.setattr(
+        concurrent.futures, "ProcessPoolExecutor", RecordingProcessPoolExecutor
+    )
+
+    # region features of all frames first, then the division features of all but the last frame
+    expectedFeaturesPerFrame = dict(
+        (t, {"Frame": np.array([t])}) for t in range(NUM_FRAMES)
+    )
+    for t in range(NUM_FRAMES - 1):
+        expectedFeaturesPerFrame[t]["ParentChildFrames"] = np.array([t, t + 1])
+
+    options = createIlastikProjectOptions(tmpdir)
+    for useMultiprocessing in [False, True]:
+        del submittedJobs[:]
+        probabilityGenerator = createProbabilityGenerator(options, useMultiprocessing)
+        featuresPerFrame = probabilityGenerator._extractAllFeatures()
+
+        assert featuresPerFrame.keys() == expectedFeaturesPerFrame.keys()
+        for t, features in expectedFeaturesPerFrame.items():
+            assert featuresPerFrame[t].keys() == features.keys()
+            for k, v in features.items():
+                assert np.array_equal(featuresPerFrame[t][k], v)
+
+        regionJobs = [job for job in submittedJobs if job[0] == "fakeRegionFeatures"]
+        divisionJobs = [
+            job for job in submittedJobs if job[0] == "fakeDivisionFeatures"
+        ]
+        assert sorted(frame for _, frame, _ in regionJobs) == list(range(NUM_FRAMES))
+        assert sorted(frame for _, frame, _ in divisionJobs) == list(
+            range(NUM_FRAMES - 1)
+        )
+
+        # label images are only handed from region to division jobs within one process
+        for _, _, kwargs in regionJobs:
+            assert kwargs["returnLabelImage"] == (not useMultiprocessing)
+        for _, frame, kwargs in divisionJobs:
+            labelImageAtTPlus1 = kwargs["labelImageAtTPlus1"]
+            if useMultiprocessing:
+                assert labelImageAtTPlus1 is None
+            else:
+                assert np.all(labelImageAtTPlus1 == frame + 1)
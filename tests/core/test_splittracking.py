@@ -0,0 +1,79 @@
+import pickle
+import hytra.core.splittracking
+from hytra.core.splittracking import SplitTracking
+
+
+def solveWithoutSolver(model, weights):
+    """a deterministic replacement of the dpct solvers that activates every other object"""
+    return {
+        "detectionResults": [
+            {"id": d["id"], "value": d["id"] % 2}
+            for d in model["segmentationHypotheses"]
+        ],
+        "linkingResults": [
+            {"src": l["src"], "dest": l["dest"], "value": l["src"] % 2}
+            for l in model["linkingHypotheses"]
+        ],
+        "divisionResults": [],
+    }
+
+
+def trackSubmodelWithoutSolver(submodel, weights, withMergerResolver=None):
+    if isinstance(submodel, bytes):
+        submodel = pickle.loads(submodel)
+    return solveWithoutSolver(submodel, weights), 0.0
+
+
+def createModel(numFrames, numObjectsPerFrame):
+    model = {
+        "segmentationHypotheses": [],
+        "linkingHypotheses": [],
+        "divisionHypotheses": [],
+        "traxelToUniqueId": {},
+        "settings": {},
+    }
+    for t in range(numFrames):
+        model["traxelToUniqueId"][str(t)] = {}
+        for i in range(numObjectsPerFrame):
+            uuid = t * numObjectsPerFrame + i
+            model["traxelToUniqueId"][str(t)][str(i + 1)] = uuid
+            model["segmentationHypotheses"].append(
+                {"id": uuid, "features": [[1.0], [0.5 * i], [2.0 + t % 3]]}
+            )
+            if t > 0:
+                model["linkingHypotheses"].append(
+                    {
+                        "src": uuid - numObjectsPerFrame,
+                        "dest": uuid,
+                        "features": [[1.0], [0.0]],
+                    }
+                )
+    return model
+
+
+def test_parallelSubmodelTracking(monkeypatch):
+    monkeypatch.setattr(
+        hytra.core.splittracking, "trackSubmodel", trackSubmodelWithoutSolver
+    )
+    monkeypatch.setattr(
+        hytra.core.splittracking.dpct, "trackMaxFlow", solveWithoutSolver
+    )
+    monkeypatch.setattr(
+        hytra.core.splittracking.dpct, "trackFlowBased", solveWithoutSolver
+    )
+
+    weights = {"weights": [1, 1, 1, 1]}
+    serialResult = SplitTracking.trackFlowBasedWithSplits(
+        createModel(30, 3), weights, numFramesPerSplit=5, withMergerResolver=True
+    )
+    assert len(serialResult["detectionResults"]) == 90
+    for numThreads, useMultiprocessing in [(2, True), (2, False)]:
+        parallelResult = SplitTracking.trackFlowBasedWithSplits(
+            createModel(30, 3),
+            weights,
+            numFramesPerSplit=5,
+            numThreads=numThreads,
+            withMergerResolver=True,
+            useMultiprocessing=useMultiprocessing,
+        )
+        assert parallelResult == serialResult
@@ -0,0 +1,69 @@
+import pickle
+import numpy as np
+from hytra.core.traxelstore import TraxelStore
+
+
+def createFrameFeatures(numObjects, randomState):
+    regionCenter = randomState.rand(numObjects, 3) * 100
+    return {
+        "RegionCenter": regionCenter,
+        "com": regionCenter,
+        "Count": (randomState.rand(numObjects) * 50).astype("float32"),
+        "Variance": randomState.rand(numObjects, 2, 2),
+        "Polygon": [randomState.rand(i, 2) for i in range(numObjects)],
+    }
+
+
+def test_traxelViews():
+    randomState = np.random.RandomState(42)
+    features = createFrameFeatures(10, randomState)
+    store = TraxelStore()
+    traxels = store.addTraxels(3, [1, 4, 7], features, scale=(1.0, 1.0, 2.0))
+
+    assert list(traxels.keys()) == [1, 4, 7]
+    traxel = traxels[4]
+    assert traxel.Id == 4 and traxel.Timestep == 3
+    assert traxel.conflictingTraxelIds is None
+    assert set(traxel.Features.keys()) == set(features.keys())
+    assert traxel.X() == features["RegionCenter"][4, 0]
+    assert traxel.Z() == features["RegionCenter"][4, 2]
+    assert traxel.get_feature_value("Count", 0) == features["Count"][4]
+    assert traxel.Features["Count"].dtype == np.float64
+    assert np.array_equal(
+        traxel.Features["Variance"], features["Variance"][4].flatten()
+    )
+    assert np.array_equal(traxel.Features["Polygon"], features["Polygon"][4].flatten())
+    assert traxel._scale.tolist() == [1.0, 1.0, 2.0]
+
+    # features given under several names are only stored once
+    assert store.getFeatureMatrix(3, "com") is store.getFeatureMatrix(3, "RegionCenter")
+    assert store.getFeatureMatrix(3, "Variance").shape == (3, 4)
+
+    traxel.set_feature_value("Count", 0, 17.0)
+    assert store.getFeatureMatrix(3, "Count")[1, 0] == 17.0
+
+    # new features only affect a single traxel
+    traxel.Features["JaccardScores"] = [(5, 0.7)]
+    traxel.add_feature_array("divProb", 2)
+    traxel.set_feature_value("divProb", 1, 0.3)
+    assert "JaccardScores" in traxel.Features and "divProb" in traxel.Features
+    assert "JaccardScores" not in traxels[1].Features
+    assert len(traxel.Features) == len(features) + 2
+    assert traxel.get_feature_value("divProb", 1) == 0.3
+
+    traxel.conflictingTraxelIds = [2]
+    unpickledTraxels = pickle.loads(pickle.dumps(traxels))
+    assert unpickledTraxels[4].Features["JaccardScores"] == [(5, 0.7)]
+    assert unpickledTraxels[4].conflictingTraxelIds == [2]
+    assert unpickledTraxels[4].X() == traxel.X()
+
+
+def test_traxelViewWithoutZ():
+    store = TraxelStore()
+    traxels = store.addTraxels(0, [1], {"com": np.array([[0, 0], [3, 5]])})
+    assert (traxels[1].X(), traxels[1].Y(), traxels[1].Z()) == (3.0, 5.0, 0.0)
+
+
+if __name__ == "__main__":
+    test_traxelViews()
+    test_traxelViewWithoutZ()
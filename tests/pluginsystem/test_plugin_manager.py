@@ -0,0 +1,127 @@
+import numpy as np
+import h5py
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+
+
+def createFrameFeatures(numObjects, randomState):
+    return {
+        "RegionCenter": (randomState.rand(numObjects, 3) * 100).astype("float32"),
+        "Count": (randomState.rand(numObjects) * 50).astype("float32"),
+        "Mean": randomState.rand(numObjects),
+        "Variance": randomState.rand(numObjects, 2, 2).astype("float32"),
+    }
+
+
+def getObjectFeatureDict(frameFeatures, objectId):
+    return dict((k, v[objectId, ...]) for k, v in frameFeatures.items())
+
+
+def test_transitionFeatureMatrix():
+    pluginManager = TrackingPluginManager(pluginPaths=["hytra/plugins"])
+    randomState = np.random.RandomState(42)
+    featuresA = createFrameFeatures(20, randomState)
+    featuresB = createFrameFeatures(25, randomState)
+    selectedFeatures = ["Count", "Mean", "RegionCenter", "Variance"]
+    objectIdsA = randomState.randint(1, 20, 50)
+    objectIdsB = randomState.randint(1, 25, 50)
+
+    featureMatrix = pluginManager.applyTransitionFeatureMatrixConstructionPlugins(
+        featuresA, featuresB, objectIdsA, objectIdsB, selectedFeatures
+    )
+
+    assert featureMatrix.shape == (50, 14)
+
+    for row, (a, b) in enumerate(zip(objectIdsA, objectIdsB)):
+        featureVector = pluginManager.applyTransitionFeatureVectorConstructionPlugins(
+            getObjectFeatureDict(featuresA, a),
+            getObjectFeatureDict(featuresB, b),
+            selectedFeatures,
+        )
+        assert np.array_equal(featureMatrix[row], np.array(featureVector))
+
+    emptyMatrix = pluginManager.applyTransitionFeatureMatrixConstructionPlugins(
+        featuresA, featuresB, [], [], selectedFeatures
+    )
+    assert emptyMatrix.shape == (0, featureMatrix.shape[1])
+
+
+def test_gmmMergerResolvingOnCrop():
+    pluginManager = TrackingPluginManager(pluginPaths=["hytra/plugins"])
+    mergerResolver = pluginManager.getMergerResolver()
+
+    labelImage = np.zeros((60, 50), dtype=np.uint32)
+    labelImage[30:36, 10:16] = 3
+    labelImage[30:36, 22:28] = 3
+    labelImage[5:8, 5:8] = 1
+    boundingBox = (slice(30, 36), slice(10, 28))
+    offset = np.array([30, 10])
+
+    fits = list(
+        mergerResolver.resolveMerger(labelImage[boundingBox], 3, 4, 2, [], offset)
+    )
+    means = sorted(fit[2].tolist() for fit in fits)
+    assert np.allclose(means, [[32.5, 12.5], [32.5, 24.5]])
+
+    fullLabelImage = labelImage.copy()
+    mergerResolver.updateLabelImage(fullLabelImage, 3, fits, [4, 5])
+    mergerResolver.updateLabelImage(labelImage[boundingBox], 3, fits, [4, 5], offset)
+    assert np.array_equal(labelImage, fullLabelImage)
+    assert set(np.unique(labelImage)) == set([0, 1, 4, 5])
+
+
+def test_hdf5FeatureSerializer(tmpdir):
+    pluginManager = TrackingPluginManager(pluginPaths=["hytra/plugins"])
+    pluginManager.setFeatureSerializer("Hdf5FeatureSerializer")
+    featureSerializer = pluginManager.getFeatureSerializer()
+    featureSerializer.filename = str(tmpdir.join("features.h5"))
+
+    randomState = np.random.RandomState(42)
+    featuresPerFrame = {}
+    for frame in range(3):
+        features = createFrameFeatures(10, randomState)
+        features["Polygon/Outline"] = [np.zeros((i, 2)) for i in range(10)]
+        featuresPerFrame[frame] = features
+        featureSerializer.storeFeaturesForFrame(features, frame)
+
+    # overwriting a frame replaces all of its features
+    featureSerializer.storeFeaturesForFrame(featuresPerFrame[1], 1)
+
+    for frame, features in featuresPerFrame.items():
+        loadedFeatures = featureSerializer.loadFeaturesForFrame(None, frame)
+        assert set(loadedFeatures.keys()) == set(features.keys())
+        for k, v in features.items():
+            if isinstance(v, list):
+                assert len(loadedFeatures[k]) == len(v)
+                assert all(np.array_equal(a, b) for a, b in zip(loadedFeatures[k], v))
+            else:
+                assert loadedFeatures[k].dtype == v.dtype
+                assert np.array_equal(loadedFeatures[k], v)
+
+
+def test_localImageLoaderLabelImageV2(tmpdir):
+    pluginManager = TrackingPluginManager(pluginPaths=["hytra/plugins"])
+    imageProvider = pluginManager.getImageProvider()
+    filename = str(tmpdir.join("labelimage.h5"))
+    path = "/TrackingFeatureExtraction/LabelImage_v2/0000"
+    h5py.File(filename, "w").close()
+
+    randomState = np.random.RandomState(42)
+    labelImages = [randomState.randint(0, 10, (20, 30)) for _ in range(4)]
+    imageProvider.shape = (20, 30, 1)
+    for frame in [2, 0, 1]:
+        imageProvider.exportLabelImage(labelImages[frame], frame, filename, path)
+
+    for frame in [1, 2, 0, 1]:
+        labelImage = imageProvider.getLabelImageForFrame(filename, path, frame)
+        assert np.array_equal(labelImage, labelImages[frame])
+
+    # the file is reopened and the block index is rebuilt after writing another frame
+    imageProvider.exportLabelImage(labelImages[3], 3, filename, path)
+    for frame in [3, 0]:
+        labelImage = imageProvider.getLabelImageForFrame(filename, path, frame)
+        assert np.array_equal(labelImage, labelImages[frame])
+
+
+if __name__ == "__main__":
+    test_transitionFeatureMatrix()
+    test_gmmMergerResolvingOnCrop()
@@ -0,0 +1,46 @@
+import h5py
+import numpy as np
+from hytra.util.h5filepool import H5FilePool
+
+
+def test_h5FilePool(tmpdir):
+    filenames = [str(tmpdir.join("file{}.h5".format(i))) for i in range(3)]
+    for i, filename in enumerate(filenames):
+        with h5py.File(filename, "w") as h5file:
+            h5file.create_dataset("data", data=np.arange(5) + i)
+
+    pool = H5FilePool(maxOpenFiles=2)
+    with pool.openFile(filenames[0]) as h5file:
+        firstHandle = h5file
+        assert np.array_equal(h5file["data"][()], np.arange(5))
+    with pool.openFile(filenames[0]) as h5file:
+        assert h5file is firstHandle
+
+    numComputations = []
+
+    def computeSum(h5file):
+        numComputations.append(1)
+        return h5file["data"][()].sum()
+
+    assert pool.getCached(filenames[0], "sum", computeSum) == 10
+    assert pool.getCached(filenames[0], "sum", computeSum) == 10
+    assert len(numComputations) == 1
+
+    # the least recently used file is closed
+    for filename in filenames[1:]:
+        with pool.openFile(filename) as h5file:
+            assert h5file["data"].shape == (5,)
+    assert not firstHandle
+
+    # released files can be written, and are read again afterwards
+    pool.getCached(filenames[1], "sum", computeSum)
+    pool.release(filenames[1])
+    with h5py.File(filenames[1], "r+") as h5file:
+        h5file["data"][...] = 0
+    assert pool.getCached(filenames[1], "sum", computeSum) == 0
+    assert len(numComputations) == 3
+
+    pool.release()
+    with h5py.File(filenames[2], "w") as h5file:
+        h5file.create_dataset("data", data=np.ones(3))
+    assert pool.getCached(filenames[2], "sum", computeSum) == 3
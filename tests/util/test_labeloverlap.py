@@ -0,0 +1,63 @@
+import numpy as np
+from hytra.util.labeloverlap import computeLabelOverlaps, computeLabelSizes
+
+
+def test_computeLabelOverlaps():
+    np.random.seed(42)
+    labelImageA = np.random.randint(0, 6, size=(20, 30, 4)).astype(np.uint32)
+    labelImageB = np.random.randint(0, 300, size=(20, 30, 4)).astype(np.uint16)
+
+    labelsA, labelsB, numPixels = computeLabelOverlaps(labelImageA, labelImageB)
+    assert len(labelsA) == len(labelsB) == len(numPixels)
+    assert np.all(labelsA > 0) and np.all(labelsB > 0)
+
+    expected = {}
+    for objectIdA in np.unique(labelImageA):
+        if objectIdA == 0:
+            continue
+        overlap = labelImageB[labelImageA == objectIdA]
+        for objectIdB in np.unique(overlap):
+            if objectIdB == 0:
+                continue
+            expected[(objectIdA, objectIdB)] = np.sum(overlap == objectIdB)
+
+    found = dict(zip(zip(labelsA.tolist(), labelsB.tolist()), numPixels.tolist()))
+    assert found == expected
+    assert list(found.keys()) == sorted(expected.keys())
+
+
+def test_computeLabelOverlapsWithBackground():
+    labelImageA = np.array([[0, 1, 1], [2, 2, 0]])
+    labelImageB = np.array([[3, 3, 0], [0, 3, 0]])
+
+    labelsA, labelsB, numPixels = computeLabelOverlaps(labelImageA, labelImageB)
+    assert labelsA.tolist() == [1, 2]
+    assert labelsB.tolist() == [3, 3]
+    assert numPixels.tolist() == [1, 1]
+
+    labelsA, labelsB, numPixels = computeLabelOverlaps(
+        labelImageA, labelImageB, ignoreBackground=False
+    )
+    assert labelsA.tolist() == [0, 0, 1, 1, 2, 2]
+    assert labelsB.tolist() == [0, 3, 0, 3, 0, 3]
+    assert numPixels.tolist() == [1, 1, 1, 1, 1, 1]
+
+
+def test_computeLabelOverlapsEmpty():
+    labelImageA = np.zeros((5, 5), dtype=np.uint8)
+    labelImageB = np.ones((5, 5), dtype=np.uint8)
+    labelsA, labelsB, numPixels = computeLabelOverlaps(labelImageA, labelImageB)
+    assert len(labelsA) == len(labelsB) == len(numPixels) == 0
+
+
+def test_computeLabelSizes():
+    labelImage = np.array([[0, 1, 1], [4, 4, 4]], dtype=np.uint16)
+    assert computeLabelSizes(labelImage) == {1: 2, 4: 3}
+    assert computeLabelSizes(labelImage, ignoreBackground=False) == {0: 1, 1: 2, 4: 3}
+
+
+if __name__ == "__main__":
+    test_computeLabelOverlaps()
+    test_computeLabelOverlapsWithBackground()
+    test_computeLabelOverlapsEmpty()
+    test_computeLabelSizes()
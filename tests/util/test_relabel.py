@@ -0,0 +1,66 @@
+import numpy as np
+import hytra.util.relabel
+from hytra.util.relabel import LabelMapping, relabel
+
+
+def _relabelWithMasks(labelImage, mapping, default=0):
+    expected = np.full(labelImage.shape, default, dtype=labelImage.dtype)
+    for oldLabel, newLabel in mapping.items():
+        expected[labelImage == oldLabel] = newLabel
+    return expected
+
+
+def test_relabel():
+    np.random.seed(42)
+    labelImage = np.random.randint(0, 50, size=(20, 30, 4)).astype(np.uint32)
+    mapping = dict((l, 100 + l) for l in range(0, 60, 3))
+    mapping[7] = 0
+    expected = _relabelWithMasks(labelImage, mapping)
+
+    result = relabel(labelImage, mapping)
+    assert result.dtype == labelImage.dtype
+    assert np.array_equal(result, expected)
+    assert np.array_equal(relabel(labelImage, mapping, chunkSize=100), expected)
+    assert np.array_equal(
+        relabel(labelImage, (list(mapping.keys()), list(mapping.values()))), expected
+    )
+    assert np.array_equal(
+        relabel(labelImage, mapping, default=1),
+        _relabelWithMasks(labelImage, mapping, default=1),
+    )
+
+    # in place, in chunks
+    inPlace = labelImage.copy()
+    assert relabel(inPlace, mapping, out=inPlace, chunkSize=250) is inPlace
+    assert np.array_equal(inPlace, expected)
+
+    # the lookup table is reused for several images
+    labelMapping = LabelMapping(mapping, dtype=np.uint16)
+    for frame in labelImage:
+        result = labelMapping.apply(frame)
+        assert result.dtype == np.uint16
+        assert np.array_equal(result, _relabelWithMasks(frame, mapping))
+
+    assert np.array_equal(relabel(labelImage, {}), np.zeros_like(labelImage))
+
+
+def test_relabelSparse():
+    labelImage = np.array([[0, 5, 1 << 40], [1 << 40, 3, 1 << 33]], dtype=np.uint64)
+    mapping = {0: 0, 1 << 40: 2, 1 << 33: 1, 3: 3, 1 << 50: 4}
+    expected = _relabelWithMasks(labelImage, mapping)
+    assert np.array_equal(relabel(labelImage, mapping), expected)
+
+    # force the sparse mapping for a small label range, and also use negative labels
+    maxLookupTableSize = hytra.util.relabel.maxLookupTableSize
+    hytra.util.relabel.maxLookupTableSize = 4
+    try:
+        labelImage = np.array([[-1, 2, 7], [7, 12, 0]], dtype=np.int32)
+        mapping = {-1: 5, 7: 1, 12: 2}
+        expected = _relabelWithMasks(labelImage, mapping)
+        assert np.array_equal(relabel(labelImage, mapping), expected)
+        labelImage[labelImage < 0] = 1
+        assert np.array_equal(
+            relabel(labelImage, mapping), _relabelWithMasks(labelImage, mapping)
+        )
+    finally:
+        hytra.util.relabel.maxLookupTableSize = maxLookupTableSize